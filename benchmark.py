@@ -0,0 +1,284 @@
+# Benchmarks for loading, saving and calculating character sheets, and for building their pages.
+# Sheets are the D&D 5e template and synthetic sheets made by make_synthetic_sheet, whose size and shape
+# can be set from the command line.  Results can be saved as JSON and compared with an earlier run:
+#
+#   python benchmark.py --out before.json
+#   (change something)
+#   python benchmark.py --out after.json --compare before.json
+#
+# The page building and startup benchmarks need Kivy and a window; the others only need statmodel.
+
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from statmodel import (version_str, Sheet, active_sheet, replace_active_sheet, register_stats, rebuild_stat_graph,
+                       mark_stat_dirty, update_all_stat_text,
+                       SimpleStat, SumStat, FractionStat, TextStat, CounterStat, StatPage,
+                       make_5e_template, read_xml, write_sheet, write_sheet_binary, load_sheet_file,
+                       save_sheet_file, batch_update, binary_extension, snapshot_sheet, write_snapshot_file,
+                       add_template, template_snapshot, new_sheet_from_template, calculate_all_stats,
+                       evaluate_scenarios)
+
+# words for synthetic descriptions
+desc_words = ["the", "creature", "must", "make", "a", "saving", "throw", "or", "take", "fire", "damage",
+              "within", "range", "spell", "level", "bonus", "action", "until", "end", "of", "turn"]
+
+# Make a synthetic sheet in place of the active sheet, returning it.  Roughly:
+#   nstats   number of stats, including those inside sums
+#   fanin    number of other stats in each sum
+#   chain    length of each chain of fractions, each dividing the one before
+#   depth    how deeply sums are nested inside sums
+#   npages   number of pages the stats are spread over
+#   desclen  length of each description, in characters
+def make_synthetic_sheet(nstats = 5000, fanin = 4, chain = 3, depth = 1, npages = 20, desclen = 200, seed = 1):
+    rng = random.Random(seed)
+    def make_desc():
+        words = []
+        length = 0
+        while length < desclen:
+            words.append(rng.choice(desc_words))
+            length += len(words[-1]) + 1
+        return " ".join(words)[:desclen]
+    def make_nested(level):
+        # stats inside a sum: a base number, and a sum one level deeper
+        stats = [SimpleStat(statname = "Base", statdesc = make_desc(), statval = rng.randint(1, 20))]
+        if level > 0:
+            stats.append(SumStat(statname = "Nested {}".format(level), statdesc = make_desc(),
+                                 statlist_new = make_nested(level - 1)))
+        return stats
+    def count(stats):
+        return sum([1 + (count(s.statlist_new) if isinstance(s, SumStat) else 0) for s in stats])
+    sheet = Sheet()
+    calc = [] # stats available for calculating others
+    toplevel = []
+    made = 0
+    while made < nstats:
+        r = rng.random()
+        if r < 0.3 or len(calc) < fanin:
+            new = [SimpleStat(statname = "Score {}".format(made), statdesc = make_desc(), statval = rng.randint(1, 20),
+                              calcavail = True)]
+        elif r < 0.6:
+            new = [SumStat(statname = "Sum {}".format(made), statdesc = make_desc(), showplus = True, calcavail = True,
+                           statlist_existing = rng.sample(calc, fanin), statlist_new = make_nested(depth))]
+        elif r < 0.7:
+            new = []
+            previous = rng.choice(calc)
+            for i in range(chain):
+                previous = FractionStat(statname = "Fraction {}".format(made + i), statdesc = make_desc(),
+                                        stat_to_div = previous, divisor = rng.randint(2, 4),
+                                        rounddown = rng.random() < 0.5, calcavail = True)
+                new.append(previous)
+        elif r < 0.85:
+            new = [TextStat(statname = "Text {}".format(made), statdesc = make_desc(), stattext = "1d8 + 3")]
+        else:
+            new = [CounterStat(statname = "Counter {}".format(made), statdesc = make_desc(),
+                               defaultval = rng.randint(1, 50))]
+        register_stats(new, sheet)
+        toplevel.extend(new)
+        calc.extend([s for s in new if s.calcavail])
+        made += count(new)
+    perpage = len(toplevel) // npages + 1
+    sheet.pages = [StatPage(statlist = toplevel[i:(i + perpage)]) for i in range(0, len(toplevel), perpage)]
+    rebuild_stat_graph(sheet)
+    replace_active_sheet(sheet)
+    return sheet
+def make_5e_sheet():
+    sheet = Sheet()
+    replace_active_sheet(sheet) # the template makes its stats in the active sheet
+    sheet.pages = make_5e_template()
+    rebuild_stat_graph(sheet)
+    return sheet
+
+# time fn, returning the times of each run in seconds.  setup, if given, is run before each run, untimed.
+# fn can instead return the time it took, for things timed in another process.
+def time_runs(fn, repeat, setup = None):
+    times = []
+    for i in range(repeat):
+        if setup != None:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        took = fn()
+        times.append(took if isinstance(took, float) else time.perf_counter() - start)
+    return times
+# value of every stat, recalculated where needed
+def calculate_all():
+    return [s.value_text() for s in active_sheet().registry if hasattr(s, "value_text")]
+
+# Benchmarks of the model.  Each is (name, function to time, setup), for a sheet saved in both formats.
+def model_benchmarks(textpath, binarypath):
+    with open(textpath, mode = "rt") as con:
+        text = con.read()
+    load_sheet_file(textpath)
+    # the stat that the most others are calculated from, changed to measure recalculating after a change
+    counts = dict()
+    for s in active_sheet().registry:
+        if isinstance(s, SumStat):
+            for c in s.statlist_existing:
+                counts[c] = counts.get(c, 0) + 1
+    busiest = max(counts, key = counts.get) if len(counts) > 0 else next(iter(active_sheet().registry))
+    # values for it in what-if scenarios, found by id since other benchmarks load the sheet again
+    def what_if():
+        stat = active_sheet().registry.stats[busiest.statid]
+        return evaluate_scenarios({stat: list(range(100))} if hasattr(stat, "value_text") else {})
+    # the sheet as a template, which is made once and then only copied
+    add_template("benchmark", binarypath)
+    template_snapshot("benchmark")
+    return [("read_xml", lambda: read_xml(text), None),
+            ("load text", lambda: load_sheet_file(textpath), None),
+            ("load binary", lambda: load_sheet_file(binarypath), None),
+            ("save text", lambda: write_sheet(io.StringIO()), lambda: load_sheet_file(textpath)),
+            ("save binary", lambda: write_sheet_binary(io.BytesIO()), lambda: load_sheet_file(textpath)),
+            ("new sheet from template", lambda: new_sheet_from_template("benchmark"), None),
+            ("calculate all", calculate_all, rebuild_stat_graph),
+            ("calculate all (NumPy)", calculate_all_stats, calculate_all_stats),
+            ("what-if, 100 scenarios", what_if, None),
+            ("recalculate after change", lambda: [mark_stat_dirty(busiest), calculate_all()],
+             lambda: [rebuild_stat_graph(), calculate_all()])]
+# Benchmarks of pages on screen, which need Kivy.  Returns an empty list if it can't be used.
+def ui_benchmarks(textpath):
+    os.environ.setdefault("KIVY_NO_ARGS", "1") # the options are for this script, not Kivy
+    try:
+        import main
+        from kivy.lang import Builder
+    except Exception as e:
+        print("Skipping page benchmarks, can't use Kivy: {}".format(e), file = sys.stderr)
+        return []
+    from kivy.core.window import Window
+    if not hasattr(ui_benchmarks, "kvloaded"):
+        Builder.load_file(os.path.join(os.path.dirname(os.path.abspath(main.__file__)), "metachar.kv"))
+        ui_benchmarks.kvloaded = True
+    pages = load_sheet_file(textpath)
+    boxes = []
+    def build_pages():
+        # each page the size of the window, with bars for the rows that fit on it
+        with batch_update():
+            for p in pages:
+                boxes.append(main.BoxOfStats(page = p, editmode = False, size_hint = (None, None), size = Window.size))
+                boxes[-1].do_layout()
+    def release_pages():
+        [b.release() for b in boxes]
+        boxes.clear()
+    def update_all():
+        # recalculate and show the value of every stat on screen
+        [s.invalidate_value() for s in active_sheet().registry]
+        update_all_stat_text()
+    return [("build pages", build_pages, release_pages),
+            ("update_all_stat_text", update_all, lambda: [release_pages(), build_pages()])]
+
+# Benchmarks of starting the program with a sheet to reopen (see main.settings), each run in a new
+# process: the time until its window is first drawn, and until the sheet has been reopened from the
+# binary copy that the program makes of a text sheet.  The settings are kept in tempdir through
+# XDG_CONFIG_HOME, which is where Kivy keeps them on Linux.
+def startup_benchmarks(textpath, tempdir):
+    import main
+    datadir = os.path.join(tempdir, "metachar")
+    os.makedirs(datadir, exist_ok = True)
+    info = os.stat(textpath)
+    with open(os.path.join(datadir, main.settings_file), mode = "wt") as con:
+        json.dump({'reopen': True, 'sheet': os.path.abspath(textpath), 'copy': [info.st_size, info.st_mtime_ns]}, con)
+    load_sheet_file(textpath)
+    write_snapshot_file(os.path.join(datadir, main.last_sheet_copy), snapshot_sheet())
+    env = dict(os.environ, XDG_CONFIG_HOME = tempdir, KIVY_NO_ARGS = "1", KIVY_NO_CONSOLELOG = "1")
+    env[main.startup_timing_env] = "1"
+    def start_program(until):
+        # seconds from starting the program until it prints until
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, main.__file__], env = env, stdout = subprocess.PIPE,
+                                stderr = subprocess.DEVNULL, text = True)
+        took = None
+        for line in proc.stdout:
+            if line.strip() == until and took == None:
+                took = time.perf_counter() - start
+        proc.wait()
+        if took == None:
+            raise RuntimeError("the program stopped before printing " + until)
+        return took
+    return [("start to first frame", lambda: start_program("first frame"), None),
+            ("start to sheet reopened", lambda: start_program("sheet loaded"), None)]
+
+def run_benchmarks(sheets, repeat, ui):
+    results = []
+    with tempfile.TemporaryDirectory() as tempdir:
+        for sheetname, makesheet, params, extra in sheets:
+            sheet = makesheet()
+            textpath = os.path.join(tempdir, sheetname + ".txt")
+            binarypath = os.path.join(tempdir, sheetname + binary_extension)
+            save_sheet_file(textpath, sheet)
+            save_sheet_file(binarypath, sheet)
+            nstats = len(sheet.registry)
+            benchmarks = extra + model_benchmarks(textpath, binarypath)
+            if ui:
+                pagebenchmarks = ui_benchmarks(textpath)
+                if len(pagebenchmarks) > 0:
+                    benchmarks += pagebenchmarks + startup_benchmarks(textpath, tempdir)
+            for name, fn, setup in benchmarks:
+                times = time_runs(fn, repeat, setup)
+                results.append({'sheet': sheetname, 'benchmark': name, 'stats': nstats, 'params': params,
+                                'best': min(times), 'median': statistics.median(times), 'times': times})
+                print("{:<12} {:<26} {:>7} stats  best {:9.4f} s  median {:9.4f} s".format(
+                      sheetname, name, nstats, min(times), statistics.median(times)))
+    return results
+# the git commit of the code being timed, if it is in a git repository
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr = subprocess.DEVNULL,
+                                       cwd = os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+# print how each result compares with the same benchmark in an earlier run
+def compare_results(results, oldresults):
+    old = {(r['sheet'], r['benchmark']): r for r in oldresults}
+    print("\nCompared with the earlier run (best time, new / old):")
+    for r in results:
+        o = old.get((r['sheet'], r['benchmark']))
+        if o == None or o['params'] != r['params']:
+            continue
+        ratio = r['best'] / o['best'] if o['best'] > 0 else float("inf")
+        flag = "  slower" if ratio > 1.1 else ("  faster" if ratio < 0.9 else "")
+        print("{:<12} {:<26} {:9.4f} s -> {:9.4f} s  {:5.2f}x{}".format(r['sheet'], r['benchmark'], o['best'],
+                                                                      r['best'], ratio, flag))
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Time loading, saving and calculating MetaChar sheets.")
+    parser.add_argument("--stats", type = int, default = 5000, help = "stats on the synthetic sheet")
+    parser.add_argument("--fanin", type = int, default = 4, help = "other stats in each sum")
+    parser.add_argument("--chain", type = int, default = 3, help = "length of chains of fractions")
+    parser.add_argument("--depth", type = int, default = 1, help = "how deeply sums are nested in sums")
+    parser.add_argument("--pages", type = int, default = 20, help = "pages on the synthetic sheet")
+    parser.add_argument("--desc", type = int, default = 200, help = "characters in each description")
+    parser.add_argument("--seed", type = int, default = 1)
+    parser.add_argument("--repeat", type = int, default = 5, help = "times to run each benchmark")
+    parser.add_argument("--no-ui", dest = "ui", action = "store_false", help = "skip the page and startup benchmarks")
+    parser.add_argument("--out", help = "file to save results to, as JSON")
+    parser.add_argument("--compare", help = "results saved by an earlier run, to compare with")
+    args = parser.parse_args(argv)
+
+    params = {'stats': args.stats, 'fanin': args.fanin, 'chain': args.chain, 'depth': args.depth,
+              'pages': args.pages, 'desc': args.desc, 'seed': args.seed}
+    # (name, function making the sheet, parameters of the sheet, other benchmarks for the sheet)
+    sheets = [("5e template", make_5e_sheet, None, [("make_5e_template", make_5e_sheet, None)]),
+              ("synthetic", lambda: make_synthetic_sheet(args.stats, args.fanin, args.chain, args.depth,
+                                                         args.pages, args.desc, args.seed), params, [])]
+    results = run_benchmarks(sheets, args.repeat, args.ui)
+    run = {'metachar_version': version_str, 'commit': git_commit(), 'python': platform.python_version(), 'platform': platform.platform(),
+           'time': time.strftime("%Y-%m-%dT%H:%M:%S"), 'repeat': args.repeat, 'results': results}
+    if args.out != None:
+        with open(args.out, mode = "wt") as con:
+            json.dump(run, con, indent = 1)
+    if args.compare != None:
+        with open(args.compare, mode = "rt") as con:
+            compare_results(results, json.load(con)['results'])
+
+if __name__ == '__main__':
+    main()
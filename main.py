@@ -2,28 +2,44 @@
 
 from copy import copy
 from kivy.app import App
+from kivy.base import stopTouchApp
+from kivy.clock import Clock, mainthread
 from kivy.config import Config
+from kivy.core.text import LabelBase
 from kivy.core.window import Window
+# Widgets only used in popups (CheckBox, FileChooserListView, ProgressBar, TextInput) are made through
+# Factory, which imports each one the first time it is used, so that the program starts faster.
+from kivy.factory import Factory
 from kivy.graphics import Color, Rectangle
 from kivy.properties import NumericProperty, ObjectProperty, StringProperty
 from kivy.uix.behaviors import ButtonBehavior
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
-from kivy.uix.checkbox import CheckBox
-from kivy.uix.filechooser import FileChooserListView
 from kivy.uix.gridlayout import GridLayout
 from kivy.uix.label import Label
 from kivy.uix.pagelayout import PageLayout
 from kivy.uix.popup import Popup
-from kivy.uix.screenmanager import ScreenManager, Screen
+from kivy.uix.relativelayout import RelativeLayout
 from kivy.uix.scrollview import ScrollView
-from kivy.uix.textinput import TextInput
 from kivy.uix.widget import Widget
 
+import json
 import os
-from inspect import getargspec
-
-version_str = "0.0"
+import time
+from collections import OrderedDict
+import statmodel
+from statmodel import (version_str, Sheet, sheet_state, active_sheet, activate_sheet, add_open_sheet, close_sheet,
+                       find_open_sheet, register_stats, remove_stat, find_stats_for_calc, link_stat,
+                       update_stat_text, refresh_state, run_scheduled_refresh,
+                       sanitize_text, format_value,
+                       Stat, SimpleStat, SumStat, DDAbilityStat, FractionStat, TextStat, CounterStat, DiceStat,
+                       dice_summary, TwoButtonsStat, ThreeButtonsStat, StatPage, SheetLoader,
+                       make_example_page, templates, parse_scenario_values, save_template, add_template_dir,
+                       batch_update, in_batch, defer_until_batch_end,
+                       stop_journal, save_sheet_and_journal, journal_field, journal_stat,
+                       journal_new_stats, journal_delete, journal_page, change_listeners,
+                       AutoSaver, binary_extension, add_profile_point,
+                       start_profiling, stop_profiling, reset_profile, profile_report, dump_profile)
 
 # how much of the vertical space of a horizontal bar should a button take up
 mybtn_size_hint_y = 1
@@ -31,78 +47,36 @@ mybtn_size_hint_y = 1
 myminheight = 40
 # how wide should the left column be in edit popups
 edpop_left_col_size = 0.3
-# token to indicate whether there is a edit window open, in which case paging with arrow keys is suppressed
-edit_window_open = 0
-
-# a list to hold all stats for the whole character sheet
-masterstatlist = []
-# find all stats available to include in calculations
-def find_stats_for_calc():
-    return [s for s in masterstatlist if s.calcavail]
-# update the text displayed for all stat values
-def update_all_stat_text():
-    [s.update_button_text() for s in masterstatlist if isinstance(s, StatBarSimple) or isinstance(s, StatBarSum) \
-     or isinstance(s, StatBarFraction)]
-     
-# sanitize text input for saving and loading
-def sanitize_text(string):
-    string = string.replace("<", "")
-    string = string.replace(">", "")
-    return string
-     
-# recursively read XML-style tags and values from a string. (for loading files)
-def read_xml(string):
-    # find starting tag <tag>
-    first_tag_start = string.find("<")
-    first_tag_end = string.find(">")
-    tag = string[first_tag_start+1:first_tag_end] # without the brackets
-    # trim off starting tag from string
-    string = string[first_tag_end+1:]
-    # find the ending tag </tag>
-    end_marker = "</" + tag + ">"
-    end_marker_start = string.find(end_marker)
-    # get the string inside the tag
-    innerstring = string[:end_marker_start]
-    # trim the string to what is after the ending tag
-    string = string[(end_marker_start + len(end_marker)):]
-    
-    # tag and value if this is innermost pair
-    if "<" not in innerstring:
-        thistv = [tag, innerstring]
-    # further search for tags within the value
-    else:
-        thistv = [tag, read_xml(innerstring)]
-    # list of tag value pairs for the string
-    tvlist = [thistv]
-    # get tag-value pairs for the remainder of the string
-    if "<" in string:
-        tvlist.extend(read_xml(string))    
-    return(tvlist)
-# function for converting True and False in file to boolean
-def conv_bool(string):
-    return string == "True"
-# function for converting strings to lists of stats
-def conv_statlist(string):
-    return [masterstatlist[int(i)] for i in string.split(',') if i != '']
-# function for converting index of a single stat
-def conv_stat(string):
-    if string == 'None':
-        return None
-    else:
-        return masterstatlist[int(string)]
-# dictionary to convert strings loaded from file to right class
-conv_fns = {'statname': str, 'statdesc': str, 'calcavail': conv_bool,
-            'statval': int, 'showplus': conv_bool, 
-            'statlist_existing': conv_statlist, 'childstats.statlist': conv_statlist,
-            'statbtn.size_hint_x': float, 'stat_to_div': conv_stat, 'divisor': int,
-            'rounddown': conv_bool, 'stattext': str, 'defaultval': int,
-            'currentval': int, 'statname2': str, 'statdesc2': str, 'statname3': str,
-            'statdesc3': str, 'red_bg': float, 'green_bg': float, 'blue_bg': float,
-            'statlist': conv_statlist}
-# set of arguments that are used for StatBar initialization that might be read from file
-initargs = {'statname', 'statdesc', 'calcavail', 'statval', 'showplus', 'statlist_existing',
-            'stat_to_div', 'divisor', 'rounddown', 'stattext', 'defaultval', 
-            'statname2', 'statdesc2', 'statname3', 'statdesc3'}
+# how many stats pages can have widgets at once; pages beyond this that have not been viewed recently
+# are dropped and rebuilt when needed.  At least 3, for the current page and the pages on either side.
+max_live_pages = 5
+# seconds a counter button is held down before it starts repeating, and between repeats
+hold_delay = 0.4
+repeat_interval = 0.05
+# seconds without changes before the sheet is saved automatically
+autosave_delay = 3
+# text shown on the front page for each autosave status
+autosave_messages = {'idle': "", 'unsaved': "Changes not saved yet", 'saving': "Saving...",
+                     'saved': "All changes saved", 'failed': "Autosave failed!",
+                     'nofile': "Save the sheet to a file to turn on autosave"}
+# Settings kept between runs, in settings_file in the app's user data directory.  The last sheet is
+# reopened at start if 'reopen' is on.  A text sheet is reopened from a binary copy of it, made when the
+# program closes, unless the sheet file has changed since; 'copy' is the size and time of the sheet file
+# the copy was made from.
+settings = {'reopen': True, 'sheet': None, 'copy': None}
+settings_file = "settings.json"
+last_sheet_copy = "last_sheet" + binary_extension
+# directory in the app's user data directory where sheets saved as templates are kept
+templates_dirname = "templates"
+# most totals listed in the chances of a roll of dice
+dice_table_rows = 200
+# seconds after typing stops before the roll being edited is worked out again
+dice_preview_delay = 0.3
+# number of scenarios shown side by side in the what-if popup
+scenario_columns = 6
+# If this is set in the environment, the program prints "first frame" once its window is first drawn and
+# "sheet loaded" once the last sheet has been reopened (if it is), and then closes.  For benchmark.py.
+startup_timing_env = "METACHAR_STARTUP_TIMING"
 
 # Popup for description of statistics
 class DescPopup(Popup):
@@ -115,17 +89,20 @@ class DescPopup(Popup):
     def on_touch_up(self, touch):
         self.dismiss()
 
-# A button with the name of a stat, which you can press to get a description
+# A button with the name of a stat, which you can press to get a description.  The description is
+# only read from the stat when it is shown, since it may still be in the sheet file.
 class StatButton(Button):
-    def __init__(self, statname, statdesc, **kwargs):
+    def __init__(self, statname, model, descattr = "statdesc", **kwargs):
         Button.__init__(self, **kwargs)
         self.text = statname
-        self.statdesc = statdesc
+        self.model = model
+        self.descattr = descattr
         self.bind(on_release = self.show_desc)
         self.size_hint = (0.5, mybtn_size_hint_y)
     
     def show_desc(self, btn):
-        self.descpop = DescPopup(title = self.text, statdesc = self.statdesc)#content = Label(text = self.statdesc))
+        statdesc = getattr(self.model, self.descattr)
+        self.descpop = DescPopup(title = self.text, statdesc = statdesc)#content = Label(text = self.statdesc))
         self.descpop.open()
 
 # Popup confirming deletion of stat.
@@ -134,7 +111,7 @@ class DeletePopup(Popup):
     def __init__(self, caller, **kwargs):
         Popup.__init__(self, **kwargs)
         self.caller = caller
-        statname = self.caller.parent.statname
+        statname = self.caller.parent.model.statname
         self.title = "Delete " + statname + "?"
         dplayout = BoxLayout()
         yesbtn = Button(text = "Yes", size_hint_y = 0.5)
@@ -145,9 +122,8 @@ class DeletePopup(Popup):
         dplayout.add_widget(nobtn)
         self.content = dplayout
     def yesdel(self, btn):
-        self.caller.parent.parent.statlist.remove(self.caller.parent)
-        self.caller.parent.parent.remove_widget(self.caller.parent)
-        masterstatlist.remove(self.caller.parent)
+        statbar = self.caller.parent
+        statbar.box.delete_stat(statbar)
         self.dismiss()
     def nodel(self, btn):
         self.dismiss()
@@ -185,13 +161,19 @@ class EditStatBarPopup(Popup):
         
         # Rows for editing stat name and description
         self.edlayout.add_widget(Label(text = "Name", size_hint_x = edpop_left_col_size))
-        self.statname_input = TextInput(text = statname, multiline = False)
+        self.statname_input = Factory.TextInput(text = statname, multiline = False)
         self.edlayout.add_widget(self.statname_input)
         
         self.edlayout.add_widget(Label(text = "Popup description", size_hint_x = edpop_left_col_size))
-        self.statdesc_input = TextInput(text = statdesc)
+        self.statdesc_input = Factory.TextInput(text = statdesc)
         self.edlayout.add_widget(self.statdesc_input)
         
+        # Row for moving the stat to another place on the page
+        self.edlayout.add_widget(Label(text = "Position on page", size_hint_x = edpop_left_col_size))
+        self.position = self.caller.box.page.statlist.index(self.caller.model) + 1
+        self.position_input = Factory.TextInput(text = str(self.position), multiline = False, input_filter = "int")
+        self.edlayout.add_widget(self.position_input)
+        
         self.layout.add_widget(self.edlayout)
         
         # Buttons for finishing or canceling stat editing
@@ -207,21 +189,24 @@ class EditStatBarPopup(Popup):
         self.content = self.layout
         
     def done_edit(self, btn):
-        self.caller.statname = sanitize_text(self.statname_input.text)
-        self.caller.statdesc = sanitize_text(self.statdesc_input.text)
-        self.caller.statbtn.text = self.caller.statname
-        self.caller.statbtn.statdesc = self.caller.statdesc
-        update_all_stat_text()
+        model = self.caller.model
+        model.statname = sanitize_text(self.statname_input.text)
+        model.statdesc = sanitize_text(self.statdesc_input.text)
+        self.caller.statbtn.text = model.statname
+        # components may have changed, then update this stat and those calculated from it
+        link_stat(model)
+        update_stat_text(model)
+        journal_stat(model)
+        # move the stat if a new position was entered
+        try:
+            position = int(self.position_input.text)
+        except ValueError: # for if there is a blank where an int expected
+            position = self.position
+        if position != self.position:
+            self.caller.box.move_stat(model, position - 1)
         self.dismiss()
     def cancel_edit(self, btn):
         self.dismiss()
-    def on_open(self):
-        # keep from changing pages while open
-        global edit_window_open
-        edit_window_open += 1
-    def on_dismiss(self):
-        global edit_window_open
-        edit_window_open -= 1
 
 # up and down buttons to reorder items on page        
 class UpButton(Button):
@@ -231,15 +216,10 @@ class UpButton(Button):
         self.size_hint = (0.1, mybtn_size_hint_y)
         self.bind(on_release = self.move_parent_up)
     def move_parent_up(self, btn):
-        currindex = self.parent.parent.statlist.index(self.parent)
-        if currindex == 1:
-            neworder = [1, 0] + list(range(2, len(self.parent.parent.statlist)))
-        if currindex > 1:
-            neworder = list(range(currindex - 1)) + [currindex, currindex - 1] + \
-                          list(range(currindex + 1, len(self.parent.parent.statlist)))
+        box = self.parent.box
+        currindex = box.page.statlist.index(self.parent.model)
         if currindex > 0:
-            self.parent.parent.statlist = [self.parent.parent.statlist[i] for i in neworder]
-            self.parent.parent.redraw()
+            box.swap_stats(currindex - 1, currindex)
             
 class DownButton(Button):
     def __init__(self, **kwargs):
@@ -248,29 +228,27 @@ class DownButton(Button):
         self.size_hint = (0.1, mybtn_size_hint_y)
         self.bind(on_release = self.move_parent_down)
     def move_parent_down(self, btn):
-        currindex = self.parent.parent.statlist.index(self.parent)
-        listlen = len(self.parent.parent.statlist)
-        if currindex == listlen - 2:
-            neworder = list(range(currindex)) + [currindex + 1, currindex]
-        if currindex < listlen - 2:
-            neworder = list(range(currindex)) + [currindex + 1, currindex] + list(range(currindex + 2, listlen))
-        if currindex < listlen - 1:
-            self.parent.parent.statlist = [self.parent.parent.statlist[i] for i in neworder]
-            self.parent.parent.redraw()
+        box = self.parent.box
+        currindex = box.page.statlist.index(self.parent.model)
+        if currindex < len(box.page.statlist) - 1:
+            box.swap_stats(currindex, currindex + 1)
   
 # bar containing the button with the name of the stat.  Superclass for various types of stat.
+# Each bar displays a stat from statmodel, which holds all of the stat's data.
+# A bar can be reused for another stat of the same class with show_stat.
 class StatBar(BoxLayout):
-    def __init__(self, statname, statdesc, calcavail = False, **kwargs):
+    def __init__(self, model, **kwargs):
         BoxLayout.__init__(self, **kwargs)
         self.orientation = "horizontal"
         self.size_hint_y = 0.2 # doesn't work?
         self.spacing = 3
         self.padding = 3
         
-        self.statname = statname
-        self.statdesc = statdesc
-        self.calcavail = calcavail # is this stat available for calculation of other stats?
-        self.statbtn = StatButton(statname = self.statname, statdesc = self.statdesc)
+        self.box = None # BoxOfStats this bar is displayed on
+        self.model = model
+        model.view = self
+        self.statbtn = StatButton(statname = model.statname, model = model)
+        self.statbtn.size_hint_x = model.btnwidth
         self.upbtn = UpButton()
         self.downbtn = DownButton()
         self.delbtn = DeleteButton()
@@ -292,23 +270,25 @@ class StatBar(BoxLayout):
         self.remove_widget(self.downbtn)
         self.remove_widget(self.delbtn)
         self.remove_widget(self.editbtn)
+    def show_stat(self, model):
+        # display a different stat with this bar
+        self.model = model
+        model.view = self
+        self.statbtn.text = model.statname
+        self.statbtn.model = model
+        self.statbtn.size_hint_x = model.btnwidth
+        self.update_button_text()
+    def release(self):
+        # stop displaying the stat
+        self.model.view = None
     def edit_obj(self):
-        edpop = EditStatBarPopup(caller = self, statname = self.statname, statdesc = self.statdesc,
-                                 title = "Edit " + self.statname)
+        edpop = EditStatBarPopup(caller = self, statname = self.model.statname, statdesc = self.model.statdesc,
+                                 title = "Edit " + self.model.statname)
         edpop.open()
-    def value_for_sum(self):
-        return 0  # if there is no number associated with this stat, return zero
+    def update_button_text(self):
+        pass # this function does something if the stat bar displays a value
     def update_text_color(self):
         pass # this function does something if the stat bar has text printed on the background color
-    def write_statbar_info(self, con):
-        con.write("<statname>{}</statname>\n".format(self.statname))
-        con.write("<statdesc>{}</statdesc>\n".format(self.statdesc))
-        con.write("<calcavail>{}</calcavail>\n".format(self.calcavail))
-        con.write("<statbtn.size_hint_x>{}</statbtn.size_hint_x>\n".format(self.statbtn.size_hint_x))
-    def write_to_file(self, con):
-        con.write("<StatBar>\n")
-        self.write_statbar_info(con)
-        con.write("</StatBar>\n\n")
 
 # A checkbox to indicate number formatting (plus before number or not)
 class NumFormatCheckbox(BoxLayout):
@@ -318,8 +298,8 @@ class NumFormatCheckbox(BoxLayout):
         self.size_hint_y = 0.1
         self.add_widget(Label(text = "Include a '+' before positive numbers?", 
                               size_hint_x = 0.8))
-        self.nfcheck = CheckBox()
-        self.nfcheck.active = self.caller.caller.showplus
+        self.nfcheck = Factory.CheckBox()
+        self.nfcheck.active = self.caller.caller.model.showplus
         self.add_widget(self.nfcheck)
         
 # A checkbbox to indicate whether this stat is available for calculating others
@@ -330,8 +310,8 @@ class CalcAvailCheckbox(BoxLayout):
         self.size_hint_y = 0.1
         self.add_widget(Label(text = "Make this stat available for calculating others?", 
                               size_hint_x = 0.8))
-        self.cacheck = CheckBox()
-        self.cacheck.active = self.caller.caller.calcavail
+        self.cacheck = Factory.CheckBox()
+        self.cacheck.active = self.caller.caller.model.calcavail
         self.add_widget(self.cacheck)
         
 # popup for editing stat with a simple value
@@ -340,7 +320,7 @@ class EditStatBarSimplePopup(EditStatBarPopup):
         EditStatBarPopup.__init__(self, **kwargs)
         
         self.edlayout.add_widget(Label(text = "Value", size_hint_x = edpop_left_col_size))
-        self.statval_input = TextInput(text = str(statval), input_filter = 'int')
+        self.statval_input = Factory.TextInput(text = str(statval), input_filter = 'int')
         self.edlayout.add_widget(self.statval_input)
         
         self.nfcheckbar = NumFormatCheckbox(caller = self)
@@ -351,73 +331,117 @@ class EditStatBarSimplePopup(EditStatBarPopup):
         
     def done_edit(self, btn):
         # update the stored and printed value
-        self.caller.statval = int(self.statval_input.text)
+        self.caller.model.statval = int(self.statval_input.text)
         # update whether the '+' should be before the number
-        self.caller.showplus = self.nfcheckbar.nfcheck.active
+        self.caller.model.showplus = self.nfcheckbar.nfcheck.active
         # update whether this stat is available for calculations
-        self.caller.calcavail = self.cacheckbar.cacheck.active
-        # update text printed on label - is done by update_all_stat_text within EditStatBarPopup
+        self.caller.model.calcavail = self.cacheckbar.cacheck.active
+        # update text printed on label - is done by update_stat_text within EditStatBarPopup
         # do all other updates
         EditStatBarPopup.done_edit(self, btn)
         
 # bar for a stat with a simple value
 class StatBarSimple(StatBar):
-    def __init__(self, statval, showplus = False, **kwargs):
-        StatBar.__init__(self, **kwargs)
-        self.statval = int(statval)
-        self.showplus = showplus # show plus sign (for roll mods)?
-        self.statlbl = Label(text = self.value_text(), size_hint_y = mybtn_size_hint_y, size_hint_x = 0.5)
+    def __init__(self, model, **kwargs):
+        StatBar.__init__(self, model, **kwargs)
+        self.statlbl = Label(text = model.value_text(), size_hint_y = mybtn_size_hint_y, size_hint_x = 0.5)
         nchild = len(self.children)
         self.add_widget(self.statlbl, index = nchild - 1)
     def edit_obj(self):
-        edpop = EditStatBarSimplePopup(caller = self, statname = self.statname, statdesc = self.statdesc,
-                                       statval = self.statval, title = "Edit " + self.statname)
+        edpop = EditStatBarSimplePopup(caller = self, statname = self.model.statname, statdesc = self.model.statdesc,
+                                       statval = self.model.statval, title = "Edit " + self.model.statname)
         edpop.open()
-    def value_for_sum(self):
-        return self.statval
-    def value_text(self):
-        if self.showplus:
-            stattext = '{:+d}'.format(self.statval)
-        else:
-            stattext = str(self.statval)
-        return stattext
     def update_button_text(self):
-        self.statlbl.text = self.value_text()
+        self.statlbl.text = self.model.value_text()
     def update_text_color(self):
-        if self.parent.red_bg + self.parent.green_bg + self.parent.blue_bg > 1.4:
+        if self.box.red_bg + self.box.green_bg + self.box.blue_bg > 1.4:
             self.statlbl.color = [0,0,0,1] # black on light background
         else:
             self.statlbl.color = [1,1,1,1] # white on dark background
-    def write_to_file(self, con):
-        con.write("<StatBarSimple>\n")
-        self.write_statbar_info(con)
-        con.write("<statval>{}</statval>\n".format(self.statval))
-        con.write("<showplus>{}</showplus>\n".format(self.showplus))
-        con.write("</StatBarSimple>\n\n")
 
-# popup for adding an existing stat to a sum
+# Scrolling list of stats to pick from.  Only the rows on screen have buttons, which are reused as the list
+# scrolls, so a long list opens as quickly as a short one.  on_pick is called with the stat picked.
+class StatPickerRows(ScrollView):
+    def __init__(self, on_pick, **kwargs):
+        ScrollView.__init__(self, **kwargs)
+        self.do_scroll_x = False
+        self.on_pick = on_pick
+        self.stats = [] # stats in the list
+        self.buttons = {} # button for each row on screen, by index in stats
+        self.sparebuttons = []
+        self.rowheight = myminheight
+        self.layout = RelativeLayout(size_hint_y = None, height = 0)
+        self.add_widget(self.layout)
+        self.bind(scroll_y = self.show_rows, height = self.show_rows)
+    def set_stats(self, stats):
+        self.stats = stats
+        [self.put_away(i) for i in list(self.buttons)]
+        self.layout.height = self.rowheight * len(stats)
+        self.scroll_y = 1
+        self.show_rows()
+    def show_rows(self, *args):
+        # first and last rows on screen, with one extra on either side
+        offset = (1 - self.scroll_y) * max(self.layout.height - self.height, 0) # from the top
+        first = max(int(offset // self.rowheight) - 1, 0)
+        last = min(int((offset + self.height) // self.rowheight) + 1, len(self.stats) - 1)
+        [self.put_away(i) for i in list(self.buttons) if not first <= i <= last]
+        for i in range(first, last + 1):
+            if i not in self.buttons:
+                self.buttons[i] = self.get_button(self.stats[i])
+            self.buttons[i].y = self.layout.height - (i + 1) * self.rowheight
+    def get_button(self, stat):
+        if len(self.sparebuttons) > 0:
+            btn = self.sparebuttons.pop()
+        else:
+            btn = Button(size_hint_y = None, height = self.rowheight)
+            btn.bind(on_release = self.pick)
+        # values of sums are cached, so this only calculates stats that have changed
+        btn.text = stat.statname + " " + stat.value_text()
+        self.layout.add_widget(btn)
+        return btn
+    def put_away(self, i):
+        btn = self.buttons.pop(i)
+        self.layout.remove_widget(btn)
+        self.sparebuttons.append(btn)
+    def pick(self, btn):
+        i = [j for j, b in self.buttons.items() if b is btn][0]
+        self.on_pick(self.stats[i])
+
+# popup for adding an existing stat to a sum.  Typing part of a name shows only the stats with it.
 class AddExistingStatPopup(Popup):
-    def __init__(self, caller, **kwargs):
+    def __init__(self, caller, statoptions = None, **kwargs):
         Popup.__init__(self, **kwargs)
         self.caller = caller
         self.title = "Add existing stat to sum"
         self.layout = BoxLayout(orientation = "vertical")
         
-        # one button for each stat that could be added
-        self.statoptions = find_stats_for_calc()
-        self.addbtns = [Button(text = s.statname + " " + s.value_text()) for s in self.statoptions]
-        [ab.bind(on_release = self.add_stat) for ab in self.addbtns]
-        [self.layout.add_widget(ab) for ab in self.addbtns]
+        self.filter_input = Factory.TextInput(hint_text = "Type part of a name to find a stat", multiline = False,
+                                              size_hint_y = None, height = myminheight)
+        self.filter_input.bind(text = self.filter_stats)
+        self.layout.add_widget(self.filter_input)
         
-        cancelbtn = Button(text = "Cancel")
+        # a row for each stat that could be added
+        self.statoptions = find_stats_for_calc() if statoptions == None else statoptions
+        self.query = "" # text typed to filter the stats shown
+        self.shown = self.statoptions
+        self.rows = StatPickerRows(on_pick = self.add_stat)
+        self.rows.set_stats(self.shown)
+        self.layout.add_widget(self.rows)
+        
+        cancelbtn = Button(text = "Cancel", size_hint_y = None, height = myminheight)
         cancelbtn.bind(on_release = self.dismiss)
         self.layout.add_widget(cancelbtn)
         
         self.add_widget(self.layout)
-    def add_stat(self, btn):
-        i = self.addbtns.index(btn) # index of stat on this screen
+    def filter_stats(self, textinput, text):
+        query = text.lower()
+        # typing more of a name can only narrow down the stats already shown
+        pool = self.shown if query.startswith(self.query) else self.statoptions
+        self.shown = [s for s in pool if query in s.statname.lower()]
+        self.query = query
+        self.rows.set_stats(self.shown)
+    def add_stat(self, st):
         j = len(self.caller.statlist_existing) # index of stat on parent screen
-        st = self.statoptions[i] # the stat to be added
         self.caller.statlist_existing.append(st) # list to ultimately be passed down and kept
         # For display in parent window
         self.caller.names.append(Label(text = st.statname))
@@ -435,7 +459,7 @@ class EditStatlistPopup(Popup):
         Popup.__init__(self, **kwargs)
         self.caller = caller
         self.statlist_existing = statlist_existing
-        self.title = "Edit " + self.caller.caller.statname + " components"
+        self.title = "Edit " + self.caller.caller.model.statname + " components"
         
         # Grid of stats that were created elsewhere
         self.grid = GridLayout(cols = 3)
@@ -461,7 +485,7 @@ class EditStatlistPopup(Popup):
         self.addexistbtn.bind(on_release = self.add_component_existing)
         
         self.layout = BoxLayout(orientation = "vertical")
-        self.layout.add_widget(self.caller.caller.childstats) # contains component stats specific to this stat
+        self.layout.add_widget(self.caller.caller.get_childstats()) # contains component stats specific to this stat
         self.layout.add_widget(self.addexistbtn)
         self.layout.add_widget(self.grid)
         self.layout.add_widget(self.donebar)
@@ -485,12 +509,9 @@ class EditStatlistPopup(Popup):
         self.dismiss()
     def value_text(self):
         # total value for current version of statlist
-        valtot = sum([s.value_for_sum() for s in self.statlist_existing + self.caller.caller.childstats.statlist])
-        if self.caller.caller.showplus:
-            stattext = '{:+d}'.format(valtot)
-        else:
-            stattext = str(valtot)
-        return stattext
+        model = self.caller.caller.model
+        valtot = sum([s.value_for_sum() for s in self.statlist_existing + model.statlist_new])
+        return format_value(valtot, model.showplus)
     def on_dismiss(self):
         self.layout.remove_widget(self.caller.caller.childstats)
         
@@ -501,7 +522,7 @@ class EditStatBarSumPopup(EditStatBarPopup):
         
         self.statlist_existing = statlist_existing
         self.edlayout.add_widget(Label(text = "Value", size_hint_x = edpop_left_col_size))
-        self.valbtn = Button(text = self.caller.value_text(), size_hint_y = mybtn_size_hint_y)
+        self.valbtn = Button(text = self.caller.model.value_text(), size_hint_y = mybtn_size_hint_y)
         self.valbtn.bind(on_release = self.edit_sum)
         self.edlayout.add_widget(self.valbtn)
         
@@ -516,40 +537,46 @@ class EditStatBarSumPopup(EditStatBarPopup):
         self.edslpop.open()
     def done_edit(self, btn):
         # update whether the '+' should be before the number
-        self.caller.showplus = self.nfcheckbar.nfcheck.active
+        self.caller.model.showplus = self.nfcheckbar.nfcheck.active
         # update whether this stat is available for calculations
-        self.caller.calcavail = self.cacheckbar.cacheck.active
+        self.caller.model.calcavail = self.cacheckbar.cacheck.active
         # pass on the statlist
-        self.caller.statlist_existing = self.statlist_existing
-        # update text printed on label - done by update_all_stat_text within EditStatBarPopup
+        self.caller.model.statlist_existing = self.statlist_existing
+        # update text printed on label - done by update_stat_text within EditStatBarPopup
         # do all other updates
         EditStatBarPopup.done_edit(self, btn)
         
 # bar for a stat with a calculated value
 class StatBarSum(StatBar):
-    def __init__(self, statlist_existing = [], statlist_new = [], showplus = False, **kwargs):
-        StatBar.__init__(self, **kwargs)
-        self.statlist_existing = statlist_existing
-        self.showplus = showplus
+    def __init__(self, model, **kwargs):
+        StatBar.__init__(self, model, **kwargs)
         # BoxLayout containing the stats that were created within this stat.
-        # Not plotted here, but plotted in the editing popup.
-        self.childstats = BoxOfStats(statlist = statlist_new, numbersOnly = True)
-        self.childstats.remove_widget(self.childstats.leave_edit_btn)
-        # Add these substats specific to this stat to the master list, since they should be brand new
-        masterstatlist.extend(statlist_new)
+        # Not plotted here, but plotted in the editing popup, so only made when needed.
+        self.childstats = None
         
         # Add label showing the numeric value (total) for this statistic
-        self.statlbl = Button(text = self.value_text(), size_hint_y = mybtn_size_hint_y, size_hint_x = 0.5)
+        self.statlbl = Button(text = model.value_text(), size_hint_y = mybtn_size_hint_y, size_hint_x = 0.5)
         self.statlbl.bind(on_release = self.show_components)
         nchild = len(self.children)
         self.add_widget(self.statlbl, index = nchild - 1)
         
+    def get_childstats(self):
+        if self.childstats == None:
+            self.childstats = BoxOfStats(page = StatPage(statlist = self.model.statlist_new), numbersOnly = True,
+                                         ownerstat = self.model)
+            self.childstats.remove_widget(self.childstats.leave_edit_btn)
+        return self.childstats
+    def release(self):
+        if self.childstats != None:
+            self.childstats.release()
+            self.childstats = None
+        StatBar.release(self)
     def show_components(self, btn):
         "Function to make a popup showing components of the sum (no editing)"
-        self.sumpop = Popup(title = "Components of " + self.statname)
+        self.sumpop = Popup(title = "Components of " + self.model.statname)
         self.sumpop.layout = BoxLayout(orientation = "vertical")
         self.sumpop.grid = GridLayout(cols = 2)
-        for s in self.statlist_existing + self.childstats.statlist:
+        for s in self.model.statlist_existing + self.model.statlist_new:
             self.sumpop.grid.add_widget(Label(text = s.statname))
             self.sumpop.grid.add_widget(Label(text = s.value_text()))
         self.sumpop.layout.add_widget(self.sumpop.grid)
@@ -559,33 +586,12 @@ class StatBarSum(StatBar):
         self.sumpop.content = self.sumpop.layout
         self.sumpop.open()
     def edit_obj(self):
-        edpop = EditStatBarSumPopup(caller = self, statname = self.statname, statdesc = self.statdesc,
-                                    statlist_existing = copy(self.statlist_existing), title = "Edit " + self.statname)
+        edpop = EditStatBarSumPopup(caller = self, statname = self.model.statname, statdesc = self.model.statdesc,
+                                    statlist_existing = copy(self.model.statlist_existing),
+                                    title = "Edit " + self.model.statname)
         edpop.open()
-    def value_for_sum(self):
-        return sum([s.value_for_sum() for s in self.statlist_existing]) + \
-          sum([s.value_for_sum() for s in self.childstats.statlist])
-    def value_text(self):
-        if self.showplus:
-            stattext = '{:+d}'.format(self.value_for_sum())
-        else:
-            stattext = str(self.value_for_sum())
-        return stattext
     def update_button_text(self):
-        self.statlbl.text = self.value_text()
-    def add_existing_stat(self, stat):
-        self.statlist_existing.append(stat)
-    def write_statbarsum(self, con):
-        self.write_statbar_info(con)
-        se_index = [str(masterstatlist.index(s)) for s in self.statlist_existing]
-        sn_index = [str(masterstatlist.index(s)) for s in self.childstats.statlist]
-        con.write("<statlist_existing>{}</statlist_existing>\n".format(",".join(se_index)))
-        con.write("<childstats.statlist>{}</childstats.statlist>\n".format(",".join(sn_index)))
-        con.write("<showplus>{}</showplus>\n".format(self.showplus))
-    def write_to_file(self, con):
-        con.write("<StatBarSum>\n")
-        self.write_statbarsum(con)
-        con.write("</StatBarSum>\n\n")
+        self.statlbl.text = self.model.value_text()
 
 # popup to edit D&D ability
 class EditDDAbilityBarPopup(EditStatBarSumPopup):
@@ -596,32 +602,17 @@ class EditDDAbilityBarPopup(EditStatBarSumPopup):
         
 # bar with D&D ability and modifier
 class DDAbilityBar(StatBarSum):
-    def __init__(self, **kwargs):
-        StatBarSum.__init__(self, **kwargs)
-        self.calcavail = True # generally want D&D roll mods for calculations
     def edit_obj(self):
-        edpop = EditDDAbilityBarPopup(caller = self, statname = self.statname, statdesc = self.statdesc,
-                                      title = "Edit " + self.statname, statlist_existing = self.statlist_existing)
+        edpop = EditDDAbilityBarPopup(caller = self, statname = self.model.statname, statdesc = self.model.statdesc,
+                                      title = "Edit " + self.model.statname,
+                                      statlist_existing = self.model.statlist_existing)
         edpop.open()
-    def value_for_sum(self):
-        score = sum([s.value_for_sum() for s in self.statlist_existing + self.childstats.statlist])
-        return (score - 10) // 2
-    def value_text(self):
-        # text for label has ability followed by modifier
-        score = sum([s.value_for_sum() for s in self.statlist_existing + self.childstats.statlist])
-        return "{} ({:+d})".format(score, self.value_for_sum())
-    def write_to_file(self, con):
-        con.write("<DDAbilityBar>\n")
-        self.write_statbarsum(con)
-        con.write("</DDAbilityBar>\n\n")
 
 # popup for changing the stat used for StatBarFraction
 class SelectStatPopup(AddExistingStatPopup):
     def __init__(self, **kwargs):
         AddExistingStatPopup.__init__(self, **kwargs)
-    def add_stat(self, btn):
-        i = self.addbtns.index(btn) # index of stat on this screen
-        st = self.statoptions[i] # the stat to be added
+    def add_stat(self, st):
         # pass the stat to the edit window
         self.caller.stat_to_div = st
         # update the button label in the edit window
@@ -643,12 +634,12 @@ class EditStatBarFractionPopup(EditStatBarPopup):
         self.edlayout.add_widget(self.stat_to_div_btn)
         
         self.edlayout.add_widget(Label(text = "Divide by", size_hint_x = edpop_left_col_size))
-        self.divisor_input = TextInput(text = str(self.divisor), input_filter = 'int')
+        self.divisor_input = Factory.TextInput(text = str(self.divisor), input_filter = 'int')
         self.edlayout.add_widget(self.divisor_input)
         
         # bar with radio buttons for rounding up or down
-        self.rounddown_radio = CheckBox(active = self.rounddown, group = "round")
-        self.roundup_radio = CheckBox(active = not self.rounddown, group = "round")
+        self.rounddown_radio = Factory.CheckBox(active = self.rounddown, group = "round")
+        self.roundup_radio = Factory.CheckBox(active = not self.rounddown, group = "round")
         self.roundbar = BoxLayout()
         self.roundbar.add_widget(Label(text = "Round down:"))
         self.roundbar.add_widget(self.rounddown_radio)
@@ -666,74 +657,47 @@ class EditStatBarFractionPopup(EditStatBarPopup):
         adpop = SelectStatPopup(caller = self)
         adpop.open()
     def done_edit(self, btn):
+        model = self.caller.model
         # update the stat used
-        self.caller.stat_to_div = self.stat_to_div
+        model.stat_to_div = self.stat_to_div
         # update the divisor
         try:
-            self.caller.divisor = int(self.divisor_input.text)
+            model.divisor = int(self.divisor_input.text)
         except ValueError: # for if there is a blank where an int expected
-            self.caller.divisor = 1
+            model.divisor = 1
         # update whether to round up or down
-        self.caller.rounddown = self.rounddown_radio.active
+        model.rounddown = self.rounddown_radio.active
         # update whether the '+' should be before the number
-        self.caller.showplus = self.nfcheckbar.nfcheck.active
+        model.showplus = self.nfcheckbar.nfcheck.active
         # update whether this stat is available for calculations
-        self.caller.calcavail = self.cacheckbar.cacheck.active
+        model.calcavail = self.cacheckbar.cacheck.active
         # do all other updates
         EditStatBarPopup.done_edit(self, btn)
         
 # bar with fraction of another stat
 class StatBarFraction(StatBar):
-    def __init__(self, stat_to_div = None, divisor = 2, rounddown = True, showplus = False, **kwargs):
-        StatBar.__init__(self, **kwargs)
+    def __init__(self, model, **kwargs):
+        StatBar.__init__(self, model, **kwargs)
         
-        self.stat_to_div = stat_to_div
-        self.divisor = divisor
-        self.rounddown = rounddown
-        self.showplus = showplus
-        
-        self.statlbl = Button(text = self.value_text(), size_hint_x = 0.5)
+        self.statlbl = Button(text = model.value_text(), size_hint_x = 0.5)
         self.statlbl.bind(on_release = self.show_components)
         self.add_widget(self.statlbl, index = len(self.children) - 1)
         
     def show_components(self, btn):
-        comp_popup = Popup(title = "Calculation of " + self.statname)
-        comp_popup.content = Label(text = self.stat_to_div.statname + ": " + self.stat_to_div.value_text() + \
-                                   "\n\ndivided by " + str(self.divisor) + "\n\nrounded " + \
-                                   ("down" if self.rounddown else "up"))
+        model = self.model
+        comp_popup = Popup(title = "Calculation of " + model.statname)
+        comp_popup.content = Label(text = model.stat_to_div.statname + ": " + model.stat_to_div.value_text() + \
+                                   "\n\ndivided by " + str(model.divisor) + "\n\nrounded " + \
+                                   ("down" if model.rounddown else "up"))
         comp_popup.bind(on_touch_up = comp_popup.dismiss)
         comp_popup.open()
-    def value_for_sum(self):
-        if self.stat_to_div == None:
-            return 0
-        else:
-            numerator = self.stat_to_div.value_for_sum()
-            val =  numerator // self.divisor
-            if not self.rounddown and numerator % self.divisor > 0:
-                val += 1
-            return val
-    def value_text(self):
-        if self.showplus:
-            stattext = '{:+d}'.format(self.value_for_sum())
-        else:
-            stattext = str(self.value_for_sum())
-        return stattext
     def update_button_text(self):
-        self.statlbl.text = self.value_text()
+        self.statlbl.text = self.model.value_text()
     def edit_obj(self):
-        edpop = EditStatBarFractionPopup(caller = self, statname = self.statname, statdesc = self.statdesc,
-                                         stat_to_div = self.stat_to_div, divisor = self.divisor,
-                                         title = "Edit " + self.statname, rounddown = self.rounddown)
+        edpop = EditStatBarFractionPopup(caller = self, statname = self.model.statname, statdesc = self.model.statdesc,
+                                         stat_to_div = self.model.stat_to_div, divisor = self.model.divisor,
+                                         title = "Edit " + self.model.statname, rounddown = self.model.rounddown)
         edpop.open()
-    def write_to_file(self, con):
-        con.write("<StatBarFraction>\n")
-        self.write_statbar_info(con)
-        statindex = None if self.stat_to_div == None else masterstatlist.index(self.stat_to_div)
-        con.write("<stat_to_div>{}</stat_to_div>\n".format(statindex))
-        con.write("<divisor>{}</divisor>\n".format(self.divisor))
-        con.write("<rounddown>{}</rounddown>\n".format(self.rounddown))
-        con.write("<showplus>{}</showplus>\n".format(self.showplus))
-        con.write("</StatBarFraction>\n\n")
         
 # popup for editing stat bar with text box
 class EditStatBarTextPopup(EditStatBarPopup):
@@ -741,109 +705,306 @@ class EditStatBarTextPopup(EditStatBarPopup):
         EditStatBarPopup.__init__(self, **kwargs)
         
         self.edlayout.add_widget(Label(text = "Text next to button", size_hint_x = edpop_left_col_size))
-        self.stattext_input = TextInput(text = stattext)
+        self.stattext_input = Factory.TextInput(text = stattext)
         self.edlayout.add_widget(self.stattext_input)
     def done_edit(self, btn):
         # update the stored and printed value for text
-        self.caller.stattext = sanitize_text(self.stattext_input.text)
-        self.caller.statlbl.text = self.caller.stattext
+        self.caller.model.stattext = sanitize_text(self.stattext_input.text)
+        self.caller.statlbl.text = self.caller.model.stattext
         # do all other updates
         EditStatBarPopup.done_edit(self, btn)
     
 # bar with stat button and freestyle text
 class StatBarText(StatBar):
-    def __init__(self, stattext, **kwargs):
-        StatBar.__init__(self, **kwargs)
-        self.stattext = stattext
-        self.statlbl = Label(text = self.stattext, size_hint_y = mybtn_size_hint_y, size_hint_x = 0.5)
+    def __init__(self, model, **kwargs):
+        StatBar.__init__(self, model, **kwargs)
+        self.statlbl = Label(text = model.stattext, size_hint_y = mybtn_size_hint_y, size_hint_x = 0.5)
         nchild = len(self.children)
         self.add_widget(self.statlbl, index = nchild - 1)
+    def show_stat(self, model):
+        StatBar.show_stat(self, model)
+        self.statlbl.text = model.stattext
     def edit_obj(self):
-        edpop = EditStatBarTextPopup(caller = self, statname = self.statname, statdesc = self.statdesc,
-                                     stattext = self.stattext, title = "Edit " + self.statname)
+        edpop = EditStatBarTextPopup(caller = self, statname = self.model.statname, statdesc = self.model.statdesc,
+                                     stattext = self.model.stattext, title = "Edit " + self.model.statname)
         edpop.open()
     def update_text_color(self): # make text white or black as appropriate.
         StatBarSimple.update_text_color(self)
-    def write_to_file(self, con):
-        con.write("<StatBarText>\n")
-        self.write_statbar_info(con)
-        con.write("<stattext>{}</stattext>\n".format(self.stattext))
-        con.write("</StatBarText>\n\n")
         
 # popup to edit a counter for hit points etc.
 class EditStatBarCounterPopup(EditStatBarPopup):
     def __init__(self, defaultval, **kwargs):
         EditStatBarPopup.__init__(self, **kwargs)
         self.edlayout.add_widget(Label(text = "Default value", size_hint_x = edpop_left_col_size))
-        self.val_input = TextInput(text = str(defaultval), input_filter = 'int')
+        self.val_input = Factory.TextInput(text = str(defaultval), input_filter = 'int')
         self.edlayout.add_widget(self.val_input)
         
         self.cacheckbar = CalcAvailCheckbox(caller = self)
         self.layout.add_widget(self.cacheckbar, index = 1)
     def done_edit(self, btn):
+        model = self.caller.model
         # update the stored and printed value
-        self.caller.defaultval = int(self.val_input.text)
-        self.caller.currentval = self.caller.defaultval # reset the current value to the new default
-        self.caller.update_button_text()
+        model.defaultval = int(self.val_input.text)
+        model.currentval = model.defaultval # reset the current value to the new default
         # update whether this stat is available for calculations
-        self.caller.calcavail = self.cacheckbar.cacheck.active
+        model.calcavail = self.cacheckbar.cacheck.active
         # Do all other updates
         EditStatBarPopup.done_edit(self, btn)
 
+# Button that acts once when tapped, and again every repeat_interval while it is held down.
+# step is called with the button each time.
+class RepeatButton(Button):
+    def __init__(self, step, **kwargs):
+        Button.__init__(self, **kwargs)
+        self.step = step
+        self.repeats = 0
+        self.hold_event = None
+    def on_press(self):
+        self.repeats = 0
+        self.hold_event = Clock.schedule_once(self.start_repeating, hold_delay)
+    def start_repeating(self, dt):
+        self.hold_event = Clock.schedule_interval(self.repeat, repeat_interval)
+    def repeat(self, dt):
+        self.repeats += 1
+        self.step(self)
+    def on_touch_up(self, touch):
+        # on_release is not dispatched when the touch is lifted off the button, so stop here
+        if touch.grab_current is self:
+            self.stop_repeating()
+        return Button.on_touch_up(self, touch)
+    def on_release(self):
+        self.stop_repeating()
+        if self.repeats == 0:
+            self.step(self)
+    def stop_repeating(self):
+        if self.hold_event != None:
+            self.hold_event.cancel()
+            self.hold_event = None
+
+# popup to add a number to a counter, or take it away, in one go
+class CounterDeltaPopup(Popup):
+    def __init__(self, caller, **kwargs):
+        Popup.__init__(self, **kwargs)
+        self.caller = caller
+        self.title = "Change " + caller.model.statname
+        self.size_hint = (0.8, None)
+        self.height = 5 * myminheight
+        self.layout = BoxLayout(orientation = "vertical")
+        
+        self.delta_input = Factory.TextInput(hint_text = "How much", multiline = False, input_filter = 'int')
+        self.layout.add_widget(self.delta_input)
+        
+        self.btnbar = BoxLayout()
+        self.add_btn = Button(text = "Add")
+        self.add_btn.bind(on_release = self.apply)
+        self.btnbar.add_widget(self.add_btn)
+        self.sub_btn = Button(text = "Subtract")
+        self.sub_btn.bind(on_release = self.apply)
+        self.btnbar.add_widget(self.sub_btn)
+        self.cancel_btn = Button(text = "Cancel")
+        self.cancel_btn.bind(on_release = self.dismiss)
+        self.btnbar.add_widget(self.cancel_btn)
+        self.layout.add_widget(self.btnbar)
+        
+        self.content = self.layout
+    def apply(self, btn):
+        if self.delta_input.text not in ("", "-"):
+            delta = int(self.delta_input.text)
+            self.caller.change_value(delta if btn is self.add_btn else -delta)
+        self.dismiss()
+
 # bar with counter for hit points etc.
+# Buttons repeat while held down; displayed values are refreshed at most once per frame however fast
+# the counter changes (see refresh_state).
 class StatBarCounter(StatBar):
-    def __init__(self, defaultval, **kwargs):
-        StatBar.__init__(self, **kwargs)
-        self.defaultval = defaultval
-        self.currentval = self.defaultval
+    def __init__(self, model, **kwargs):
+        StatBar.__init__(self, model, **kwargs)
         
-        self.statlbl = Label(text = str(self.currentval), size_hint_y = mybtn_size_hint_y, size_hint_x = 0.3)
+        self.statlbl = Label(text = model.value_text(), size_hint_y = mybtn_size_hint_y, size_hint_x = 0.25)
         nchild = len(self.children)
         self.add_widget(self.statlbl, index = nchild - 1)
         
-        self.incbtn = Button(text = "+", size_hint_y = mybtn_size_hint_y, size_hint_x = 0.05)
-        self.incbtn.bind(on_release = self.increase_value)
+        self.incbtn = RepeatButton(step = self.increase_value, text = "+", size_hint_y = mybtn_size_hint_y,
+                                   size_hint_x = 0.05)
         self.add_widget(self.incbtn, index = nchild - 1)
-        self.decbtn = Button(text = "-", size_hint_y = mybtn_size_hint_y, size_hint_x = 0.05)
-        self.decbtn.bind(on_release = self.decrease_value)
+        self.decbtn = RepeatButton(step = self.decrease_value, text = "-", size_hint_y = mybtn_size_hint_y,
+                                   size_hint_x = 0.05)
         self.add_widget(self.decbtn, index = nchild - 1)
+        self.deltabtn = Button(text = "+/-", size_hint_y = mybtn_size_hint_y, size_hint_x = 0.05)
+        self.deltabtn.bind(on_release = self.open_delta_dialog)
+        self.add_widget(self.deltabtn, index = nchild - 1)
         self.defbtn = Button(text = "Reset", size_hint_y = mybtn_size_hint_y, size_hint_x = 0.1)
         self.defbtn.bind(on_release = self.set_to_default)
         self.add_widget(self.defbtn, index = nchild - 1)
         
+    def change_value(self, delta):
+        self.model.currentval += delta
+        self.value_changed()
     def increase_value(self, btn):
-        self.currentval += 1
-        self.update_button_text()
-        if self.calcavail:
-            update_all_stat_text()
+        self.change_value(1)
     def decrease_value(self, btn):
-        self.currentval -= 1
-        self.update_button_text()
-        if self.calcavail:
-            update_all_stat_text()
+        self.change_value(-1)
+    def open_delta_dialog(self, btn):
+        self._popup = CounterDeltaPopup(caller = self)
+        self._popup.open()
+    def release(self):
+        # the bar may be reused for another counter, which a held button should not change
+        self.incbtn.stop_repeating()
+        self.decbtn.stop_repeating()
+        StatBar.release(self)
     def set_to_default(self, btn):
-        self.currentval = self.defaultval
-        self.update_button_text()
-        if self.calcavail:
-            update_all_stat_text()
+        self.model.currentval = self.model.defaultval
+        self.value_changed()
+    def value_changed(self):
+        update_stat_text(self.model)
+        journal_field(self.model, 'currentval')
     def edit_obj(self):
-        edpop = EditStatBarCounterPopup(caller = self, statname = self.statname, statdesc = self.statdesc,
-                                        defaultval = self.defaultval, title = "Edit " + self.statname)
+        edpop = EditStatBarCounterPopup(caller = self, statname = self.model.statname, statdesc = self.model.statdesc,
+                                        defaultval = self.model.defaultval, title = "Edit " + self.model.statname)
         edpop.open()
-    def value_text(self):
-        return str(self.currentval)
     def update_button_text(self):
-        self.statlbl.text = self.value_text()
-    def value_for_sum(self):
-        return self.currentval
+        self.statlbl.text = self.model.value_text()
     def update_text_color(self): # make text white or black as appropriate.
         StatBarSimple.update_text_color(self)
-    def write_to_file(self, con):
-        con.write("<StatBarCounter>\n")
-        self.write_statbar_info(con)
-        con.write("<defaultval>{}</defaultval>\n".format(self.defaultval))
-        con.write("<currentval>{}</currentval>\n".format(self.currentval))
-        con.write("</StatBarCounter>\n\n")
+
+# popup for adding a stat to a roll of dice
+class AddDiceModifierPopup(AddExistingStatPopup):
+    def __init__(self, **kwargs):
+        AddExistingStatPopup.__init__(self, **kwargs)
+        self.title = "Add stat to roll"
+    def add_stat(self, st):
+        self.caller.add_modifier(st)
+        self.dismiss()
+
+# popup to edit a roll of dice, showing what the roll would be while editing
+class EditStatBarDicePopup(EditStatBarPopup):
+    def __init__(self, expression, statlist_existing, target, **kwargs):
+        EditStatBarPopup.__init__(self, **kwargs)
+        self.statlist_existing = statlist_existing
+        
+        self.edlayout.add_widget(Label(text = "Dice", size_hint_x = edpop_left_col_size))
+        self.expression_input = Factory.TextInput(text = expression, multiline = False,
+                                                  hint_text = "e.g. 1d12+1, 4d6kh3, adv, 2d20kl1")
+        # the roll is worked out once typing stops, not for each partly typed expression
+        self.roll_trigger = Clock.create_trigger(self.show_roll, dice_preview_delay)
+        self.expression_input.bind(text = self.roll_trigger)
+        self.edlayout.add_widget(self.expression_input)
+        
+        # a button for each stat added to the roll, which removes it, and one to add another
+        self.edlayout.add_widget(Label(text = "Stats added", size_hint_x = edpop_left_col_size))
+        self.modifierbar = BoxLayout()
+        self.edlayout.add_widget(self.modifierbar)
+        self.show_modifiers()
+        
+        self.edlayout.add_widget(Label(text = "Roll at least\n(0 for none)", size_hint_x = edpop_left_col_size))
+        self.target_input = Factory.TextInput(text = str(target), multiline = False, input_filter = "int")
+        self.target_input.bind(text = self.roll_trigger)
+        self.edlayout.add_widget(self.target_input)
+        
+        self.edlayout.add_widget(Label(text = "Roll", size_hint_x = edpop_left_col_size))
+        self.roll_lbl = Label()
+        self.edlayout.add_widget(self.roll_lbl)
+        self.show_roll()
+    def show_modifiers(self):
+        self.modifierbar.clear_widgets()
+        self.modifierbtns = [Button(text = s.statname + " " + s.value_text()) for s in self.statlist_existing]
+        for mb in self.modifierbtns:
+            mb.bind(on_release = self.remove_modifier)
+            self.modifierbar.add_widget(mb)
+        addbtn = Button(text = "+", size_hint_x = 0.3)
+        addbtn.bind(on_release = self.pick_modifier)
+        self.modifierbar.add_widget(addbtn)
+    def pick_modifier(self, btn):
+        adpop = AddDiceModifierPopup(caller = self)
+        adpop.open()
+    def add_modifier(self, st):
+        self.statlist_existing.append(st)
+        self.show_modifiers()
+        self.show_roll()
+    def remove_modifier(self, btn):
+        self.statlist_existing.pop(self.modifierbtns.index(btn))
+        self.show_modifiers()
+        self.show_roll()
+    def get_target(self):
+        try:
+            return int(self.target_input.text)
+        except ValueError: # for if there is a blank where an int expected
+            return 0
+    def show_roll(self, *args):
+        # distributions are kept for each expression, so this is quick once the dice have been typed
+        try:
+            dist = statmodel.dice_distribution(self.expression_input.text)
+        except ValueError as e:
+            self.roll_lbl.text = str(e)
+            return
+        modifier = sum([s.value_for_sum() for s in self.statlist_existing])
+        self.roll_lbl.text = dice_summary(dist, modifier, self.get_target())
+    def on_dismiss(self):
+        self.roll_trigger.cancel()
+        EditStatBarPopup.on_dismiss(self)
+    def done_edit(self, btn):
+        model = self.caller.model
+        model.expression = sanitize_text(self.expression_input.text)
+        model.statlist_existing = self.statlist_existing
+        model.target = self.get_target()
+        # do all other updates
+        EditStatBarPopup.done_edit(self, btn)
+
+# popup listing the chance of each total of a roll of dice, leaving out the most unlikely ones
+class DiceChancesPopup(Popup):
+    def __init__(self, model, **kwargs):
+        Popup.__init__(self, **kwargs)
+        self.title = "Chances for " + model.statname
+        self.layout = BoxLayout(orientation = "vertical")
+        dist = model.distribution()
+        modifier = model.modifier()
+        roll = " + ".join([model.expression] + [s.statname for s in model.statlist_existing])
+        percentiles = ", ".join(["{:.0%} at most {}".format(p, dist.percentile(p) + modifier)
+                                 for p in (0.1, 0.25, 0.5, 0.75, 0.9)])
+        self.layout.add_widget(Label(text = roll + "\n" + dice_summary(dist, modifier, model.target) + "\n" + percentiles,
+                                     size_hint_y = None, height = 3 * myminheight))
+        
+        first = dist.percentile(0.001)
+        last = min(dist.percentile(0.999), first + dice_table_rows - 1)
+        self.grid = GridLayout(cols = 3, size_hint_y = None, height = myminheight * (last - first + 2))
+        for text in ["Total", "Chance", "Chance of at least"]:
+            self.grid.add_widget(Label(text = text))
+        for total in range(first, last + 1):
+            self.grid.add_widget(Label(text = str(total + modifier)))
+            self.grid.add_widget(Label(text = "{:.2%}".format(float(dist.chances[total - dist.lowest]))))
+            self.grid.add_widget(Label(text = "{:.2%}".format(dist.chance_at_least(total))))
+        self.scroll = ScrollView()
+        self.scroll.add_widget(self.grid)
+        self.layout.add_widget(self.scroll)
+        
+        self.closebtn = Button(text = "Close", size_hint_y = None, height = myminheight)
+        self.closebtn.bind(on_release = self.dismiss)
+        self.layout.add_widget(self.closebtn)
+        self.content = self.layout
+
+# bar with a roll of dice: the average and range of totals, and the chance of rolling at least a target
+class StatBarDice(StatBar):
+    def __init__(self, model, **kwargs):
+        StatBar.__init__(self, model, **kwargs)
+        
+        self.statlbl = Button(text = model.dice_text(), size_hint_x = 0.5)
+        self.statlbl.bind(on_release = self.show_chances)
+        self.add_widget(self.statlbl, index = len(self.children) - 1)
+        
+    def show_chances(self, btn):
+        try:
+            chances_popup = DiceChancesPopup(model = self.model)
+        except ValueError: # dice that can't be read, shown as "?"
+            return
+        chances_popup.open()
+    def update_button_text(self):
+        self.statlbl.text = self.model.dice_text()
+    def edit_obj(self):
+        edpop = EditStatBarDicePopup(caller = self, statname = self.model.statname, statdesc = self.model.statdesc,
+                                     expression = self.model.expression, target = self.model.target,
+                                     statlist_existing = copy(self.model.statlist_existing),
+                                     title = "Edit " + self.model.statname)
+        edpop.open()
 
 # popup editor for bar with two buttons
 class EditStatBarTwoButtonsPopup(EditStatBarPopup):
@@ -853,42 +1014,39 @@ class EditStatBarTwoButtonsPopup(EditStatBarPopup):
         self.statdesc2 = statdesc2
         
         self.edlayout.add_widget(Label(text = "Name 2", size_hint_x = edpop_left_col_size))
-        self.statname2_input = TextInput(text = statname2, multiline = False)
+        self.statname2_input = Factory.TextInput(text = statname2, multiline = False)
         self.edlayout.add_widget(self.statname2_input)
         
         self.edlayout.add_widget(Label(text = "Popup description 2", size_hint_x = edpop_left_col_size))
-        self.statdesc2_input = TextInput(text = statdesc2)
+        self.statdesc2_input = Factory.TextInput(text = statdesc2)
         self.edlayout.add_widget(self.statdesc2_input)
         
     def done_edit(self, btn):
+        model = self.caller.model
         # update name and description for second stat
-        self.caller.statname2 = sanitize_text(self.statname2_input.text)
-        self.caller.statbtn2.text = self.caller.statname2
-        self.caller.statdesc2 = sanitize_text(self.statdesc2_input.text)
-        self.caller.statbtn2.statdesc = self.caller.statdesc2
+        model.statname2 = sanitize_text(self.statname2_input.text)
+        self.caller.statbtn2.text = model.statname2
+        model.statdesc2 = sanitize_text(self.statdesc2_input.text)
         # do all other updates
         EditStatBarPopup.done_edit(self, btn)
         
 # Bar with two buttons for popup text
 class StatBarTwoButtons(StatBar):
-    def __init__(self, statname2, statdesc2, **kwargs):
-        StatBar.__init__(self, **kwargs)
-        self.statname2 = statname2
-        self.statdesc2 = statdesc2
+    def __init__(self, model, **kwargs):
+        StatBar.__init__(self, model, **kwargs)
         
-        self.statbtn2 = StatButton(statname = self.statname2, statdesc = self.statdesc2)
+        self.statbtn2 = StatButton(statname = model.statname2, model = model, descattr = "statdesc2")
         self.add_widget(self.statbtn2, index = len(self.children) - 1)
+    def show_stat(self, model):
+        StatBar.show_stat(self, model)
+        self.statbtn2.text = model.statname2
+        self.statbtn2.model = model
     def edit_obj(self):
-        edpop = EditStatBarTwoButtonsPopup(caller = self, statname = self.statname, statdesc = self.statdesc,
-                                           statname2 = self.statname2, statdesc2 = self.statdesc2, 
+        model = self.model
+        edpop = EditStatBarTwoButtonsPopup(caller = self, statname = model.statname, statdesc = model.statdesc,
+                                           statname2 = model.statname2, statdesc2 = model.statdesc2, 
                                            title = "Edit row of buttons")
         edpop.open()
-    def write_to_file(self, con):
-        con.write("<StatBarTwoButtons>\n")
-        self.write_statbar_info(con)
-        con.write("<statname2>{}</statname2>\n".format(self.statname2))
-        con.write("<statdesc2>{}</statdesc2>\n".format(self.statdesc2))
-        con.write("</StatBarTwoButtons>\n\n")
  
 # popup editor for bar with two buttons
 class EditStatBarThreeButtonsPopup(EditStatBarTwoButtonsPopup):
@@ -898,45 +1056,49 @@ class EditStatBarThreeButtonsPopup(EditStatBarTwoButtonsPopup):
         self.statdesc3 = statdesc3
         
         self.edlayout.add_widget(Label(text = "Name 3", size_hint_x = edpop_left_col_size))
-        self.statname3_input = TextInput(text = statname3, multiline = False)
+        self.statname3_input = Factory.TextInput(text = statname3, multiline = False)
         self.edlayout.add_widget(self.statname3_input)
         
         self.edlayout.add_widget(Label(text = "Popup description 3", size_hint_x = edpop_left_col_size))
-        self.statdesc3_input = TextInput(text = statdesc3)
+        self.statdesc3_input = Factory.TextInput(text = statdesc3)
         self.edlayout.add_widget(self.statdesc3_input)
         
     def done_edit(self, btn):
+        model = self.caller.model
         # update name and description for second stat
-        self.caller.statname3 = sanitize_text(self.statname3_input.text)
-        self.caller.statbtn3.text = self.caller.statname3
-        self.caller.statdesc3 = sanitize_text(self.statdesc3_input.text)
-        self.caller.statbtn3.statdesc = self.caller.statdesc3
+        model.statname3 = sanitize_text(self.statname3_input.text)
+        self.caller.statbtn3.text = model.statname3
+        model.statdesc3 = sanitize_text(self.statdesc3_input.text)
         # do all other updates
         EditStatBarTwoButtonsPopup.done_edit(self, btn)
  
 # Bar with three buttons for popup text
 class StatBarThreeButtons(StatBarTwoButtons):
-    def __init__(self, statname3, statdesc3, **kwargs):
-        StatBarTwoButtons.__init__(self, **kwargs)
-        self.statname3 = statname3
-        self.statdesc3 = statdesc3
+    def __init__(self, model, **kwargs):
+        StatBarTwoButtons.__init__(self, model, **kwargs)
         
-        self.statbtn3 = StatButton(statname = self.statname3, statdesc = self.statdesc3)
+        self.statbtn3 = StatButton(statname = model.statname3, model = model, descattr = "statdesc3")
         self.add_widget(self.statbtn3, index = len(self.children) - 2)
+    def show_stat(self, model):
+        StatBarTwoButtons.show_stat(self, model)
+        self.statbtn3.text = model.statname3
+        self.statbtn3.model = model
     def edit_obj(self):
-        edpop = EditStatBarThreeButtonsPopup(caller = self, statname = self.statname, statdesc = self.statdesc,
-                                             statname2 = self.statname2, statdesc2 = self.statdesc2,
-                                             statname3 = self.statname3, statdesc3 = self.statdesc3,
+        model = self.model
+        edpop = EditStatBarThreeButtonsPopup(caller = self, statname = model.statname, statdesc = model.statdesc,
+                                             statname2 = model.statname2, statdesc2 = model.statdesc2,
+                                             statname3 = model.statname3, statdesc3 = model.statdesc3,
                                              title = "Edit row of buttons")
         edpop.open()
-    def write_to_file(self, con):
-        con.write("<StatBarThreeButtons>\n")
-        self.write_statbar_info(con)
-        con.write("<statname2>{}</statname2>\n".format(self.statname2))
-        con.write("<statdesc2>{}</statdesc2>\n".format(self.statdesc2))
-        con.write("<statname3>{}</statname3>\n".format(self.statname3))
-        con.write("<statdesc3>{}</statdesc3>\n".format(self.statdesc3))
-        con.write("</StatBarThreeButtons>\n\n")
+
+# classes of stat bar used to display each class of stat
+statbar_classes = {Stat: StatBar, SimpleStat: StatBarSimple, SumStat: StatBarSum, DDAbilityStat: DDAbilityBar,
+                   FractionStat: StatBarFraction, TextStat: StatBarText, CounterStat: StatBarCounter,
+                   DiceStat: StatBarDice, TwoButtonsStat: StatBarTwoButtons,
+                   ThreeButtonsStat: StatBarThreeButtons}
+# make a stat bar to display a stat
+def make_statbar(stat):
+    return statbar_classes[type(stat)](model = stat)
 
 # popup dialog for adding a new item to the sheet        
 class AddStatPopup(Popup):
@@ -983,6 +1145,10 @@ class AddStatPopup(Popup):
             self.threebuttons_btn = Button(text = "Row of three buttons")
             self.threebuttons_btn.bind(on_release = self.add_threebuttons)
             self.layout.add_widget(self.threebuttons_btn)
+            
+            self.dice_btn = Button(text = "Roll of dice, such as an attack or damage")
+            self.dice_btn.bind(on_release = self.add_dice)
+            self.layout.add_widget(self.dice_btn)
         
         self.cancelbtn = Button(text = "Cancel")
         self.cancelbtn.bind(on_release = self.dismiss)
@@ -990,44 +1156,48 @@ class AddStatPopup(Popup):
         
         self.content = self.layout
     def add_stat_simple(self, btn):
-        newstat = StatBarSimple(statname = "", statdesc = "", statval = 0)
+        newstat = SimpleStat(statname = "", statdesc = "", statval = 0)
         self.finish_adding_stats(newstat)
     def add_stat_sum(self, btn):
-        newstat = StatBarSum(statname = "", statdesc = "", statlist_existing = [], statlist_new = [])
+        newstat = SumStat(statname = "", statdesc = "", statlist_existing = [], statlist_new = [])
         self.finish_adding_stats(newstat)
     def add_dd_ability(self, btn):
-        newstat = DDAbilityBar(statname = "", 
-                               statdesc = "Ability score is listed first, followed by the roll modifier in parentheses.",
-                               statlist_existing = [], 
-                               statlist_new = [StatBarSimple(statname = "Base score", 
-                                                             statdesc = "Score assigned at level 1 before racial modifiers",
-                                                             statval = 10)])
+        newstat = DDAbilityStat(statname = "", 
+                                statdesc = "Ability score is listed first, followed by the roll modifier in parentheses.",
+                                statlist_existing = [], 
+                                statlist_new = [SimpleStat(statname = "Base score", 
+                                                           statdesc = "Score assigned at level 1 before racial modifiers",
+                                                           statval = 10)])
         self.finish_adding_stats(newstat)
     def add_counter(self, btn):
-        newstat = StatBarCounter(statname = "", statdesc = "", defaultval = 0)
+        newstat = CounterStat(statname = "", statdesc = "", defaultval = 0)
         self.finish_adding_stats(newstat)
     def add_fraction(self, btn):
-        newstat = StatBarFraction(statname = "", statdesc = "")
+        newstat = FractionStat(statname = "", statdesc = "")
         self.finish_adding_stats(newstat)
     def add_stat_text(self, btn):
-        newstat = StatBarText(statname = "", statdesc = "", stattext = "")
+        newstat = TextStat(statname = "", statdesc = "", stattext = "")
         self.finish_adding_stats(newstat)
     def add_bigbutton(self, btn):
-        newstat = StatBar(statname = "", statdesc = "")
-        newstat.statbtn.size_hint_x = 1
+        newstat = Stat(statname = "", statdesc = "", btnwidth = 1)
         self.finish_adding_stats(newstat)
     def add_twobuttons(self, btn):
-        newstat = StatBarTwoButtons(statname = "", statdesc = "", statname2 = "", statdesc2 = "")
+        newstat = TwoButtonsStat(statname = "", statdesc = "", statname2 = "", statdesc2 = "")
         self.finish_adding_stats(newstat)
     def add_threebuttons(self, btn):
-        newstat = StatBarThreeButtons(statname = "", statdesc = "", statname2 = "", statdesc2 = "",
-                                      statname3 = "", statdesc3 = "")
+        newstat = ThreeButtonsStat(statname = "", statdesc = "", statname2 = "", statdesc2 = "",
+                                   statname3 = "", statdesc3 = "")
+        self.finish_adding_stats(newstat)
+    def add_dice(self, btn):
+        newstat = DiceStat(statname = "", statdesc = "", expression = "1d20")
         self.finish_adding_stats(newstat)
     def finish_adding_stats(self, stat):
-        stat.edit_obj()
-        self.caller.statlist.append(stat)
-        self.caller.add_widget(stat)
-        masterstatlist.append(stat)
+        register_stats([stat])
+        link_stat(stat)
+        journal_new_stats([stat])
+        statbar = self.caller.append_stat(stat)
+        statbar.edit_obj()
+        self.caller.statlist_changed()
         self.dismiss()
 
 # Box for entering a color
@@ -1040,17 +1210,17 @@ class RGBbox(BoxLayout):
         self.b = b
         
         self.entrygrid.add_widget(Label(text = "Red (0-255)"))
-        self.r_box = TextInput(text = str(int(r*255)), input_filter = "int")
+        self.r_box = Factory.TextInput(text = str(int(r*255)), input_filter = "int")
         self.r_box.bind(text = self.get_color_from_text)
         self.entrygrid.add_widget(self.r_box)
         
         self.entrygrid.add_widget(Label(text = "Green (0-255)"))
-        self.g_box = TextInput(text = str(int(g*255)), input_filter = "int")
+        self.g_box = Factory.TextInput(text = str(int(g*255)), input_filter = "int")
         self.g_box.bind(text = self.get_color_from_text)
         self.entrygrid.add_widget(self.g_box)
         
         self.entrygrid.add_widget(Label(text = "Blue (0-255)"))
-        self.b_box = TextInput(text = str(int(b*255)), input_filter = "int")
+        self.b_box = Factory.TextInput(text = str(int(b*255)), input_filter = "int")
         self.b_box.bind(text = self.get_color_from_text)
         self.entrygrid.add_widget(self.b_box)
         
@@ -1090,29 +1260,117 @@ class EditColorPopup(Popup):
         self.add_widget(self.layout)
     def done_edit(self, btn):
         # update background colors
-        self.caller.red_bg = self.bgbox.r
-        self.caller.green_bg = self.bgbox.g
-        self.caller.blue_bg = self.bgbox.b
-        [st.update_text_color() for st in self.caller.statlist]
+        self.caller.set_color(self.bgbox.r, self.bgbox.g, self.bgbox.b)
         self.dismiss()
-    def on_open(self):
-        # keep from changing pages while open
-        global edit_window_open
-        edit_window_open += 1
-    def on_dismiss(self):
-        global edit_window_open
-        edit_window_open -= 1
         
-# A boxlayout that has a group of stats.
+# Scrolling list of the stats on a page.  Rows share the height of the page, but are never
+# shorter than myminheight; if there are too many for that, the list scrolls.  Only the rows on
+# screen have a stat bar, and bars for rows that scroll out of view are reused for the ones
+# that scroll into view, so long pages cost no more to show than short ones.
+class StatRows(ScrollView):
+    def __init__(self, box, **kwargs):
+        ScrollView.__init__(self, **kwargs)
+        self.do_scroll_x = False
+        self.box = box # the BoxOfStats whose page is shown
+        self.editmode = True
+        self.bars = {} # stat bar for each stat on screen
+        self.sparebars = {} # stat bars not in use, by class
+        self.rowheight = myminheight
+        self.layout = RelativeLayout(size_hint_y = None, height = 0)
+        self.add_widget(self.layout)
+        self.bind(scroll_y = self.refresh, height = self.refresh)
+    def visible_range(self):
+        # first and last rows on screen, with one extra on either side
+        offset = (1 - self.scroll_y) * max(self.layout.height - self.height, 0) # from the top
+        first = max(int(offset // self.rowheight) - 1, 0)
+        last = min(int((offset + self.height) // self.rowheight) + 1, len(self.box.page.statlist) - 1)
+        return first, last
+    def refresh(self, *args):
+        defer_until_batch_end(self.show_rows)
+    def show_rows(self):
+        # show the rows that are on screen, after scrolling or a change to the list of stats
+        if self.box.page.view is not self.box:
+            return # page was dropped (see MCpages) before a batch finished
+        statlist = self.box.page.statlist
+        self.rowheight = max(myminheight, self.height / max(len(statlist), 1))
+        self.layout.height = self.rowheight * len(statlist)
+        first, last = self.visible_range()
+        shown = statlist[first:last + 1]
+        for stat in set(self.bars) - set(shown):
+            self.put_away(self.bars.pop(stat))
+        [self.place_row(i, stat) for i, stat in enumerate(shown, first)]
+    def update_rows(self, lo, hi):
+        # show rows lo to hi again after stats were moved among them, without touching other rows.
+        # Only rows on screen are placed; of the rest, only the ends of the range and the rows just
+        # beyond the screen can have a bar left over from before the move.
+        if in_batch():
+            return self.refresh()
+        statlist = self.box.page.statlist
+        first, last = self.visible_range()
+        for i in {lo, hi, first - 1, last + 1}:
+            if lo <= i <= hi and not first <= i <= last and statlist[i] in self.bars:
+                self.put_away(self.bars.pop(statlist[i]))
+        [self.place_row(i, statlist[i]) for i in range(max(lo, first), min(hi, last) + 1)]
+    def place_row(self, i, stat):
+        if stat not in self.bars:
+            self.bars[stat] = self.get_bar(stat)
+        self.bars[stat].y = self.layout.height - (i + 1) * self.rowheight
+        self.bars[stat].height = self.rowheight
+    def get_bar(self, stat):
+        # reuse a spare stat bar of the right class if there is one
+        spares = self.sparebars.get(statbar_classes[type(stat)])
+        if spares:
+            bar = spares.pop()
+            bar.show_stat(stat)
+        else:
+            bar = make_statbar(stat)
+            bar.size_hint_y = None
+            if not self.editmode:
+                bar.leave_edit_mode()
+        bar.box = self.box
+        self.layout.add_widget(bar)
+        bar.update_text_color()
+        return bar
+    def put_away(self, bar):
+        bar.release()
+        self.layout.remove_widget(bar)
+        self.sparebars.setdefault(type(bar), []).append(bar)
+    def scroll_to_stat(self, stat):
+        # make sure a stat's row is on screen, returning its stat bar
+        self.show_rows()
+        if stat not in self.bars:
+            offset = self.box.page.statlist.index(stat) * self.rowheight
+            self.scroll_y = max(0, 1 - offset / (self.layout.height - self.height))
+            self.show_rows()
+        return self.bars[stat]
+    def set_edit_mode(self, editmode):
+        self.editmode = editmode
+        for bar in list(self.bars.values()) + [b for spares in self.sparebars.values() for b in spares]:
+            if editmode:
+                bar.enter_edit_mode()
+            else:
+                bar.leave_edit_mode()
+    def update_text_color(self):
+        [bar.update_text_color() for bar in self.bars.values()]
+    def release(self):
+        [bar.release() for bar in self.bars.values()]
+
+# A boxlayout that displays a page of stats.
 class BoxOfStats(BoxLayout):
     red_bg = NumericProperty(0)
     green_bg = NumericProperty(0.5)
     blue_bg = NumericProperty(0.55)
-    def __init__(self, statlist, numbersOnly = False, **kwargs):
+    def __init__(self, page, numbersOnly = False, ownerstat = None, editmode = True, **kwargs):
         BoxLayout.__init__(self, **kwargs)
         self.orientation = "vertical"
-        self.statlist = statlist
+        self.page = page
+        page.view = self
         self.numbersOnly = numbersOnly # can this box contain non-numeric stat bars
+        self.ownerstat = ownerstat # the SumStat whose components these are, if any
+        self.editmode = True
+        self.red_bg = page.red_bg
+        self.green_bg = page.green_bg
+        self.blue_bg = page.blue_bg
         
         self.add_stat_btn = Button(text = "Add new item", height = myminheight, size_hint_y = None)
         self.add_stat_btn.bind(on_release = self.add_stat)
@@ -1129,40 +1387,82 @@ class BoxOfStats(BoxLayout):
         self.enter_edit_btn = Button(text = "Enter edit mode", height = myminheight, size_hint_y = None)
         self.enter_edit_btn.bind(on_release = self.enter_edit_mode)
         
-        # draw all stats
-        [self.add_widget(s) for s in self.statlist]
+        # stats, in the same order as page.statlist
+        self.rows = StatRows(box = self)
+        self.add_widget(self.rows)
+        if not editmode:
+            self.leave_edit_mode(None)
         
     def add_stat(self, btn):
         self.statpop = AddStatPopup(caller = self)
         self.statpop.open()
+    def append_stat(self, stat):
+        # add a stat to the end of the page, returning the stat bar made for it
+        self.page.statlist.append(stat)
+        return self.rows.scroll_to_stat(stat)
+    def delete_stat(self, statbar):
+        stat = statbar.model
+        self.page.statlist.remove(stat)
+        self.rows.refresh()
+        # stats calculated from it no longer are, and are saved without it before it is deleted
+        for s in remove_stat(stat):
+            update_stat_text(s)
+            journal_stat(s)
+        stat.view = None
+        journal_delete(stat)
+        self.statlist_changed()
+    def statlist_changed(self):
+        # stats added or deleted; if they are components of a sum, its value changes
+        if self.ownerstat != None:
+            link_stat(self.ownerstat)
+            update_stat_text(self.ownerstat)
+        self.journal_changes()
+    def journal_changes(self):
+        # record a change to the page in the sheet's journal.  Components of a sum are saved with the sum.
+        if self.ownerstat != None:
+            journal_stat(self.ownerstat)
+        else:
+            journal_page(self.page)
+    def swap_stats(self, i, j):
+        self.page.swap_stats(i, j)
+        self.rows.update_rows(min(i, j), max(i, j))
+        self.journal_changes()
+    def move_stat(self, stat, newindex):
+        # move a stat to another position on the page
+        i = self.page.statlist.index(stat)
+        newindex = min(max(newindex, 0), len(self.page.statlist) - 1)
+        self.page.move_stat(i, newindex)
+        self.rows.update_rows(min(i, newindex), max(i, newindex))
+        self.journal_changes()
     def redraw(self):
-        for s in self.statlist:
-            self.remove_widget(s)
-        for s in self.statlist:
-            self.add_widget(s)
+        self.rows.refresh()
+    def release(self):
+        # stop displaying the stats on this page, so that the widgets can be dropped
+        self.rows.release()
+        self.page.view = None
     def leave_edit_mode(self, btn):
-        [s.leave_edit_mode() for s in self.statlist]
+        self.editmode = False
+        self.rows.set_edit_mode(False)
         self.remove_widget(self.add_stat_btn)
         self.remove_widget(self.edit_color_btn)
         self.remove_widget(self.leave_edit_btn)
-        self.add_widget(self.enter_edit_btn, index = len(self.statlist))
+        self.add_widget(self.enter_edit_btn, index = 1)
     def enter_edit_mode(self, btn):
-        [s.enter_edit_mode() for s in self.statlist]
-        self.add_widget(self.add_stat_btn, index = len(self.statlist))
-        self.add_widget(self.edit_color_btn, index = len(self.statlist))
-        self.add_widget(self.leave_edit_btn, index = len(self.statlist))
+        self.editmode = True
+        self.rows.set_edit_mode(True)
+        self.add_widget(self.add_stat_btn, index = 1)
+        self.add_widget(self.edit_color_btn, index = 1)
+        self.add_widget(self.leave_edit_btn, index = 1)
         self.remove_widget(self.enter_edit_btn)
     def edit_color(self, btn):
         self.colpop = EditColorPopup(caller = self, currentcol = [self.red_bg, self.green_bg, self.blue_bg])
         self.colpop.open()
-    def write_to_file(self, con):
-        con.write("<BoxOfStats>\n")
-        con.write("<red_bg>{}</red_bg>\n".format(self.red_bg))
-        con.write("<green_bg>{}</green_bg>\n".format(self.green_bg))
-        con.write("<blue_bg>{}</blue_bg>\n".format(self.blue_bg))
-        statindex = [str(masterstatlist.index(s)) for s in self.statlist]
-        con.write("<statlist>{}</statlist>\n".format(",".join(statindex)))
-        con.write("</BoxOfStats>\n\n")
+    def set_color(self, r, g, b):
+        self.red_bg = self.page.red_bg = r
+        self.green_bg = self.page.green_bg = g
+        self.blue_bg = self.page.blue_bg = b
+        defer_until_batch_end(self.rows.update_text_color)
+        self.journal_changes()
         
 # popup for saving sheet
 class SavePopup(Popup):
@@ -1172,11 +1472,11 @@ class SavePopup(Popup):
         self.layout = BoxLayout(orientation = "vertical")
         self.caller = caller
         
-        self.filechooser = FileChooserListView()
+        self.filechooser = Factory.FileChooserListView()
         self.filechooser.bind(on_submit = self.select_file)
         self.layout.add_widget(self.filechooser)
         
-        self.textinput = TextInput(size_hint_y = None, height = 30, multiline = False)
+        self.textinput = Factory.TextInput(size_hint_y = None, height = 30, multiline = False)
         self.layout.add_widget(self.textinput)
         
         self.savebar = BoxLayout(size_hint_y = None, height = 30)
@@ -1198,22 +1498,16 @@ class SavePopup(Popup):
             linebreak = filename.rfind("\n") # if enter had been hit in text box
             if linebreak > -1:
                 filename = filename[(linebreak+1):]
-            mycon = open(os.path.join(self.filechooser.path, filename), mode = "wt")
-            
-            # write header
-            mycon.write("#MetaChar version {}\n\n".format(version_str))
-            
-            # write each StatBar to the file
-            mycon.write("<masterstatlist>\n\n")
-            [s.write_to_file(mycon) for s in masterstatlist]
-            mycon.write("</masterstatlist>\n\n")
-            
-            # write each BoxOfStats to the file
-            mycon.write("<MCpages>\n\n")
-            [p.write_to_file(mycon) for p in self.caller.parent.statspages]
-            mycon.write("</MCpages>\n\n")
+            # text or binary file, depending on the extension.  Later changes are kept in a journal next to it.
+            self.caller.parent.finish_autosave()
+            path = os.path.join(self.filechooser.path, filename)
+            # another open sheet saved to the same file is replaced by this one
+            opened = find_open_sheet(path)
+            if opened != None and opened is not self.caller.parent.sheet:
+                self.caller.parent.close_open_sheet(opened)
+            save_sheet_and_journal(path, self.caller.parent.sheet)
+            self.caller.parent.show_autosave_status("saved")
         finally:
-            mycon.close()
             self.dismiss()
             
 # popup for loading sheet
@@ -1224,11 +1518,11 @@ class LoadPopup(Popup):
         self.layout = BoxLayout(orientation = "vertical")
         self.caller = caller
         
-        self.filechooser = FileChooserListView()
+        self.filechooser = Factory.FileChooserListView()
         self.filechooser.bind(on_submit = self.select_file)
         self.layout.add_widget(self.filechooser)
         
-        self.textinput = TextInput(size_hint_y = None, height = 30, multiline = False)
+        self.textinput = Factory.TextInput(size_hint_y = None, height = 30, multiline = False)
         self.layout.add_widget(self.textinput)
         
         self.loadbar = BoxLayout(size_hint_y = None, height = 30)
@@ -1246,78 +1540,339 @@ class LoadPopup(Popup):
         if len(chooser.selection) > 0:
             self.textinput.text = chooser.selection[0]
     def load_sheet(self, btn):
-        global masterstatlist
         try:
             filename = self.textinput.text
             linebreak = filename.rfind("\n") # if enter had been hit in text box
             if linebreak > -1:
                 filename = filename[(linebreak+1):]
-            mycon = open(os.path.join(self.filechooser.path, filename), mode = "rt")
-            filetext = mycon.read()
-            filestruct = read_xml(filetext)
-            masterstatlist = [] # clear existing stat list
-            # clear pages
-            [self.caller.parent.remove_widget(sp) for sp in self.caller.parent.statspages] 
-            self.caller.parent.statspages = []
-            # read masterstatlist
-            for s in filestruct[0][1]:
-                thisclass = globals()[s[0]] # the class of statbar we are making
-                initvals = dict() # to hold argument values for initialization
-                attrvals = [] # to hold values for additional attributes
-                for a in s[1]: # loop through attributes
-                    if a[0] in initargs:
-                        if a[0] not in {"statlist_existing", "stat_to_div"}:
-                            # convert to right format and add to dict for initialization
-                            initvals[a[0]] = conv_fns[a[0]](a[1])  
-                    else:
-                        if a[0] != "childstats.statlist":
-                            # convert to right format and add to attribute list
-                            attrvals.append([a[0], conv_fns[a[0]](a[1])])
-                thissb = thisclass(**initvals) # the statbar object
-                for a in attrvals:
-                    # set additional attributes
-                    if a[0] == 'statbtn.size_hint_x':
-                        thissb.statbtn.size_hint_x = a[1]
-                    else:
-                        setattr(thissb, a[0], a[1])
-                masterstatlist.append(thissb)  # add to masterstatlist
-            # connect stats to each other
-            for i in range(len(masterstatlist)):
-                if isinstance(masterstatlist[i], StatBarSum):
-                    se_text = [a[1] for a in filestruct[0][1][i][1] if a[0] == "statlist_existing"][0]
-                    sn_text = [a[1] for a in filestruct[0][1][i][1] if a[0] == "childstats.statlist"][0]
-                    se = conv_statlist(se_text) # existing stats
-                    sn = conv_statlist(sn_text) # stats just within this stat
-                    masterstatlist[i].statlist_existing = se
-                    masterstatlist[i].childstats.statlist = sn
-                    masterstatlist[i].childstats.redraw() # calls add widget to add to BoxOfStats
-                    masterstatlist[i].update_button_text()
-                if isinstance(masterstatlist[i], StatBarFraction):
-                    sd_text = [a[1] for a in filestruct[0][1][i][1] if a[0] == "stat_to_div"][0]
-                    sd = conv_stat(sd_text)
-                    masterstatlist[i].stat_to_div = sd
-                    masterstatlist[i].update_button_text()
-            # read MCpages (list of box of stats)
-            for b in filestruct[1][1]:
-                attrvals = [] # color attributes to add
-                for x in b[1]:
-                    if x[0] == 'statlist':
-                        thisstatlist = conv_fns[x[0]](x[1])
-                    else:
-                        attrvals.append([x[0], conv_fns[x[0]](x[1])])
-                thisbox = BoxOfStats(statlist = thisstatlist)
-                for a in attrvals:
-                    setattr(thisbox, a[0], a[1])
-                self.caller.parent.statspages.append(thisbox)
-                self.caller.parent.add_widget(thisbox)
-            # update text colors now that we have background colors
-            [st.update_text_color() for st in masterstatlist]
-            # leave edit mode for all pages
-            [sb.leave_edit_mode(None) for sb in self.caller.parent.statspages]
+            # read stats and pages from a text or binary file while showing progress
+            self.caller.parent.open_sheet(os.path.join(self.filechooser.path, filename))
         finally:
-            mycon.close()
             self.dismiss()
+
+# Popup with a progress bar, shown while a sheet file is read on a worker thread.  Once it has been
+# read, the sheet is shown, and the one shown before stays open.  The popup can be hidden to keep using
+# the sheet shown meanwhile; the new sheet is then only opened, for switching to later.  sheetpath is the
+# file the sheet is saved to and journaled next to, if path is a copy of it.  on_done, if given, is called
+# once the popup is done.
+class LoadingPopup(Popup):
+    def __init__(self, mcpages, path, sheetpath = None, on_done = None, **kwargs):
+        Popup.__init__(self, **kwargs)
+        self.sheetpath = path if sheetpath == None else sheetpath
+        self.title = "Loading " + os.path.basename(self.sheetpath)
+        self.auto_dismiss = False
+        self.size_hint = (0.8, None)
+        self.height = 4 * myminheight
+        self.mcpages = mcpages
+        self.path = path
+        self.on_done = on_done
+        self.hidden = False
+        self.layout = BoxLayout(orientation = "vertical")
+        self.progressbar = Factory.ProgressBar(max = 1)
+        self.layout.add_widget(self.progressbar)
+        self.hide_btn = Button(text = "Keep loading in the background", size_hint_y = None, height = myminheight)
+        self.hide_btn.bind(on_release = self.hide)
+        self.layout.add_widget(self.hide_btn)
+        self.content = self.layout
+        
+        self.progress_event = Clock.schedule_interval(self.show_progress, 0)
+        # the journal is replayed on the worker thread too
+        self.loader = SheetLoader(path, on_done = self.loaded, sheetpath = self.sheetpath)
+    def show_progress(self, dt):
+        self.progressbar.value = self.loader.progress
+    def hide(self, btn):
+        self.hidden = True
+        self.progress_event.cancel()
+        self.dismiss()
+    @mainthread
+    def loaded(self):
+        self.progress_event.cancel()
+        if self.loader.error != None:
+            self.title = "Could not load " + os.path.basename(self.sheetpath)
+            self.layout.clear_widgets()
+            self.layout.add_widget(Label(text = str(self.loader.error)))
+            close_btn = Button(text = "Close", size_hint_y = None, height = 30)
+            close_btn.bind(on_release = self.dismiss)
+            self.layout.add_widget(close_btn)
+            if self.hidden:
+                self.open()
+        else:
+            sheet = self.loader.result()
+            # the file may have been opened again while this was loading; only one copy is kept
+            opened = find_open_sheet(self.sheetpath)
+            if opened != None:
+                stop_journal(sheet)
+                sheet = opened
+            if self.hidden:
+                add_open_sheet(sheet)
+                self.mcpages.show_sheet_count()
+            else:
+                with batch_update():
+                    # show pages out of edit mode
+                    self.mcpages.show_sheet(sheet, editmode = False)
+                self.dismiss()
+        if self.on_done != None:
+            self.on_done()
+        
+# popup for starting a new sheet from a template, or saving the sheet as a template
+class TemplatePopup(Popup):
+    def __init__(self, caller, **kwargs):
+        Popup.__init__(self, **kwargs)
+        self.title = "New character from template"
+        self.layout = BoxLayout(orientation = "vertical")
+        self.caller = caller
+        
+        # one button for each template
+        self.names = list(templates)
+        self.templatebtns = [Button(text = name) for name in self.names]
+        [tb.bind(on_release = self.use_template) for tb in self.templatebtns]
+        [self.layout.add_widget(tb) for tb in self.templatebtns]
+        
+        self.savebar = BoxLayout(size_hint_y = None, height = myminheight)
+        self.name_input = Factory.TextInput(hint_text = "Name for a new template", multiline = False)
+        self.savebar.add_widget(self.name_input)
+        self.save_btn = Button(text = "Save this sheet as a template")
+        self.save_btn.bind(on_release = self.save_as_template)
+        self.savebar.add_widget(self.save_btn)
+        self.layout.add_widget(self.savebar)
+        
+        self.cancel_btn = Button(text = "Cancel", size_hint_y = None, height = myminheight)
+        self.cancel_btn.bind(on_release = self.dismiss)
+        self.layout.add_widget(self.cancel_btn)
+        
+        self.content = self.layout
+    def use_template(self, btn):
+        try:
+            self.caller.new_from_template(self.names[self.templatebtns.index(btn)])
+        except (OSError, ValueError) as e:
+            self.title = "Could not use template: " + str(e)
+            return
+        self.dismiss()
+    def save_as_template(self, btn):
+        try:
+            save_template(self.name_input.text, os.path.join(App.get_running_app().user_data_dir, templates_dirname),
+                          self.caller.parent.sheet)
+        except (OSError, ValueError) as e:
+            self.title = "Could not save template: " + str(e)
+            return
+        self.dismiss()
+
+# popup listing the sheets kept open, e.g. a whole party, for switching between them or closing them
+class OpenSheetsPopup(Popup):
+    def __init__(self, mcpages, **kwargs):
+        Popup.__init__(self, **kwargs)
+        self.title = "Open sheets"
+        self.mcpages = mcpages
+        self.layout = BoxLayout(orientation = "vertical")
+        self.rows = BoxLayout(orientation = "vertical")
+        self.layout.add_widget(self.rows)
+        
+        self.cancel_btn = Button(text = "Cancel", size_hint_y = None, height = myminheight)
+        self.cancel_btn.bind(on_release = self.dismiss)
+        self.layout.add_widget(self.cancel_btn)
+        
+        self.content = self.layout
+        self.show_sheets()
+    def show_sheets(self):
+        # a row for each open sheet, with buttons to show it and to close it
+        self.rows.clear_widgets()
+        self.sheets = list(sheet_state['open'])
+        self.showbtns = []
+        self.closebtns = []
+        for sheet in self.sheets:
+            row = BoxLayout(size_hint_y = None, height = myminheight)
+            showbtn = Button(text = sheet.name() + (" (shown)" if sheet is self.mcpages.sheet else ""))
+            showbtn.bind(on_release = self.show_sheet)
+            row.add_widget(showbtn)
+            self.showbtns.append(showbtn)
+            closebtn = Button(text = "Close", size_hint_x = 0.25)
+            closebtn.bind(on_release = self.close_sheet)
+            row.add_widget(closebtn)
+            self.closebtns.append(closebtn)
+            self.rows.add_widget(row)
+        self.rows.add_widget(Widget()) # keeps the rows at the top
+    def show_sheet(self, btn):
+        with batch_update():
+            self.mcpages.show_sheet(self.sheets[self.showbtns.index(btn)], editmode = False)
+        self.dismiss()
+    def close_sheet(self, btn):
+        self.mcpages.close_open_sheet(self.sheets[self.closebtns.index(btn)])
+        self.show_sheets()
+
+# popup for picking a stat to change in what-if scenarios
+class ScenarioStatPopup(AddExistingStatPopup):
+    def __init__(self, **kwargs):
+        AddExistingStatPopup.__init__(self, **kwargs)
+        self.title = "Stat to change in each scenario"
+    def add_stat(self, st):
+        self.caller.add_input(st)
+        self.dismiss()
+
+# Scrolling table of stats in what-if scenarios, a row for each stat and a column for each scenario shown.
+# Like StatPickerRows, only the rows on screen have widgets.
+class ScenarioRows(ScrollView):
+    def __init__(self, **kwargs):
+        ScrollView.__init__(self, **kwargs)
+        self.do_scroll_x = False
+        self.results = None
+        self.stats = []
+        self.first = 0 # first scenario shown
+        self.rows = {} # row on screen, by index in stats
+        self.sparerows = []
+        self.rowheight = myminheight
+        self.layout = RelativeLayout(size_hint_y = None, height = 0)
+        self.add_widget(self.layout)
+        self.bind(scroll_y = self.show_rows, height = self.show_rows)
+    def set_results(self, results, stats, first):
+        self.results = results
+        self.stats = stats
+        self.first = first
+        [self.put_away(i) for i in list(self.rows)]
+        self.layout.height = self.rowheight * len(stats)
+        self.show_rows()
+    def show_rows(self, *args):
+        offset = (1 - self.scroll_y) * max(self.layout.height - self.height, 0) # from the top
+        first = max(int(offset // self.rowheight) - 1, 0)
+        last = min(int((offset + self.height) // self.rowheight) + 1, len(self.stats) - 1)
+        [self.put_away(i) for i in list(self.rows) if not first <= i <= last]
+        for i in range(first, last + 1):
+            if i not in self.rows:
+                self.rows[i] = self.get_row(self.stats[i])
+            self.rows[i].y = self.layout.height - (i + 1) * self.rowheight
+    def get_row(self, stat):
+        if len(self.sparerows) > 0:
+            row = self.sparerows.pop()
+        else:
+            row = BoxLayout(size_hint_y = None, height = self.rowheight)
+            row.labels = [Label() for i in range(scenario_columns + 1)]
+            [row.add_widget(lbl) for lbl in row.labels]
+        row.labels[0].text = stat.statname
+        for j, lbl in enumerate(row.labels[1:]):
+            i = self.first + j
+            lbl.text = self.results.text(stat, i) if i < self.results.count else ""
+        self.layout.add_widget(row)
+        return row
+    def put_away(self, i):
+        row = self.rows.pop(i)
+        self.layout.remove_widget(row)
+        self.sparerows.append(row)
+
+# Popup for what-if scenarios: pick stats and give values for them, such as "1-20" for a level, and every
+# stat on the sheet is shown for each scenario.  The sheet itself isn't changed.
+class ScenarioPopup(Popup):
+    def __init__(self, **kwargs):
+        Popup.__init__(self, **kwargs)
+        self.title = "What-if scenarios"
+        self.layout = BoxLayout(orientation = "vertical")
         
+        # a row for each stat given values, with the stat's name, its values and a button to remove it
+        self.inputstats = []
+        self.inputs = BoxLayout(orientation = "vertical", size_hint_y = None, height = 0)
+        self.layout.add_widget(self.inputs)
+        
+        self.buttonbar = BoxLayout(size_hint_y = None, height = myminheight)
+        self.add_input_btn = Button(text = "Add stat to change")
+        self.add_input_btn.bind(on_release = self.pick_input)
+        self.buttonbar.add_widget(self.add_input_btn)
+        self.calculate_btn = Button(text = "Calculate")
+        self.calculate_btn.bind(on_release = self.calculate)
+        self.buttonbar.add_widget(self.calculate_btn)
+        self.close_btn = Button(text = "Close")
+        self.close_btn.bind(on_release = self.dismiss)
+        self.buttonbar.add_widget(self.close_btn)
+        self.layout.add_widget(self.buttonbar)
+        
+        self.status_lbl = Label(text = "Add stats to change, then give each a list of values like 1-20 or 8, 10, 12",
+                                size_hint_y = None, height = myminheight)
+        self.layout.add_widget(self.status_lbl)
+        
+        # results, with buttons to move through the scenarios a few columns at a time
+        self.header = BoxLayout(size_hint_y = None, height = myminheight)
+        self.filter_input = Factory.TextInput(hint_text = "Find stats", multiline = False)
+        self.filter_input.bind(text = self.show_results)
+        self.header.add_widget(self.filter_input)
+        self.header_lbls = [Label() for i in range(scenario_columns)]
+        [self.header.add_widget(lbl) for lbl in self.header_lbls]
+        self.layout.add_widget(self.header)
+        self.pagebar = BoxLayout(size_hint_y = None, height = myminheight)
+        self.prev_btn = Button(text = "<")
+        self.prev_btn.bind(on_release = self.previous_scenarios)
+        self.pagebar.add_widget(self.prev_btn)
+        self.page_lbl = Label()
+        self.pagebar.add_widget(self.page_lbl)
+        self.next_btn = Button(text = ">")
+        self.next_btn.bind(on_release = self.next_scenarios)
+        self.pagebar.add_widget(self.next_btn)
+        self.layout.add_widget(self.pagebar)
+        self.rows = ScenarioRows()
+        self.layout.add_widget(self.rows)
+        self.results = None
+        self.first = 0
+        
+        self.content = self.layout
+    def pick_input(self, btn):
+        options = [s for s in active_sheet().registry if hasattr(s, "value_text") and s not in self.inputstats]
+        ScenarioStatPopup(caller = self, statoptions = options).open()
+    def add_input(self, stat):
+        self.inputstats.append(stat)
+        row = BoxLayout(size_hint_y = None, height = myminheight)
+        row.add_widget(Label(text = stat.statname))
+        try:
+            current = str(stat.component_total() if isinstance(stat, SumStat) else stat.value_for_sum())
+        except (ArithmeticError, RecursionError):
+            current = ""
+        row.values_input = Factory.TextInput(text = current, multiline = False)
+        row.add_widget(row.values_input)
+        removebtn = Button(text = "X", size_hint_x = 0.1)
+        removebtn.bind(on_release = self.remove_input)
+        row.add_widget(removebtn)
+        self.inputs.add_widget(row, index = 0) # added at the bottom
+        self.inputs.height = myminheight * len(self.inputstats)
+    def remove_input(self, btn):
+        row = btn.parent
+        i = list(reversed(self.inputs.children)).index(row)
+        self.inputs.remove_widget(row)
+        del self.inputstats[i]
+        self.inputs.height = myminheight * len(self.inputstats)
+    def calculate(self, btn):
+        rows = list(reversed(self.inputs.children))
+        start = time.perf_counter()
+        try:
+            overrides = {s: parse_scenario_values(row.values_input.text) for s, row in zip(self.inputstats, rows)}
+            self.results = statmodel.evaluate_scenarios(overrides)
+        except ValueError as e:
+            self.status_lbl.text = "Can't calculate: " + str(e)
+            return
+        self.status_lbl.text = "{} scenarios of {} stats in {:.0f} ms".format(self.results.count, len(self.results.stats),
+                                                                              (time.perf_counter() - start) * 1000)
+        self.first = 0
+        self.show_results()
+    def show_results(self, *args):
+        if self.results == None:
+            return
+        query = self.filter_input.text.lower()
+        stats = [s for s in self.results.stats if query in s.statname.lower()]
+        self.rows.set_results(self.results, stats, self.first)
+        # scenarios are numbered from 1, with the values given to the first stat changed
+        for j, lbl in enumerate(self.header_lbls):
+            i = self.first + j
+            if i >= self.results.count:
+                lbl.text = ""
+            elif len(self.inputstats) > 0:
+                lbl.text = "#{}: {}".format(i + 1, self.results.text(self.inputstats[0], i))
+            else:
+                lbl.text = "#{}".format(i + 1)
+        last = min(self.first + scenario_columns, self.results.count)
+        self.page_lbl.text = "Scenarios {}-{} of {}".format(self.first + 1, last, self.results.count)
+    def previous_scenarios(self, btn):
+        if self.results != None and self.first > 0:
+            self.first = max(self.first - scenario_columns, 0)
+            self.show_results()
+    def next_scenarios(self, btn):
+        if self.results != None and self.first + scenario_columns < self.results.count:
+            self.first += scenario_columns
+            self.show_results()
+
 # A front page with buttons for adding pages, saving, etc.
 class FrontPage(BoxLayout):
     def __init__(self, **kwargs):
@@ -1336,17 +1891,37 @@ class FrontPage(BoxLayout):
         self.load_btn.bind(on_release = self.open_load_dialog)
         self.add_widget(self.load_btn)
         
+        self.sheets_btn = Button(text = "Open sheets")
+        self.sheets_btn.bind(on_release = self.open_sheets_dialog)
+        self.add_widget(self.sheets_btn)
+        
         self.add_pg_btn = Button(text = "Add new page")
         self.add_pg_btn.bind(on_release = self.add_page)
         self.add_widget(self.add_pg_btn)
         
-        self.dd5e_btn = Button(text = "New character from D&D 5e template")
-        self.dd5e_btn.bind(on_release = self.dd5e_template)
-        self.add_widget(self.dd5e_btn)
+        self.template_btn = Button(text = "New character from template")
+        self.template_btn.bind(on_release = self.open_template_dialog)
+        self.add_widget(self.template_btn)
+        
+        self.scenario_btn = Button(text = "What-if scenarios")
+        self.scenario_btn.bind(on_release = self.open_scenario_dialog)
+        self.add_widget(self.scenario_btn)
         
         self.clear_btn = Button(text = "Clear all pages")
         self.add_widget(self.clear_btn)
         self.clear_btn.bind(on_release = self.clear_pages)
+        
+        self.reopen_btn = Button(text = self.reopen_text(), size_hint_y = None, height = myminheight)
+        self.reopen_btn.bind(on_release = self.toggle_reopen)
+        self.add_widget(self.reopen_btn)
+        
+        self.autosave_lbl = Label(text = "", size_hint_y = None, height = myminheight)
+        self.add_widget(self.autosave_lbl)
+    def reopen_text(self):
+        return "Reopen last sheet at start: " + ("on" if settings['reopen'] else "off")
+    def toggle_reopen(self, btn):
+        settings['reopen'] = not settings['reopen']
+        self.reopen_btn.text = self.reopen_text()
     def open_save_dialog(self, btn):
         self._popup = SavePopup(caller = self)
         self._popup.open()
@@ -1354,64 +1929,231 @@ class FrontPage(BoxLayout):
         self._popup = LoadPopup(caller = self)
         self._popup.open()
     def add_page(self, btn):
-        newpg = BoxOfStats(statlist = [])
-        self.parent.statspages.append(newpg)
-        self.parent.add_widget(newpg)
-    def dd5e_template(self, btn):
-        global masterstatlist
-        masterstatlist = []
-        [self.parent.remove_widget(sp) for sp in self.parent.statspages]
-        self.parent.statspages = make_5e_template()
-        [self.parent.add_widget(sp) for sp in self.parent.statspages]
+        self.parent.add_page(StatPage())
+    def open_sheets_dialog(self, btn):
+        self._popup = OpenSheetsPopup(self.parent)
+        self._popup.open()
+    def open_template_dialog(self, btn):
+        self._popup = TemplatePopup(caller = self)
+        self._popup.open()
+    def open_scenario_dialog(self, btn):
+        self._popup = ScenarioPopup()
+        self._popup.open()
+    def new_from_template(self, name):
+        # the new sheet is opened alongside the sheet shown now
+        with batch_update():
+            self.parent.show_sheet(statmodel.new_sheet_from_template(name))
     def clear_pages(self, btn):
-        global masterstatlist
-        masterstatlist = []
-        [self.parent.remove_widget(sp) for sp in self.parent.statspages]
-        self.parent.statspages = []
-        newpg = BoxOfStats(statlist = [])
-        self.parent.statspages.append(newpg)
-        self.parent.add_widget(newpg)
-        
-# The layout for pages with character sheet info
-# Currently set up as dummy for testing
+        # only the sheet shown is cleared
+        self.parent.finish_autosave()
+        sheet = self.parent.sheet
+        with batch_update():
+            stop_journal(sheet)
+            sheet.registry.clear()
+            sheet.pages = [StatPage()]
+            statmodel.rebuild_stat_graph(sheet)
+            self.parent.show_sheet(sheet)
+        
+# Stand-in for a page whose widgets have not been made yet, or have been dropped to save memory
+class PagePlaceholder(Widget):
+    pass
+
+# The layout for pages with character sheet info.
+# Widgets are only made for stats pages near the one being viewed; see max_live_pages.
 class MCpages(PageLayout):
     def __init__(self, **kwargs):
         PageLayout.__init__(self, **kwargs)
         # main page for adding pages, saving, etc.
         self.frntpg = FrontPage()
         self.add_widget(self.frntpg)
-        # list to contain all stats pages (BoxOfStats)
-        self.statspages = []
-        
-        # dummy stats for this example
-        self.statlist = [StatBar(statname = "Examples", statdesc = "Here are some examples of what you can do."),
-            DDAbilityBar(statname = "STR", statdesc = "Strength", 
-                            statlist_new = [StatBarSimple(statname = "Level 1 base STR", 
-                                statdesc = "Number chosen at level 1", statval = 12),
-                                StatBarSimple(statname = "Dwarven STR bonus", 
-                                statdesc = "Bonus for being a mountain dwarf", statval = 2,
-                                showplus = True)], calcavail = True),
-                    StatBarSimple(statname = "Prof. bonus", statdesc = "Proficiency bonus", statval = 2,
-                                  showplus = True, calcavail = True)]
-        self.statlist[0].statbtn.size_hint_x = 1       
-        self.statlist.append(StatBarSum(statname = "Athletics", statdesc = "stuff", showplus = True,
-                                statlist_existing = [self.statlist[1], self.statlist[2]],
-                                statlist_new = []))
-        self.statlist.append(StatBarCounter(statname = "Hit Points", 
-            statdesc = "You don't want to lose all of these.", defaultval = 8, calcavail = True))
-        self.statlist.append(StatBarText(statname = "Greataxe", 
-            statdesc = "Pretty sweet weapon.  Slashing, heavy, two-handed.",
-            stattext = "+3 to attack, 1d12+1 damage"))
-        self.statlist.append(StatBarThreeButtons(statname = "A spell",
-            statdesc = "The description of that spell.\n\nLine breaks okay.",
-            statname2 = "Another spell", statdesc2 = "The description of that other spell.",
-            statname3 = "Spell three", statdesc3 = "The description of the third spell."))
-        masterstatlist.extend(self.statlist) # put them in master list too
-        self.statspages.append(BoxOfStats(statlist = self.statlist))
-        
-        # add all stats pages
-        [self.add_widget(sp) for sp in self.statspages]
+        self.sheet = None # sheet shown, the active one
+        self.pages = [] # all stats pages (StatPage) of the sheet
+        self.pagewidgets = [] # widget for each stats page, either a BoxOfStats or a PagePlaceholder
+        self.editmodes = [] # whether each page is in edit mode, kept while its widgets are dropped
+        self.live_pages = OrderedDict() # pages that have a BoxOfStats, least recently viewed first
+        self.bind(page = self.update_live_pages)
+        self.near_pages_trigger = Clock.create_trigger(self.build_near_pages)
+        # save the sheet in the background once changes stop for autosave_delay seconds
+        self.autosaver = AutoSaver(on_written = self.autosave_written)
+        self.autosave_trigger = Clock.create_trigger(self.autosave, autosave_delay)
+        change_listeners.append(self.sheet_changed)
+        # no stats pages until a sheet is opened, with open_sheet or show_example_sheet
+    def show_example_sheet(self):
+        # example stats, in a new sheet
+        sheet = Sheet(title = "Example sheet")
+        sheet.pages.append(make_example_page(sheet))
+        statmodel.rebuild_stat_graph(sheet)
+        with batch_update():
+            self.show_sheet(sheet)
+    def open_sheet(self, path, sheetpath = None, on_done = None):
+        # load a sheet file in the background; see LoadingPopup.  If it is open already, it is shown instead.
+        sheet = find_open_sheet(path if sheetpath == None else sheetpath)
+        if sheet != None:
+            with batch_update():
+                self.show_sheet(sheet, editmode = False)
+            if on_done != None:
+                on_done()
+            return
+        self.finish_autosave()
+        self.loading = LoadingPopup(self, path, sheetpath, on_done)
+        self.loading.open()
+    def show_sheet(self, sheet, editmode = True):
+        # Show a sheet in place of the one shown now, opening it if it is not open yet.  The sheet shown
+        # before stays open, unless it has no file and no stats, so switching back needs no loading.
+        old = active_sheet()
+        if sheet is not old:
+            self.finish_autosave()
+            activate_sheet(sheet)
+            if old.journal == None and len(old.registry) == 0:
+                close_sheet(old)
+        self.sheet = sheet
+        self.set_pages(sheet.pages, editmode)
+        self.show_sheet_count()
+    def close_open_sheet(self, sheet):
+        # stop keeping a sheet in memory; if it is the one shown, the last one opened is shown instead
+        if sheet is self.sheet:
+            self.finish_autosave()
+        close_sheet(sheet)
+        if sheet is self.sheet:
+            with batch_update():
+                self.show_sheet(active_sheet(), editmode = False)
+        self.show_sheet_count()
+    def show_sheet_count(self):
+        self.frntpg.sheets_btn.text = "Open sheets ({})".format(len(sheet_state['open']))
+    def set_pages(self, pages, editmode = True):
+        # replace all stats pages with a new list of pages
+        with batch_update():
+            [self.remove_widget(pw) for pw in self.pagewidgets]
+            [self.drop_page_widgets(p) for p in list(self.live_pages)]
+            self.pages = pages # the same list as the sheet's
+            self.pagewidgets = []
+            self.editmodes = []
+            [self.add_page_widget(editmode) for p in pages]
+        self.show_autosave_status("idle" if active_sheet().journal != None else "nofile")
+    def add_page(self, page, editmode = True):
+        self.pages.append(page)
+        self.add_page_widget(editmode)
+        journal_page(page)
+    def add_page_widget(self, editmode):
+        self.pagewidgets.append(PagePlaceholder())
+        self.editmodes.append(editmode)
+        self.add_widget(self.pagewidgets[-1])
+        # widgets for the pages on screen are made once, at the end of a batch
+        defer_until_batch_end(self.update_live_pages)
+    def sheet_changed(self):
+        # start the wait for autosave again
+        self.autosave_trigger.cancel()
+        self.autosave_trigger()
+        self.show_autosave_status("unsaved")
+    def autosave(self, *args):
+        self.show_autosave_status("saving" if self.autosaver.save() else "nofile")
+    @mainthread
+    def autosave_written(self):
+        self.show_autosave_status(self.autosaver.collect())
+    def finish_autosave(self):
+        # save any changes and wait for it, before closing or switching sheets
+        self.autosave_trigger.cancel()
+        if active_sheet().journal != None:
+            self.show_autosave_status(self.autosaver.flush())
+    def show_autosave_status(self, status):
+        text = autosave_messages[status]
+        if status == "failed":
+            text += " " + str(self.autosaver.error)
+        if self.frntpg.autosave_lbl.text != text:
+            self.frntpg.autosave_lbl.text = text
+    def replace_page_widget(self, i, widget):
+        # swap the widget for stats page i without changing the order of pages
+        index = self.children.index(self.pagewidgets[i])
+        self.remove_widget(self.pagewidgets[i])
+        self.add_widget(widget, index = index)
+        self.pagewidgets[i] = widget
+    def build_page(self, i):
+        page = self.pages[i]
+        if page in self.live_pages:
+            self.live_pages.move_to_end(page)
+        else:
+            self.replace_page_widget(i, BoxOfStats(page = page, editmode = self.editmodes[i]))
+            self.live_pages[page] = i
+    def drop_page_widgets(self, page):
+        del self.live_pages[page]
+        if page.view != None:
+            page.view.release()
+    def near_page_indices(self):
+        # the current stats page and the ones on either side of it
+        current = self.page - 1 # index in self.pages; the front page is page 0
+        return [i for i in range(current - 1, current + 2) if 0 <= i < len(self.pages)]
+    def update_live_pages(self, *args):
+        # make widgets for the current stats page now, and for the pages next to it in the next frames
+        current = self.page - 1
+        if 0 <= current < len(self.pages):
+            self.build_page(current)
+        self.near_pages_trigger()
+        # drop widgets for pages that have not been viewed recently
+        near = self.near_page_indices()
+        nearpages = {self.pages[i] for i in near}
+        for page in list(self.live_pages):
+            if len(self.live_pages) <= max(max_live_pages, len(nearpages)):
+                break
+            if page not in nearpages:
+                i = self.pages.index(page)
+                self.editmodes[i] = page.view.editmode
+                self.drop_page_widgets(page)
+                self.replace_page_widget(i, PagePlaceholder())
+    def build_near_pages(self, *args):
+        # one page per frame, so that swiping stays smooth
+        todo = [i for i in self.near_page_indices() if self.pages[i] not in self.live_pages]
+        if len(todo) > 0:
+            self.build_page(todo[0])
+            self.near_pages_trigger()
+
 
+# Timings of the work the program does (see start_profiling), shown over the pages
+class ProfileOverlay(BoxLayout):
+    def __init__(self, **kwargs):
+        BoxLayout.__init__(self, **kwargs)
+        self.orientation = "vertical"
+        self.size_hint = (1, 0.6)
+        self.pos_hint = {'top': 1}
+        self.message = "" # shown below the timings
+        
+        self.report_lbl = Label(font_name = "RobotoMono-Regular", font_size = 12, halign = "left", valign = "top")
+        self.report_lbl.bind(size = self.report_lbl.setter('text_size'))
+        self.add_widget(self.report_lbl)
+        
+        self.btnbar = BoxLayout(size_hint_y = None, height = myminheight)
+        self.reset_btn = Button(text = "Reset")
+        self.reset_btn.bind(on_release = self.reset)
+        self.btnbar.add_widget(self.reset_btn)
+        self.save_btn = Button(text = "Save profile")
+        self.save_btn.bind(on_release = self.save)
+        self.btnbar.add_widget(self.save_btn)
+        self.add_widget(self.btnbar)
+        
+        self.update_event = Clock.schedule_interval(self.show_report, 0.5)
+        self.show_report()
+    def show_report(self, *args):
+        self.report_lbl.text = profile_report(maxlines = 20) + self.message
+    def reset(self, btn):
+        reset_profile()
+        self.message = ""
+        self.show_report()
+    def save(self, btn):
+        path = os.path.join(App.get_running_app().user_data_dir, time.strftime("profile-%Y%m%d-%H%M%S.json"))
+        dump_profile(path)
+        self.message = "\nSaved to " + path
+        self.show_report()
+    def close(self):
+        self.update_event.cancel()
+
+# points in the program timed by the profiler, besides those in statmodel
+[add_profile_point(c, "__init__") for c in list(globals().values())
+ if isinstance(c, type) and issubclass(c, Popup) and "__init__" in vars(c)]
+add_profile_point(BoxOfStats, "redraw")
+add_profile_point(StatRows, "show_rows")
+add_profile_point(StatRows, "get_bar")
+add_profile_point(ScenarioPopup, "calculate")
+add_profile_point(MCpages, "show_sheet")
+add_profile_point(LabelBase, "refresh", "text rendering (LabelBase.refresh)")
 
 # The screen with pages with character sheet info        
 #class MCscreen(Screen):
@@ -1422,282 +2164,95 @@ class MCpages(PageLayout):
 # class for the app as a whole        
 class MetaChar(App):
     def build(self):
+        self.read_settings()
+        # show changes to stats once per frame
+        refresh_state['schedule'] = Clock.create_trigger(run_scheduled_refresh)
+        add_template_dir(os.path.join(self.user_data_dir, templates_dirname))
         self.mc = MCpages()
+        self.profile_overlay = None
         Window.bind(on_key_down = self.key_action)
+        # the sheet is opened once the front page is on screen
+        Window.bind(on_flip = self.first_frame)
         return self.mc
+    def first_frame(self, *args):
+        Window.unbind(on_flip = self.first_frame)
+        timing = startup_timing_env in os.environ
+        if timing:
+            print("first frame", flush = True)
+        path, sheetpath = self.last_sheet_files()
+        if path == None:
+            self.mc.show_example_sheet()
+            if timing:
+                stopTouchApp() # run() then stops the app
+        else:
+            self.mc.open_sheet(path, sheetpath, on_done = self.startup_timing_done if timing else None)
+    def startup_timing_done(self):
+        print("sheet loaded", flush = True)
+        stopTouchApp()
     def on_pause(self):
+        self.mc.finish_autosave()
         return True
+    def on_stop(self):
+        self.mc.finish_autosave()
+        self.remember_sheet()
+        [stop_journal(s) for s in sheet_state['open']]
+    def read_settings(self):
+        try:
+            with open(os.path.join(self.user_data_dir, settings_file), mode = "rt") as con:
+                settings.update(json.load(con))
+        except (OSError, ValueError):
+            pass # first run, or settings that can't be read
+    def last_sheet_files(self):
+        # file to reopen the last sheet from, and the sheet file itself, or None if there is nothing to reopen
+        sheetpath = settings['sheet']
+        if not settings['reopen'] or sheetpath == None or not os.path.exists(sheetpath):
+            return None, None
+        copypath = os.path.join(self.user_data_dir, last_sheet_copy)
+        info = os.stat(sheetpath)
+        if settings['copy'] == [info.st_size, info.st_mtime_ns] and os.path.exists(copypath):
+            return copypath, sheetpath
+        return sheetpath, sheetpath
+    def remember_sheet(self):
+        # save the settings, with the sheet shown and, if it is text, a binary copy to reopen it from
+        journal = active_sheet().journal
+        settings['sheet'] = None if journal == None else os.path.abspath(journal.sheetpath)
+        settings['copy'] = None
+        try:
+            if settings['reopen'] and journal != None and not journal.sheetpath.endswith(binary_extension):
+                statmodel.write_snapshot_file(os.path.join(self.user_data_dir, last_sheet_copy),
+                                              statmodel.snapshot_sheet(journal.sheet))
+                info = os.stat(journal.sheetpath)
+                settings['copy'] = [info.st_size, info.st_mtime_ns]
+            with open(os.path.join(self.user_data_dir, settings_file), mode = "wt") as con:
+                json.dump(settings, con)
+        except OSError:
+            pass # the sheet itself is saved; only reopening it is lost
     def key_action(self, *args):
         keynum = args[1]
         # swipe left with left arrow
-        if keynum == 276 and self.mc.page > 0 and not edit_window_open: 
+        if keynum == 276 and self.mc.page > 0 and not self.edit_window_open(): 
             self.mc.page -= 1
         # swipe right with right arrow
-        if keynum == 275 and self.mc.page < (len(self.mc.children) - 1) and not edit_window_open: 
+        if keynum == 275 and self.mc.page < (len(self.mc.children) - 1) and not self.edit_window_open(): 
             self.mc.page += 1
+        # show or hide timings with F12
+        if keynum == 293:
+            self.toggle_profiler()
+    def edit_window_open(self):
+        # paging with arrow keys is suppressed while a stat or color is being edited
+        return any([isinstance(w, (EditStatBarPopup, EditColorPopup)) for w in Window.children])
+    def toggle_profiler(self):
+        # time the program only while the timings are shown
+        if self.profile_overlay == None:
+            start_profiling()
+            self.profile_overlay = ProfileOverlay()
+            Window.add_widget(self.profile_overlay)
+        else:
+            self.profile_overlay.close()
+            Window.remove_widget(self.profile_overlay)
+            self.profile_overlay = None
+            stop_profiling()
 
-# template for a D&D 5e character
-def make_5e_template():
-    global masterstatlist
-    
-    # Page with basic biographical information
-    plyr_name = StatBarText(statname = "Name", statdesc = "Name of the character",
-                            stattext = "Sample Exampleson")
-    plyr_race = StatBarText(statname = "Race", statdesc = "Human, elf, dwarf, halfling, etc., including subraces.",
-                            stattext = "Human")
-    plyr_level = StatBarSimple(statname = "Level", statdesc = "Overall level for your character", statval = 1)
-    plyr_class = StatBarText(statname = "Class", statdesc = "Like, are you a figher or a wizard or a bard or what?",
-                             stattext = "Toilet mage")
-    plyr_spec = StatBarText(statname = "Specialization", statdesc = "Most classes have two or more options to choose from at an early level.", stattext = "")
-    plyr_bkgd = StatBarText(statname = "Background", statdesc = "Who you were before you were an adventurer, or what you do now when you aren't adventuring.  Comes with a couple skill proficiencies and other perks.", stattext = "Sailor")
-    plyr_lng = StatBarText(statname = "Languages known", statdesc = "Various races have their own languages that they speak.  Your character might know some of them depending on race, class, and background.", stattext = "Common")
-    plyr_bio = StatBar(statname = "Biography", statdesc = "Fill in any extra info here.  You may also wish to add boxes for alignment, ideals, bonds, and flaws.")
-    plyr_bio.statbtn.size_hint_x = 1
-    bio_page = BoxOfStats(statlist = [plyr_name, plyr_race, plyr_level, plyr_class, plyr_spec, plyr_bkgd, plyr_lng, plyr_bio])
-    # color scheme from the "viridis" R package
-    bio_page.red_bg = 0.992
-    bio_page.green_bg = 0.906
-    bio_page.blue_bg = 0.145
-    masterstatlist.extend(bio_page.statlist)
-
-    # Page with ability scores and proficiency bonus
-    ability_header = StatBar(statname = "Ability Scores and Proficiency Bonus",
-                             statdesc = "These scores are rarely used by themselves, but are used for calculating other roll modifiers.  Ability scores indicate things like how smart or strong your character is overall, and your proficiency bonus indicates just how good they are at their particular skills.\n\nAfter an ability score, an automatically-calculated roll modifier is listed in parentheses.  Ability scores are the sum of a number you choose at character creation, any racial modifiers, and any increases gained at certain levels.\n\nThe proficiency bonus is dependent only on character level.")
-    ability_header.statbtn.size_hint_x = 1
-    ability_desc = "{0}.  To make a {1} check, roll 1d20 and add the number in parentheses."
-    base_stat_desc = "Number you selected at level 1."
-    hum_mod_desc = "Human racial modifier to {}."
-    STR = DDAbilityBar(statname = "STR", 
-                       statdesc = ability_desc.format("Strength", "strength"),
-                       statlist_existing = [],                     
-                       statlist_new = [StatBarSimple(statname = "Level 1 base STR", 
-                                                     statdesc = base_stat_desc, statval = 10),
-                                       StatBarSimple(statname = "Human",
-                                                     statdesc = hum_mod_desc.format("strength"), statval = 1,
-                                                     showplus = True)])
-    DEX = DDAbilityBar(statname = "DEX", 
-                       statdesc = ability_desc.format("Dexterity", "dexterity"),
-                       statlist_existing = [],                     
-                       statlist_new = [StatBarSimple(statname = "Level 1 base DEX", 
-                                                     statdesc = base_stat_desc, statval = 10),
-                                       StatBarSimple(statname = "Human",
-                                                     statdesc = hum_mod_desc.format("dexterity"), statval = 1,
-                                                     showplus = True)])
-    CON = DDAbilityBar(statname = "CON", 
-                       statdesc = ability_desc.format("Constitution", "constitution"),
-                       statlist_existing = [],                     
-                       statlist_new = [StatBarSimple(statname = "Level 1 base CON", 
-                                                     statdesc = base_stat_desc, statval = 10),
-                                       StatBarSimple(statname = "Human",
-                                                     statdesc = hum_mod_desc.format("constitution"), statval = 1,
-                                                     showplus = True)])
-    INT = DDAbilityBar(statname = "INT", 
-                       statdesc = ability_desc.format("Intelligence", "intelligence"),
-                       statlist_existing = [],                     
-                       statlist_new = [StatBarSimple(statname = "Level 1 base INT", 
-                                                     statdesc = base_stat_desc, statval = 10),
-                                       StatBarSimple(statname = "Human",
-                                                     statdesc = hum_mod_desc.format("intelligence"), statval = 1,
-                                                     showplus = True)])
-    WIS = DDAbilityBar(statname = "WIS", 
-                       statdesc = ability_desc.format("Wisdom", "wisdom"),
-                       statlist_existing = [],                     
-                       statlist_new = [StatBarSimple(statname = "Level 1 base WIS", 
-                                                     statdesc = base_stat_desc, statval = 10),
-                                       StatBarSimple(statname = "Human",
-                                                     statdesc = hum_mod_desc.format("wisdom"), statval = 1,
-                                                     showplus = True)])
-    CHA = DDAbilityBar(statname = "CHA", 
-                       statdesc = ability_desc.format("Charisma", "charisma"),
-                       statlist_existing = [],                     
-                       statlist_new = [StatBarSimple(statname = "Level 1 base CHA", 
-                                                     statdesc = base_stat_desc, statval = 10),
-                                       StatBarSimple(statname = "Human",
-                                                     statdesc = hum_mod_desc.format("charisma"), statval = 1,
-                                                     showplus = True)])
-    prof = StatBarSimple(statname = "Proficiency bonus",
-                         statdesc = "Added to d20 rolls where you are proficient in a skill, weapon, or save.  Increases at certain levels.", statval = 2, showplus = True, calcavail = True)
-    ability_page = BoxOfStats(statlist = [ability_header, STR, DEX, CON, INT, WIS, CHA, prof])
-    ability_page.red_bg = 0.624
-    ability_page.green_bg = 0.855
-    ability_page.blue_bg = 0.227
-    masterstatlist.extend(ability_page.statlist)
-    
-    # Page with saving throws
-    saving_throw_header = StatBar(statname = "Saving throws",
-                                  statdesc = "These are rolls you make to keep something bad from happening to you.  The DM will tell you if you need to make a saving throw.  Roll 1d20 and add the indicated modifier.\n\nWhen you make your character sheet, edit the appropriate saving throws, adding your proficiency bonus using \"Add existing stat\".")
-    saving_throw_header.statbtn.size_hint_x = 1
-    str_save = StatBarSum(statname = "STR save", statdesc = "Roll modifier for strength saving throw.",
-                          statlist_existing = [STR], statlist_new = [], showplus = True)
-    dex_save = StatBarSum(statname = "DEX save", statdesc = "Roll modifier for dexterity saving throw.",
-                          statlist_existing = [DEX], statlist_new = [], showplus = True)
-    con_save = StatBarSum(statname = "CON save", statdesc = "Roll modifier for constitution saving throw.",
-                          statlist_existing = [CON], statlist_new = [], showplus = True)
-    int_save = StatBarSum(statname = "INT save", statdesc = "Roll modifier for intelligence saving throw.",
-                          statlist_existing = [INT], statlist_new = [], showplus = True)
-    wis_save = StatBarSum(statname = "WIS save", statdesc = "Roll modifier for wisdom saving throw.",
-                          statlist_existing = [WIS], statlist_new = [], showplus = True)
-    cha_save = StatBarSum(statname = "CHA save", statdesc = "Roll modifier for charisma saving throw.",
-                          statlist_existing = [CHA], statlist_new = [], showplus = True)
-    death_success = StatBarCounter(statname = "Death save successes", 
-                                   statdesc = "If you are dying, roll a d20 at the beginning of your turn.  10 or higher counts as a success.  If you get three successes, you are no longer dying.",
-                                   defaultval = 0)
-    death_fail = StatBarCounter(statname = "Death save failures",
-                                statdesc = "If you are dying, roll a d20 at the beginning of your turn.  9 or lower counts as a failure (1 as two failures).  If you get three failures, you are dead.",
-                                defaultval = 0)
-    saving_throw_page = BoxOfStats(statlist = [saving_throw_header, str_save, dex_save, con_save, int_save,
-                                               wis_save, cha_save, death_success, death_fail])
-    saving_throw_page.red_bg = 0.29
-    saving_throw_page.green_bg = 0.757
-    saving_throw_page.blue_bg = 0.427
-    masterstatlist.extend(saving_throw_page.statlist)
-    
-    # page with hit points, armor class, and attack modifiers
-    hit_point_max = StatBarSum(statname = "Max. hit points",
-                               statdesc = "This value increases with each level according to class.  Add your CON bonus with \"Add existing stat\"; HP increases retroactively with CON increase.",
-                               statlist_existing = [CON], 
-                               statlist_new = [StatBarSimple(statname = "Level 1 base hp",
-                                                             statdesc = "Base hit points at level 1 for wizard.",
-                                                             statval = 6)])
-    hit_point_current = StatBarCounter(statname = "Current hit points",
-                                       statdesc = "If this gets down to zero, you are dying.",
-                                       defaultval = 6)
-    hit_dice = StatBarText(statname = "Hit dice",
-                           statdesc = "These are the dice you use to regain hit points when you rest.  Your class determines this.",
-                           stattext = "1d6")
-    armor_class = StatBarSum(statname = "Armor class",
-                             statdesc = "The higher it is, the harder you are to hit.  Check the type of armor you are wearing to see if your dexterity bonus should be added.",
-                             statlist_existing = [DEX], 
-                             statlist_new = [StatBarSimple(statname = "Padded", statdesc = "Armor class of padded armor.",
-                                                           statval = 11)])
-    initiative = StatBarSum(statname = "Initiative",
-                            statdesc = "Determines combat order.  Generally just your dexterity modifier.\n\nRoll 1d20 and add the modifier.",
-                            statlist_existing = [DEX], statlist_new = [], showplus = True)
-    melee_atk = StatBarSum(statname = "Melee attack mod.",
-                           statdesc = "When attacking with a melee weapon, add this modifier to a 1d20 roll to determine if you hit.  Also use this modifier for attacks with a finesse weapon if your strength is better than your dexterity.  Remove the proficiency bonus if using a weapon in which you are not proficient.",
-                           statlist_existing = [STR, prof], statlist_new = [], showplus = True)
-    melee_dmg = StatBarSum(statname = "Melee damage mod.",
-                           statdesc = "When attacking with a melee weapon, add this modifier to the damage dice for the weapon.  Also use this modifier for damage from a finesse weapon if your strength is better than your dexterity.",
-                           statlist_existing = [STR], statlist_new = [], showplus = True)
-    ranged_atk = StatBarSum(statname = "Ranged attack mod.",
-                           statdesc = "When attacking with a ranged weapon, add this modifier to a 1d20 roll to determine if you hit.  Also use this modifier for attacks with a finesse weapon if your dexterity is better than your strength.  Remove the proficiency bonus if using a weapon in which you are not proficient.",
-                           statlist_existing = [DEX, prof], statlist_new = [], showplus = True)
-    ranged_dmg = StatBarSum(statname = "Ranged damage mod.",
-                           statdesc = "When attacking with a melee weapon, add this modifier to the damage dice for the weapon.  Also use this modifier for damage from a finesse weapon if your dexterity is better than your strength.",
-                           statlist_existing = [DEX], statlist_new = [], showplus = True)
-    combat_page = BoxOfStats(statlist = [hit_point_max, hit_point_current, hit_dice, armor_class, initiative,
-                                         melee_atk, melee_dmg, ranged_atk, ranged_dmg])
-    combat_page.red_bg = 0.122
-    combat_page.green_bg = 0.631
-    combat_page.blue_bg = 0.529
-    masterstatlist.extend(combat_page.statlist)
-    
-    # skills page 1
-    skill_desc = "Roll 1d20 and add this modifier to make a{} {} check."
-    skillpg_desc = "Skills pertain to various activities you might attempt out of combat.  Roll 1d20 and add the appropriate modifier to make a skill check.\n\nWhen making your character sheet, be sure to add your proficiency bonus to any skills in which you are proficient, using \"Add existing stat\".  Your class and background determine skill proficiencies."
-    skills_header1 = StatBar(statname = "Skills page 1", statdesc = skillpg_desc)
-    skills_header1.statbtn.size_hint_x = 1
-    acrobatics = StatBarSum(statname = "Acrobatics", statdesc = skill_desc.format("n", "acrobatics"),
-                            statlist_existing = [DEX], statlist_new = [], showplus = True)
-    animal_handling = StatBarSum(statname = "Animal handling", statdesc = skill_desc.format("n", "animal handling"),
-                            statlist_existing = [WIS], statlist_new = [], showplus = True)
-    arcana = StatBarSum(statname = "Arcana", statdesc = skill_desc.format("n", "arcana"),
-                            statlist_existing = [INT], statlist_new = [], showplus = True)
-    athletics = StatBarSum(statname = "Athletics", statdesc = skill_desc.format("n", "athletics"),
-                            statlist_existing = [STR], statlist_new = [], showplus = True)
-    deception = StatBarSum(statname = "Deception", statdesc = skill_desc.format("", "deception"),
-                            statlist_existing = [CHA], statlist_new = [], showplus = True)
-    history = StatBarSum(statname = "History", statdesc = skill_desc.format("", "history"),
-                            statlist_existing = [INT], statlist_new = [], showplus = True)
-    insight = StatBarSum(statname = "Insight", statdesc = skill_desc.format("n", "insight"),
-                            statlist_existing = [WIS], statlist_new = [], showplus = True)
-    intimidation = StatBarSum(statname = "Intimidation", statdesc = skill_desc.format("n", "intimidation"),
-                            statlist_existing = [CHA], statlist_new = [], showplus = True)
-    investigation = StatBarSum(statname = "Investigation", statdesc = skill_desc.format("n", "investigation"),
-                            statlist_existing = [INT], statlist_new = [], showplus = True)
-    skills_page1 = BoxOfStats(statlist = [skills_header1, acrobatics, animal_handling, arcana, athletics,
-                                          deception, history, insight, intimidation, investigation])
-    skills_page1.red_bg = 0.153
-    skills_page1.green_bg = 0.498
-    skills_page1.blue_bg = 0.557
-    masterstatlist.extend(skills_page1.statlist)
-    
-    # skills page 2
-    skills_header2 = StatBar(statname = "Skills page 2", statdesc = skillpg_desc)
-    skills_header2.statbtn.size_hint_x = 1
-    medicine = StatBarSum(statname = "Medicine", statdesc = skill_desc.format("", "medicine"),
-                            statlist_existing = [WIS], statlist_new = [], showplus = True)
-    nature = StatBarSum(statname = "Nature", statdesc = skill_desc.format("", "nature"),
-                            statlist_existing = [INT], statlist_new = [], showplus = True)
-    perception = StatBarSum(statname = "Perception", statdesc = skill_desc.format("", "perception"),
-                            statlist_existing = [WIS], statlist_new = [], showplus = True)
-    performance = StatBarSum(statname = "Performance", statdesc = skill_desc.format("", "performance"),
-                            statlist_existing = [CHA], statlist_new = [], showplus = True)
-    persuasion = StatBarSum(statname = "Persuasion", statdesc = skill_desc.format("", "persuasion"),
-                            statlist_existing = [CHA], statlist_new = [], showplus = True)
-    religion = StatBarSum(statname = "Religion", statdesc = skill_desc.format("", "religion"),
-                            statlist_existing = [INT], statlist_new = [], showplus = True)
-    sleight_of_hand = StatBarSum(statname = "Sleight of Hand", statdesc = skill_desc.format("", "sleight of hand"),
-                            statlist_existing = [DEX], statlist_new = [], showplus = True)
-    stealth = StatBarSum(statname = "Stealth", statdesc = skill_desc.format("", "stealth"),
-                            statlist_existing = [DEX], statlist_new = [], showplus = True)
-    survival = StatBarSum(statname = "Survival", statdesc = skill_desc.format("", "survival"),
-                            statlist_existing = [WIS], statlist_new = [], showplus = True)
-    skills_page2 = BoxOfStats(statlist = [skills_header2, medicine, nature, perception, performance,
-                                          persuasion, religion, sleight_of_hand, stealth, survival])
-    skills_page2.red_bg = 0.212
-    skills_page2.green_bg = 0.361
-    skills_page2.blue_bg = 0.553
-    masterstatlist.extend(skills_page2.statlist)
-    
-    # spells page 1
-    spells_header = StatBar(statname = "Spells",
-                            statdesc = "This page contains stats pertaining to spells, as well as examples of how you can store spell descriptions in rows of buttons.")
-    spells_header.statbtn.size_hint_x = 1
-    spell_atk = StatBarSum(statname = "Spell attack mod.",
-                           statdesc = "When using a spell where you roll to hit, add this modifier to a 1d20 roll to determine if you hit.  This will use either your INT, WIS, or CHA modifier depending on class.",
-                           statlist_existing = [CHA, prof], statlist_new = [], showplus = True)
-    spell_save = StatBarSum(statname = "Spell save DC",
-                            statdesc = "If a target of one of your spells must make a saving throw to avoid negative effects from the spell, this is the number they are trying to beat.  It is calculated with INT, WIS, or CHA depending on your class.",
-                            statlist_existing = [CHA, prof], 
-                            statlist_new = [StatBarSimple(statname = "Base spell save DC", 
-                                                          statdesc = "This is always 8.", statval = 8)])
-    spell_slots1 = StatBarCounter(statname = "Level 1 spell slots",
-                                  statdesc = "This is how many level 1 spells you can cast before you need a rest.",
-                                  defaultval = 3)
-    spell_slots2 = StatBarCounter(statname = "Level 2 spell slots",
-                                  statdesc = "This is how many level 2 spells you can cast before you need a rest.",
-                                  defaultval = 1)
-    example_cantrip = StatBarText(statname = "Plunger ray", 
-                                  statdesc = "Here you would put a more detailed description of this spell.",
-                                  stattext = "2d6 damage")
-    example_spells = StatBarThreeButtons(statname = "Some spell", statdesc = "Spell description",
-                                         statname2 = "Another spell", statdesc2 = "Spell description",
-                                         statname3 = "A third spell", statdesc3 = "Spell description")
-    spell_page = BoxOfStats(statlist = [spells_header, spell_atk, spell_save, spell_slots1, spell_slots2,
-                                        example_cantrip, example_spells])
-    spell_page.red_bg = 0.275
-    spell_page.green_bg = 0.2
-    spell_page.blue_bg = 0.494
-    masterstatlist.extend(spell_page.statlist)
-    
-    # additional traits
-    additional_header = StatBar(statname = "Additional traits",
-                                statdesc = "Anything else not already covered.")
-    additional_header.statbtn.size_hint_x = 1
-    example_stuff = StatBarText(statname = "Being awesome", statdesc = "blah blah blah",
-                                stattext = "General awesomeness")
-    additional_page = BoxOfStats(statlist = [additional_header, example_stuff])
-    additional_page.red_bg = 0.267
-    additional_page.green_bg = 0.004
-    additional_page.blue_bg = 0.329
-    masterstatlist.extend(additional_page.statlist)
-    
-    [st.update_text_color() for st in masterstatlist]
-    
-    return [bio_page, ability_page, saving_throw_page, combat_page, skills_page1, skills_page2, spell_page, 
-            additional_page]
-            
 # Run the program
 if __name__ == '__main__':
     MetaChar().run()
\ No newline at end of file
@@ -0,0 +1,219 @@
+# Command line tool for working with character sheet files without opening a window.  Each sheet is
+# loaded, with any changes in its journal, and all stats are calculated.  Then, depending on the command:
+#   values   write the value of every stat, as CSV or JSON
+#   check    look for problems, such as stats calculated from themselves
+#   convert  save the sheet in the text or binary format
+# Sheets and directories of sheets can be given together; sheets are handled in parallel, one per process.
+#
+#   python sheettool.py values --out results campaign/
+#   python sheettool.py check campaign/ more_sheets/wizard.txt
+#   python sheettool.py convert --to mcb --out binary campaign/
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from statmodel import (SumStat, FractionStat, DiceStat, ChangeJournal, MissingStatError, parse_dice, read_sheet_file,
+                       save_sheet_file, find_dependency_cycles, binary_magic, binary_extension)
+
+# how text sheet files start
+text_header = b"#MetaChar"
+# file name endings of sheet formats for convert
+format_extensions = {'txt': ".txt", 'mcb': binary_extension}
+# columns written by values
+value_columns = ['id', 'page', 'kind', 'name', 'value', 'text']
+
+# whether a file is a character sheet in either format
+def is_sheet_file(path):
+    with open(path, mode = "rb") as con:
+        start = con.read(len(text_header))
+    return start.startswith(binary_magic) or start == text_header
+# sheet files given on the command line, with directories replaced by the sheets in them
+def find_sheets(paths):
+    sheets = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = [os.path.join(path, f) for f in sorted(os.listdir(path)) if not f.endswith(".tmp")]
+            sheets.extend([f for f in files if os.path.isfile(f) and is_sheet_file(f)])
+        else:
+            sheets.append(path)
+    return sheets
+
+# read a sheet into a new Sheet, with the changes in its journal unless usejournal is False
+def load_sheet(path, usejournal):
+    sheet = read_sheet_file(path)
+    if usejournal:
+        # leave the journal as it is, in case the sheet is open in the program
+        ChangeJournal(path, sheet).replay(repair = False)
+    return sheet
+# page number of each stat shown on a page, counting from 1
+def stat_pages(pages):
+    where = dict()
+    for i, p in enumerate(pages):
+        for s in p.statlist:
+            where.setdefault(s, i + 1)
+    return where
+# a dictionary with the columns in value_columns for each stat on the sheet
+def stat_values(sheet):
+    where = stat_pages(sheet.pages)
+    rows = []
+    for s in sheet.registry:
+        if hasattr(s, "value_text"):
+            value, text = s.value_for_sum(), s.value_text()
+        elif isinstance(s, DiceStat):
+            value, text = None, s.dice_text()
+        else:
+            value, text = None, getattr(s, "stattext", None)
+        rows.append({'id': s.statid, 'page': where.get(s), 'kind': s.filetag, 'name': s.statname,
+                     'value': value, 'text': text})
+    return rows
+def format_values(path, rows, fmt):
+    if fmt == "json":
+        return json.dumps({'sheet': path, 'stats': rows}, indent = 1) + "\n"
+    con = io.StringIO()
+    writer = csv.DictWriter(con, fieldnames = value_columns, lineterminator = "\n")
+    writer.writeheader()
+    writer.writerows(rows)
+    return con.getvalue()
+# problems with a loaded sheet, as (level, message) with level "error" or "warning"
+def check_sheet(sheet):
+    problems = []
+    def describe(s):
+        return '{} "{}"'.format(s.statid, s.statname)
+    for cycle in find_dependency_cycles(sheet):
+        problems.append(("error", "stats calculated from themselves: " + " -> ".join([describe(s) for s in cycle])))
+    shown = set(stat_pages(sheet.pages))
+    for s in sheet.registry:
+        if isinstance(s, SumStat):
+            shown.update(s.statlist_new)
+    for s in sheet.registry:
+        if s not in shown:
+            problems.append(("warning", "stat {} is not on any page or in any sum".format(describe(s))))
+        if isinstance(s, FractionStat) and s.divisor == 0:
+            problems.append(("error", "stat {} divides by zero".format(describe(s))))
+        if isinstance(s, DiceStat):
+            try:
+                parse_dice(s.expression)
+            except ValueError as e:
+                problems.append(("error", "stat {} has dice that can't be rolled: {}".format(describe(s), e)))
+    if not any([level == "error" for level, message in problems]):
+        for s in sheet.registry:
+            try:
+                if hasattr(s, "value_text"):
+                    s.value_text()
+            except Exception as e:
+                problems.append(("error", "stat {} can't be calculated: {}".format(describe(s), e)))
+    return problems
+
+# file a command writes for a sheet, or None if it only prints
+def output_path(command, path, options):
+    if command == "values" and options['out'] != None:
+        return os.path.join(options['out'], os.path.basename(path) + "." + options['format'])
+    if command == "convert":
+        return os.path.join(options['out'],
+                            os.path.splitext(os.path.basename(path))[0] + format_extensions[options['to']])
+    return None
+
+# Commands.  Each takes a sheet path and the options, and returns lines to print and whether it succeeded.
+def values_command(path, options):
+    rows = stat_values(load_sheet(path, options['journal']))
+    text = format_values(path, rows, options['format'])
+    if options['out'] == None:
+        return [text.rstrip("\n")], True
+    outpath = output_path("values", path, options)
+    with open(outpath, mode = "wt", newline = "") as con:
+        con.write(text)
+    return ["{}: {} stats -> {}".format(path, len(rows), outpath)], True
+def check_command(path, options):
+    try:
+        sheet = load_sheet(path, options['journal'])
+    except MissingStatError as e:
+        # the sheet can't be loaded to look for other problems
+        return ["{}: error: {}".format(path, message) for message in e.missing], False
+    problems = check_sheet(sheet)
+    lines = ["{}: {}: {}".format(path, level, message) for level, message in problems]
+    if len(problems) == 0:
+        lines.append("{}: OK, {} stats on {} pages".format(path, len(sheet.registry), len(sheet.pages)))
+    return lines, not any([level == "error" for level, message in problems])
+def convert_command(path, options):
+    outpath = output_path("convert", path, options)
+    if os.path.abspath(outpath) == os.path.abspath(path):
+        return ["{}: not converted, it would replace itself".format(path)], False
+    save_sheet_file(outpath, load_sheet(path, options['journal']))
+    return ["{} -> {}".format(path, outpath)], True
+commands = {'values': values_command, 'check': check_command, 'convert': convert_command}
+
+# run a command on one sheet; called in a worker process
+def process_sheet(task):
+    command, path, options = task
+    try:
+        lines, ok = commands[command](path, options)
+    except Exception as e:
+        lines, ok = ["{}: error: {}: {}".format(path, type(e).__name__, e)], False
+    return lines, ok
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Calculate, check and convert MetaChar character sheets.")
+    parser.add_argument("-j", "--jobs", type = int, default = os.cpu_count(),
+                        help = "number of sheets to handle at once (default: number of CPUs)")
+    parser.add_argument("--no-journal", dest = "journal", action = "store_false",
+                        help = "ignore changes in journals, using sheets as last saved")
+    subparsers = parser.add_subparsers(dest = "command")
+    subparsers.required = True
+    values_parser = subparsers.add_parser("values", help = "write the value of every stat")
+    values_parser.add_argument("--format", choices = ["csv", "json"], default = "csv")
+    values_parser.add_argument("--out", help = "directory for a file per sheet (default: print, for one sheet)")
+    subparsers.add_parser("check", help = "look for problems in sheets")
+    convert_parser = subparsers.add_parser("convert", help = "save sheets in the text or binary format")
+    convert_parser.add_argument("--to", choices = sorted(format_extensions), required = True)
+    convert_parser.add_argument("--out", required = True, help = "directory for converted sheets")
+    for p in [values_parser, subparsers.choices['check'], convert_parser]:
+        p.add_argument("sheets", nargs = "+", help = "sheet files and directories of sheet files")
+    args = parser.parse_args(argv)
+
+    sheets = find_sheets(args.sheets)
+    if len(sheets) == 0:
+        parser.error("no sheet files found")
+    options = {'journal': args.journal, 'format': getattr(args, "format", None), 'out': getattr(args, "out", None),
+               'to': getattr(args, "to", None)}
+    if args.command == "values" and options['out'] == None and len(sheets) > 1:
+        parser.error("--out is needed for values of more than one sheet")
+    # sheets are handled in separate processes, so no two may write the same file, or one another is reading
+    inputs = {os.path.normcase(os.path.abspath(path)): path for path in sheets}
+    outputs = dict()
+    for path in sheets:
+        outpath = output_path(args.command, path, options)
+        if outpath == None:
+            continue
+        key = os.path.normcase(os.path.abspath(outpath))
+        if key in outputs:
+            parser.error("{} and {} would both be written to {}".format(outputs[key], path, outpath))
+        if inputs.get(key, path) != path:
+            parser.error("{} would be written over {}, which is also being read".format(path, inputs[key]))
+        outputs[key] = path
+    if options['out'] != None:
+        os.makedirs(options['out'], exist_ok = True)
+    tasks = [(args.command, path, options) for path in sheets]
+    if args.jobs <= 1 or len(tasks) == 1:
+        results = map(process_sheet, tasks)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers = args.jobs)
+        results = executor.map(process_sheet, tasks)
+    failed = 0
+    for lines, ok in results:
+        for line in lines:
+            print(line)
+        failed += not ok
+    if executor != None:
+        executor.shutdown()
+    if failed > 0 and len(tasks) > 1:
+        print("{} of {} sheets failed".format(failed, len(tasks)), file = sys.stderr)
+    return 1 if failed > 0 else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,2194 @@
+# Model of an interactive editable character sheet: stats, pages, calculation of values, and
+# reading and writing sheet files.  Nothing here depends on Kivy, so sheets can be loaded,
+# calculated and saved without a window.  The widgets in main.py are views of these objects.
+
+import bisect
+import gc
+import importlib.util
+import itertools
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import weakref
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from operator import attrgetter
+# NumPy is only imported when it is first used (see use_numpy), as importing it takes a while and is not
+# needed to start the program.  Without it, stats are calculated one at a time instead.
+numpy = None
+numpy_available = importlib.util.find_spec("numpy") != None
+def use_numpy():
+    global numpy
+    if numpy == None and numpy_available:
+        import numpy
+    return numpy != None
+
+version_str = "0.0"
+
+# Registry of stats on a character sheet.  Each stat gets an ID that stays the same when other stats
+# are added or deleted, and is used to refer to the stat in saved files.
+# The registry also keeps an index of the stats available for calculating other stats (calcavail), which
+# Stat keeps up to date when calcavail changes.
+class StatRegistry(object):
+    def __init__(self):
+        self.stats = dict() # stat ID to stat, in the order stats were added
+        self.calcstats = dict() # stat ID to stat, for stats with calcavail
+        self.next_id = 0
+        self.version = 0 # counts stats added and removed (see compiled_sheet)
+    def append(self, stat):
+        # keep the ID the stat already has (e.g. from a file) unless another stat is using it
+        if stat.statid == None or stat.statid in self.stats:
+            stat.statid = self.next_id
+        self.stats[stat.statid] = stat
+        self.next_id = max(self.next_id, stat.statid + 1)
+        stat.registry = self
+        self.update_calc(stat)
+        self.version += 1
+    def extend(self, stats):
+        [self.append(s) for s in stats]
+    def remove(self, stat):
+        del self.stats[stat.statid]
+        self.calcstats.pop(stat.statid, None)
+        self.version += 1
+    def update_calc(self, stat):
+        if stat.calcavail:
+            self.calcstats[stat.statid] = stat
+        else:
+            self.calcstats.pop(stat.statid, None)
+    def clear(self):
+        self.stats.clear()
+        self.calcstats.clear()
+        self.next_id = 0
+        self.version += 1
+    def __getitem__(self, statid):
+        return self.stats[statid]
+    def __contains__(self, stat):
+        return self.stats.get(stat.statid) is stat
+    def __iter__(self):
+        return iter(self.stats.values())
+    def __len__(self):
+        return len(self.stats)
+
+# A character sheet in memory: its stats, its pages, the dependency graph between its stats, and the
+# journal of changes to it.  Many sheets can be open at once, e.g. a whole party, and one of them is
+# active: the one being shown and edited.  Functions below that work on a sheet take it as their last
+# argument and use the active sheet if it is not given.  Nothing changes a sheet that is not open except
+# whatever made it, so sheets can be read and calculated on worker threads while another is shown.
+class Sheet(object):
+    def __init__(self, registry = None, pages = None, title = ""):
+        self.registry = StatRegistry() if registry == None else registry # all stats for the sheet
+        self.pages = [] if pages == None else pages # stats pages (StatPage), in order
+        self.title = title # name shown for the sheet until it has a file
+        # Dependency graph between stats.  For each stat, the set of stats whose values are calculated
+        # from it (reverse edges), and the list of stats it is calculated from (forward edges).
+        self.stat_dependents = dict()
+        self.stat_sources = dict()
+        self.dirty_stats = set() # stats whose displayed value is out of date
+        # counts changes to the graph, so that things made from it know when to make themselves again
+        self.graph_version = 0
+        self.compiled = None # the graph compiled into arrays, if it has been (see compiled_sheet)
+        self.journal = None # journal of changes, if the sheet has a file (see start_journal)
+    def name(self):
+        # name for lists of open sheets: the sheet file without its extension, if it has one
+        if self.journal != None:
+            return os.path.splitext(os.path.basename(self.journal.sheetpath))[0]
+        return self.title if self.title != "" else "Unsaved sheet"
+# sheets in memory, in the order they were opened, and the active one
+sheet_state = {'active': None, 'open': []}
+def active_sheet():
+    return sheet_state['active']
+def sheet_or_active(sheet):
+    return sheet_state['active'] if sheet == None else sheet
+# keep a sheet in memory, e.g. one just read by SheetLoader, without making it active
+def add_open_sheet(sheet):
+    if sheet not in sheet_state['open']:
+        sheet_state['open'].append(sheet)
+# the open sheet that is saved to a file, if any.  A file should only be open once, as each copy of it
+# would keep its own journal next to it and save over the other's changes.
+def find_open_sheet(sheetpath):
+    key = os.path.normcase(os.path.realpath(sheetpath))
+    for sheet in sheet_state['open']:
+        if sheet.journal != None and os.path.normcase(os.path.realpath(sheet.journal.sheetpath)) == key:
+            return sheet
+    return None
+# make a sheet the active one, opening it if it is not open yet
+def activate_sheet(sheet):
+    add_open_sheet(sheet)
+    sheet_state['active'] = sheet
+# stop keeping a sheet in memory.  If it was the active one, the last one opened becomes active, or a new
+# empty sheet if there are none left.
+def close_sheet(sheet):
+    stop_journal(sheet)
+    sheet_state['open'].remove(sheet)
+    if sheet_state['active'] is sheet:
+        activate_sheet(sheet_state['open'][-1] if len(sheet_state['open']) > 0 else Sheet())
+# put a sheet in place of the active one, which is closed; for scripts that work on one sheet at a time
+def replace_active_sheet(sheet):
+    old = sheet_state['active']
+    stop_journal(old)
+    sheet_state['open'][sheet_state['open'].index(old)] = sheet
+    sheet_state['active'] = sheet
+activate_sheet(Sheet())
+# add stats to a sheet, each preceded by the stats created within it
+def register_stats(stats, sheet = None):
+    registry = sheet_or_active(sheet).registry
+    for s in stats:
+        if isinstance(s, SumStat):
+            register_stats(s.statlist_new, sheet)
+        registry.append(s)
+# take a stat off a sheet, first taking it out of the stats calculated from it, so that no stat is left
+# referring to a stat that is not on the sheet.  Returns the stats that were changed.
+def remove_stat(stat, sheet = None):
+    sheet = sheet_or_active(sheet)
+    dependents = list(sheet.stat_dependents.get(stat, ()))
+    for s in dependents:
+        s.drop_source(stat)
+        link_stat(s, sheet)
+    sheet.stat_dependents.pop(stat, None)
+    unlink_stat(stat, sheet)
+    sheet.registry.remove(stat)
+    return dependents
+# find all stats available to include in calculations
+def find_stats_for_calc(sheet = None):
+    return list(sheet_or_active(sheet).registry.calcstats.values())
+# update the text displayed for all stat values
+def update_all_stat_text(sheet = None):
+    [s.view.update_button_text() for s in sheet_or_active(sheet).registry if s.view != None]
+
+# how often calculated stat values were taken from the cache versus recalculated
+value_cache_counts = {'hits': 0, 'misses': 0}
+# remove a stat's edges to the stats it is calculated from
+def unlink_stat(stat, sheet = None):
+    sheet = sheet_or_active(sheet)
+    sheet.graph_version += 1
+    for s in set(sheet.stat_sources.pop(stat, [])):
+        sheet.stat_dependents[s].discard(stat)
+# update the graph with the current components of a stat
+def link_stat(stat, sheet = None):
+    sheet = sheet_or_active(sheet)
+    sheet.graph_version += 1
+    if stat in sheet.stat_sources:
+        unlink_stat(stat, sheet)
+    sources = stat.find_sources()
+    if len(sources) > 0:
+        sheet.stat_sources[stat] = sources
+        for s in sources:
+            sheet.stat_dependents.setdefault(s, set()).add(stat)
+# build the whole graph again from the sheet's stats (after loading or clearing a sheet)
+def rebuild_stat_graph(sheet = None):
+    sheet = sheet_or_active(sheet)
+    sheet.graph_version += 1
+    sheet.stat_dependents.clear()
+    sheet.stat_sources.clear()
+    sheet.dirty_stats.clear()
+    [link_stat(s, sheet) for s in sheet.registry]
+    [s.invalidate_value() for s in sheet.registry]
+# find loops of stats calculated from each other, whose values can't be calculated.  Returns a list of
+# loops, each a list of stats starting and ending with the same stat.
+def find_dependency_cycles(sheet = None):
+    stat_sources = sheet_or_active(sheet).stat_sources
+    cycles = []
+    visited = dict() # stat to True while its sources are being followed, False once they all have been
+    for start in stat_sources:
+        if start in visited:
+            continue
+        visited[start] = True
+        path = [start]
+        stack = [iter(stat_sources[start])]
+        while len(stack) > 0:
+            source = next(stack[-1], None)
+            if source == None:
+                visited[path.pop()] = False
+                stack.pop()
+            elif visited.get(source) == True:
+                cycles.append(path[path.index(source):] + [source])
+            elif source not in visited:
+                visited[source] = True
+                path.append(source)
+                stack.append(iter(stat_sources.get(source, ())))
+    return cycles
+# mark a stat and everything calculated from it, directly or indirectly, as dirty
+def mark_stat_dirty(stat, sheet = None):
+    sheet = sheet_or_active(sheet)
+    tocheck = [stat]
+    while len(tocheck) > 0:
+        s = tocheck.pop()
+        if s not in sheet.dirty_stats:
+            sheet.dirty_stats.add(s)
+            s.invalidate_value() # cached value needs to be calculated again
+            tocheck.extend(sheet.stat_dependents.get(s, ()))
+# update the text displayed for dirty stats only
+def refresh_dirty_stats(sheet = None):
+    dirty_stats = sheet_or_active(sheet).dirty_stats
+    while len(dirty_stats) > 0:
+        s = dirty_stats.pop()
+        if s.view != None:
+            s.view.update_button_text()
+# Changes are shown straight away unless refresh_state['schedule'] is set to a function that arranges for
+# run_scheduled_refresh to be called soon, e.g. once per frame in a program with a window.  Then many quick
+# changes, such as taps on a counter, are shown with one refresh.
+refresh_state = {'schedule': None}
+def run_scheduled_refresh(*args):
+    [refresh_dirty_stats(s) for s in sheet_state['open']]
+# update the text displayed for a stat whose value changed, and for all stats depending on it
+def update_stat_text(stat, sheet = None):
+    mark_stat_dirty(stat, sheet)
+    if batch_state['depth'] == 0:
+        if refresh_state['schedule'] != None:
+            refresh_state['schedule']()
+        else:
+            refresh_dirty_stats(sheet)
+
+# Calculating every stat on the sheet at once with NumPy, for tools that need every value and for batches
+# that change many stats.  The graph is compiled into arrays (see CompiledSheet), which are kept until the
+# graph changes.  Stats are put in layers, each calculated only from stats in earlier layers, and each
+# layer is calculated with a few operations on whole arrays: sums add up their sources' values, ability
+# scores also give (total - 10) // 2 to the stats calculated from them, and fractions divide, rounding down
+# or up.  The results go into the same caches that value_for_sum fills, and are the same integers.  Stats
+# that value_for_sum could not calculate either (loops, division by zero, values that are not integers) are
+# left out, so value_for_sum still raises the same errors for them.
+vector_state = {'on': numpy_available}
+# fewest dirty stats at the end of a batch for which every stat is calculated at once; only done if the
+# compiled graph is still current, since compiling takes longer than calculating the stats one at a time
+vector_min_dirty = 1000
+class CompiledSheet(object):
+    def __init__(self, sheet):
+        self.version = (sheet.graph_version, sheet.registry.version)
+        stats = list(sheet.registry)
+        n = len(stats)
+        index = {s: i for i, s in enumerate(stats)}
+        # stats whose values are stored in them, rather than calculated from other stats
+        self.leaves = [s for s in stats if isinstance(s, (SimpleStat, CounterStat))]
+        self.leafindex = numpy.array([index[s] for s in self.leaves], dtype = numpy.int64)
+        issum = numpy.array([isinstance(s, SumStat) for s in stats], dtype = bool)
+        isability = numpy.array([isinstance(s, DDAbilityStat) for s in stats], dtype = bool)
+        isfraction = numpy.array([isinstance(s, FractionStat) for s in stats], dtype = bool)
+        # an edge from each stat to each of its sources, in order, taken from the graph
+        dst = []
+        src = []
+        for i, s in enumerate(stats):
+            sources = sheet.stat_sources.get(s, ())
+            dst.extend([i] * len(sources))
+            src.extend([index.get(source, -1) for source in sources])
+        dst = numpy.array(dst, dtype = numpy.int64)
+        src = numpy.array(src, dtype = numpy.int64)
+        # Layer of each stat, found a layer at a time from the stats with no sources.  Stats in a loop, or
+        # calculated from one or from a stat that is not on the sheet, never get a layer.
+        pairs = numpy.unique(dst[src >= 0] * n + src[src >= 0]) # each source counted once
+        pairdst = pairs // n
+        pairsrc = pairs % n
+        waiting = numpy.bincount(pairdst, minlength = n) # sources not in a layer yet
+        waiting[dst[src < 0]] = -1
+        layer = numpy.full(n, -1, dtype = numpy.int64)
+        current = numpy.flatnonzero(waiting == 0)
+        depth = 0
+        while len(current) > 0:
+            layer[current] = depth
+            incurrent = numpy.zeros(n, dtype = bool)
+            incurrent[current] = True
+            done = numpy.bincount(pairdst[incurrent[pairsrc]], minlength = n)
+            waiting -= done
+            current = numpy.flatnonzero((done > 0) & (waiting == 0))
+            depth += 1
+        # for each layer after the first: sums, with their edges (grouped by sum, since edges are in the
+        # order of stats), and fractions, with the stat each divides
+        edgelayer = layer[dst]
+        self.layers = []
+        sums = []
+        fractions = []
+        for d in range(1, depth):
+            sumedges = (edgelayer == d) & issum[dst]
+            edges = dst[sumedges]
+            starts = numpy.flatnonzero(numpy.concatenate([[True], edges[1:] != edges[:-1]])) if len(edges) > 0 else edges
+            fractionedges = (edgelayer == d) & isfraction[dst]
+            self.layers.append({'sums': edges[starts], 'ability': isability[edges[starts]], 'edges': src[sumedges],
+                                'starts': starts, 'fractions': dst[fractionedges],
+                                'numerators': src[fractionedges], 'firstfraction': len(fractions)})
+            sums.extend(edges[starts].tolist())
+            fractions.extend(dst[fractionedges].tolist())
+        self.sums = [stats[i] for i in sums]
+        self.fractions = [stats[i] for i in fractions]
+        # sums with nothing in them, which are always 0, and give (0 - 10) // 2 if they are ability scores
+        empty = issum & (layer == 0)
+        self.emptysums = [stats[i] for i in numpy.flatnonzero(empty)]
+        self.emptyability = numpy.flatnonzero(empty & isability)
+        self.issum = issum
+        self.isability = isability
+        self.unlayered = numpy.flatnonzero(layer < 0)
+        self.index = index
+        self.size = n
+    def leaf_values(self):
+        # values stored in stats, or None if they are not all integers
+        leafvalues = [s.currentval if type(s) is CounterStat else s.statval for s in self.leaves]
+        if not all([type(v) is int for v in leafvalues]):
+            return None
+        return leafvalues
+    def run(self, leafvalues, overindex = None, overvalues = None):
+        # Calculate every stat in a number of scenarios at once.  leafvalues has a row for each leaf and a
+        # column for each scenario.  The stats at overindex are given the shown values in the rows of
+        # overvalues instead of being calculated.  Returns value_for_sum of each stat and the value shown
+        # for it (the total, for sums), with a row for each stat and a column for each scenario, and
+        # whether each stat can't be calculated.
+        values = numpy.zeros((self.size, leafvalues.shape[1]), dtype = numpy.int64)
+        totals = numpy.zeros((self.size, leafvalues.shape[1]), dtype = numpy.int64)
+        bad = numpy.zeros(self.size, dtype = bool)
+        values[self.leafindex] = leafvalues
+        values[self.emptyability] = (0 - 10) // 2
+        bad[self.unlayered] = True
+        divisors = numpy.array([s.divisor for s in self.fractions], dtype = numpy.int64)
+        roundup = numpy.array([not s.rounddown for s in self.fractions], dtype = bool)
+        def put_back_overrides():
+            # done after each layer, before later layers use the overridden stats
+            if overindex is not None:
+                values[overindex] = numpy.where(self.isability[overindex][:, None], (overvalues - 10) // 2, overvalues)
+                totals[overindex] = overvalues
+                bad[overindex] = False
+        put_back_overrides()
+        for layer in self.layers:
+            if len(layer['sums']) > 0:
+                total = numpy.add.reduceat(values[layer['edges']], layer['starts'], axis = 0)
+                totals[layer['sums']] = total
+                values[layer['sums']] = numpy.where(layer['ability'][:, None], (total - 10) // 2, total)
+                bad[layer['sums']] = numpy.logical_or.reduceat(bad[layer['edges']], layer['starts'])
+            if len(layer['fractions']) > 0:
+                first = layer['firstfraction']
+                last = first + len(layer['fractions'])
+                zero = divisors[first:last] == 0
+                divisor = numpy.where(zero, 1, divisors[first:last])[:, None]
+                numerator = values[layer['numerators']]
+                values[layer['fractions']] = numerator // divisor + (roundup[first:last][:, None] & (numerator % divisor > 0))
+                bad[layer['fractions']] = bad[layer['numerators']] | zero
+            put_back_overrides()
+        shown = numpy.where(self.issum[:, None], totals, values)
+        return values, shown, bad
+    def calculate(self):
+        # fill the cached values of sums and fractions, returning False if the values stored in stats are
+        # not all integers, in which case nothing is filled in
+        leafvalues = self.leaf_values()
+        if leafvalues == None:
+            return False
+        values, shown, bad = self.run(numpy.array(leafvalues, dtype = numpy.int64)[:, None])
+        # copy the results into the stats' caches
+        sums = numpy.concatenate([l['sums'] for l in self.layers]) if len(self.sums) > 0 else []
+        fractions = numpy.concatenate([l['fractions'] for l in self.layers]) if len(self.fractions) > 0 else []
+        for s, total, isbad in zip(self.sums, shown[sums, 0].tolist(), bad[sums].tolist()):
+            s.cachedtotal = None if isbad else total
+        for s, quotient, isbad in zip(self.fractions, values[fractions, 0].tolist(), bad[fractions].tolist()):
+            s.cachedval = None if isbad else quotient
+        for s in self.emptysums:
+            s.cachedtotal = 0
+        return True
+def compiled_sheet_current(sheet = None):
+    sheet = sheet_or_active(sheet)
+    return sheet.compiled != None and sheet.compiled.version == (sheet.graph_version, sheet.registry.version)
+# the sheet compiled into arrays, compiled again if the graph or the stats on the sheet have changed since
+def compiled_sheet(sheet = None):
+    sheet = sheet_or_active(sheet)
+    if not compiled_sheet_current(sheet):
+        use_numpy()
+        sheet.compiled = CompiledSheet(sheet)
+    return sheet.compiled
+# calculate every stat on the sheet, with NumPy if it is available and turned on, filling their caches
+def calculate_all_stats(sheet = None):
+    sheet = sheet_or_active(sheet)
+    if vector_state['on'] and compiled_sheet(sheet).calculate():
+        return
+    for s in sheet.registry:
+        try:
+            s.value_for_sum()
+        except (ArithmeticError, RecursionError):
+            pass # left for value_for_sum to raise again when the value is needed
+
+# What-if scenarios: every stat on the sheet calculated with some stats given other values, such as each
+# level from 1 to 20, without changing the sheet.  All scenarios are calculated together, with NumPy if it
+# is available.  Overrides are given as {stat: values}, with a value for each scenario, or one value used
+# in all of them; a value is what is shown for the stat (for ability scores, the score).
+class ScenarioResults(object):
+    def __init__(self, stats, values, shown, count):
+        self.stats = stats # stats with numbers, in the order of the registry
+        self.index = {s: i for i, s in enumerate(stats)}
+        # Value_for_sum and the value shown, for each stat in each scenario, or None if it can't be
+        # calculated.  From NumPy these are arrays, or None for a stat that can't be calculated in any
+        # scenario, and are only turned into ints as they are used.
+        self.values = values
+        self.shown = shown
+        self.count = count # number of scenarios
+    def value(self, stat, i):
+        row = self.values[self.index[stat]]
+        return None if row is None or row[i] is None else int(row[i])
+    def text(self, stat, i):
+        row = self.shown[self.index[stat]]
+        if row is None or row[i] is None:
+            return "?"
+        shown = int(row[i])
+        if isinstance(stat, DDAbilityStat):
+            return "{} ({:+d})".format(shown, (shown - 10) // 2)
+        return format_value(shown, getattr(stat, "showplus", False))
+# value_for_sum and the value shown for a stat with overrides in one scenario, without using or filling
+# caches; known holds the stats done so far, and both are None for stats that can't be calculated
+def value_with_overrides(stat, overrides, known):
+    if stat in known:
+        return known[stat]
+    known[stat] = (None, None) # until it's done, so a stat calculated from itself can't be calculated
+    if stat in overrides:
+        shown = overrides[stat]
+        value = (shown - 10) // 2 if isinstance(stat, DDAbilityStat) else shown
+    elif isinstance(stat, SumStat):
+        parts = [value_with_overrides(s, overrides, known)[0] for s in stat.find_sources()]
+        shown = None if None in parts else sum(parts)
+        value = None if shown == None else (shown - 10) // 2 if isinstance(stat, DDAbilityStat) else shown
+    elif isinstance(stat, FractionStat) and stat.stat_to_div != None:
+        numerator = value_with_overrides(stat.stat_to_div, overrides, known)[0]
+        if numerator == None or stat.divisor == 0:
+            value = None
+        else:
+            value = numerator // stat.divisor + (not stat.rounddown and numerator % stat.divisor > 0)
+        shown = value
+    else:
+        value = shown = stat.value_for_sum()
+    known[stat] = (value, shown)
+    return value, shown
+def evaluate_scenarios(overrides, sheet = None):
+    sheet = sheet_or_active(sheet)
+    count = max([len(v) if isinstance(v, (list, tuple)) else 1 for v in overrides.values()] + [1])
+    columns = dict()
+    for stat, v in overrides.items():
+        column = list(v) if isinstance(v, (list, tuple)) else [v]
+        if not hasattr(stat, "value_text") or isinstance(stat, TextStat):
+            raise ValueError('stat "{}" has no number to change'.format(stat.statname))
+        if len(column) == 1:
+            column = column * count
+        if len(column) != count:
+            raise ValueError('{} values for "{}", but {} scenarios'.format(len(column), stat.statname, count))
+        if not all([type(x) is int for x in column]):
+            raise ValueError('values for "{}" are not all whole numbers'.format(stat.statname))
+        columns[stat] = column
+    stats = [s for s in sheet.registry if hasattr(s, "value_text")]
+    if vector_state['on']:
+        compiled = compiled_sheet(sheet)
+        if not all([s in compiled.index for s in stats]):
+            compiled = sheet.compiled = CompiledSheet(sheet) # changed in a way that was not counted
+        leafvalues = compiled.leaf_values()
+        if leafvalues != None and all([s in compiled.index for s in columns]):
+            leafvalues = numpy.repeat(numpy.array(leafvalues, dtype = numpy.int64)[:, None], count, axis = 1)
+            overindex = numpy.array([compiled.index[s] for s in columns], dtype = numpy.int64)
+            overvalues = numpy.array(list(columns.values()), dtype = numpy.int64).reshape(len(columns), count)
+            values, shown, bad = compiled.run(leafvalues, overindex, overvalues)
+            rows = numpy.array([compiled.index[s] for s in stats], dtype = numpy.int64)
+            values = list(values[rows])
+            shown = list(shown[rows])
+            for i in numpy.flatnonzero(bad[rows]).tolist():
+                values[i] = shown[i] = None
+            return ScenarioResults(stats, values, shown, count)
+    values = [[None] * count for s in stats]
+    shown = [[None] * count for s in stats]
+    for i in range(count):
+        known = dict()
+        scenario = {s: column[i] for s, column in columns.items()}
+        for j, s in enumerate(stats):
+            try:
+                values[j][i], shown[j][i] = value_with_overrides(s, scenario, known)
+            except RecursionError:
+                known.clear()
+    return ScenarioResults(stats, values, shown, count)
+# Values for a stat in what-if scenarios, from text such as "1-20" or "8, 10, 12-15".  Raises ValueError.
+def parse_scenario_values(text):
+    values = []
+    for part in text.split(","):
+        match = re.match(r"^\s*(-?\d+)\s*(?:-\s*(-?\d+)\s*)?$", part)
+        if match == None:
+            raise ValueError('"{}" is not a number or a range of numbers'.format(part.strip()))
+        first = int(match.group(1))
+        last = first if match.group(2) == None else int(match.group(2))
+        values.extend(range(first, last + 1) if first <= last else range(first, last - 1, -1))
+    return values
+
+# Batches of changes, for loading a sheet or for scripts that make many edits at once:
+#     with batch_update():
+#         ...
+# Inside a batch, displayed values are not refreshed as stats change; when the outermost batch ends,
+# each dirty stat is calculated and refreshed once.  Views can also put off their own work until then.
+batch_state = {'depth': 0}
+batch_deferred = dict() # functions to run at the end of the batch, in order, each only once
+@contextmanager
+def batch_update():
+    batch_state['depth'] += 1
+    try:
+        yield
+    finally:
+        batch_state['depth'] -= 1
+        if batch_state['depth'] == 0:
+            finish_batch()
+def in_batch():
+    return batch_state['depth'] > 0
+# run a function at the end of the current batch, or now if there is no batch
+def defer_until_batch_end(fn):
+    if batch_state['depth'] == 0:
+        fn()
+    else:
+        batch_deferred[fn] = None
+def finish_batch():
+    for sheet in sheet_state['open']:
+        if vector_state['on'] and len(sheet.dirty_stats) >= vector_min_dirty and compiled_sheet_current(sheet):
+            calculate_all_stats(sheet)
+    # deferred functions can change more stats, so keep going until nothing is left
+    while len(batch_deferred) > 0 or any([len(s.dirty_stats) > 0 for s in sheet_state['open']]):
+        run_scheduled_refresh()
+        while len(batch_deferred) > 0:
+            fn = next(iter(batch_deferred))
+            del batch_deferred[fn]
+            fn()
+
+# sanitize text input for saving and loading
+def sanitize_text(string):
+    string = string.replace("<", "")
+    string = string.replace(">", "")
+    return string
+
+# format a number for display, with a plus sign before positive numbers if requested
+def format_value(val, showplus):
+    if showplus:
+        return '{:+d}'.format(val)
+    return str(val)
+
+# Descriptions of stats in a binary sheet file, left in the memory-mapped file until they are shown.
+# Descriptions are most of the text of many sheets but are only needed one at a time, so this keeps
+# memory use and loading time down.  The most recently used descriptions are kept decoded.
+desc_cache_size = 64
+# stores whose file is still mapped
+description_stores = weakref.WeakSet()
+class DescriptionStore(object):
+    def __init__(self, path, data, offsets, start):
+        self.path = path
+        self.data = data # the file, memory-mapped
+        self.offsets = offsets # where each description starts, relative to start, then where the last ends
+        self.start = start
+        self.cache = OrderedDict() # description index to text, least recently used first
+        self.lock = threading.Lock() # descriptions may also be read on the thread that saves the sheet
+        description_stores.add(self)
+    def raw(self, index):
+        # UTF-8 bytes of a description
+        with self.lock:
+            return self.data[(self.start + self.offsets[index]):(self.start + self.offsets[index + 1])]
+    def text(self, index):
+        with self.lock:
+            if index in self.cache:
+                self.cache.move_to_end(index)
+                return self.cache[index]
+        text = self.raw(index).decode("utf-8")
+        with self.lock:
+            self.cache[index] = text
+            if len(self.cache) > desc_cache_size:
+                self.cache.popitem(last = False)
+        return text
+    def unmap(self):
+        # keep the descriptions in memory instead, so that the file can be replaced
+        with self.lock:
+            if isinstance(self.data, mmap.mmap):
+                end = self.start + self.offsets[-1]
+                data = self.data
+                self.data = data[self.start:end]
+                self.start = 0
+                data.close()
+        description_stores.discard(self)
+# a description in a DescriptionStore
+class StoredText(object):
+    __slots__ = ('store', 'index')
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+    def text(self):
+        return self.store.text(self.index)
+    def raw(self):
+        return self.store.raw(self.index)
+# text and UTF-8 bytes of a description, which may be a string or StoredText
+def desc_text(value):
+    return value if type(value) is str else value.text()
+def desc_bytes(value):
+    return value.encode("utf-8") if type(value) is str else value.raw()
+# attribute for a description, kept in the given slot as a string or StoredText and read as a string
+def description_property(slot):
+    getslot = attrgetter(slot)
+    def get(self):
+        return desc_text(getslot(self))
+    def set(self, value):
+        setattr(self, slot, value)
+    return property(get, set)
+# slot holding a description attribute
+def desc_slot(attr):
+    return "_" + attr
+
+# A stat with a name and a popup description but no value, shown as a button.
+# Superclass for the various types of stat.
+class Stat(object):
+    __slots__ = ('statname', '_statdesc', '_calcavail', 'statid', 'btnwidth', 'view', 'registry')
+    filetag = "StatBar" # tag in saved files
+    # fields in saved files, in order, as (tag, kind); see write_fields and conv_fns
+    filefields = (('statid', 'int'), ('statname', 'str'), ('statdesc', 'desc'), ('calcavail', 'bool'),
+                  ('statbtn.size_hint_x', 'float'))
+    statdesc = description_property('_statdesc')
+    def __init__(self, statname = "", statdesc = "", calcavail = False, btnwidth = 0.5):
+        self.registry = None # StatRegistry of the sheet the stat was added to
+        self.statid = None # assigned when added to a sheet
+        self.statname = statname
+        self.statdesc = statdesc
+        self.calcavail = calcavail # is this stat available for calculation of other stats?
+        self.btnwidth = btnwidth # width of the button with the stat name, relative to the bar
+        self.view = None # widget currently displaying this stat, if any
+    @property
+    def calcavail(self):
+        return self._calcavail
+    @calcavail.setter
+    def calcavail(self, value):
+        self._calcavail = value
+        if self.registry != None and self in self.registry:
+            self.registry.update_calc(self)
+    def find_sources(self):
+        return [] # stats that this stat is calculated from
+    def drop_source(self, stat):
+        pass # stop calculating this stat from another, which is being deleted
+    def value_for_sum(self):
+        return 0  # if there is no number associated with this stat, return zero
+    def invalidate_value(self):
+        pass # this function does something if the stat caches a calculated value
+    def write_to_file(self, con):
+        write_record(con, snapshot_record(self))
+
+# stat with a simple value
+class SimpleStat(Stat):
+    __slots__ = ('statval', 'showplus')
+    filetag = "StatBarSimple"
+    filefields = Stat.filefields + (('statval', 'int'), ('showplus', 'bool'))
+    def __init__(self, statval = 0, showplus = False, **kwargs):
+        Stat.__init__(self, **kwargs)
+        self.statval = int(statval)
+        self.showplus = showplus # show plus sign (for roll mods)?
+    def value_for_sum(self):
+        return self.statval
+    def value_text(self):
+        return format_value(self.statval, self.showplus)
+
+# stat that is a sum of other stats
+class SumStat(Stat):
+    __slots__ = ('statlist_existing', 'statlist_new', 'showplus', 'cachedtotal')
+    filetag = "StatBarSum"
+    filefields = Stat.filefields + (('statlist_existing', 'statlist'), ('childstats.statlist', 'statlist'),
+                                    ('showplus', 'bool'))
+    def __init__(self, statlist_existing = None, statlist_new = None, showplus = False, **kwargs):
+        Stat.__init__(self, **kwargs)
+        # stats created elsewhere on the sheet
+        self.statlist_existing = [] if statlist_existing == None else statlist_existing
+        # stats that were created within this stat and are only shown when editing it
+        self.statlist_new = [] if statlist_new == None else statlist_new
+        self.showplus = showplus
+        self.cachedtotal = None # total of components, kept until a component changes
+    def find_sources(self):
+        return self.statlist_existing + self.statlist_new
+    def drop_source(self, stat):
+        self.statlist_existing = [s for s in self.statlist_existing if s is not stat]
+        self.statlist_new[:] = [s for s in self.statlist_new if s is not stat] # also shown as a page
+    def component_total(self):
+        if self.cachedtotal == None:
+            value_cache_counts['misses'] += 1
+            self.cachedtotal = sum([s.value_for_sum() for s in self.statlist_existing]) + \
+              sum([s.value_for_sum() for s in self.statlist_new])
+        else:
+            value_cache_counts['hits'] += 1
+        return self.cachedtotal
+    def invalidate_value(self):
+        self.cachedtotal = None
+    def value_for_sum(self):
+        return self.component_total()
+    def value_text(self):
+        return format_value(self.value_for_sum(), self.showplus)
+
+# D&D ability score, with roll modifier
+class DDAbilityStat(SumStat):
+    __slots__ = ()
+    filetag = "DDAbilityBar"
+    def __init__(self, calcavail = True, **kwargs):
+        # generally want D&D roll mods for calculations
+        SumStat.__init__(self, calcavail = calcavail, **kwargs)
+    def value_for_sum(self):
+        return (self.component_total() - 10) // 2
+    def value_text(self):
+        # text for label has ability followed by modifier
+        score = self.component_total()
+        return "{} ({:+d})".format(score, (score - 10) // 2)
+
+# stat that is a fraction of another stat
+class FractionStat(Stat):
+    __slots__ = ('stat_to_div', 'divisor', 'rounddown', 'showplus', 'cachedval')
+    filetag = "StatBarFraction"
+    filefields = Stat.filefields + (('stat_to_div', 'stat'), ('divisor', 'int'), ('rounddown', 'bool'),
+                                    ('showplus', 'bool'))
+    def __init__(self, stat_to_div = None, divisor = 2, rounddown = True, showplus = False, **kwargs):
+        Stat.__init__(self, **kwargs)
+        self.stat_to_div = stat_to_div
+        self.divisor = divisor
+        self.rounddown = rounddown
+        self.showplus = showplus
+        self.cachedval = None # calculated value, kept until the stat to divide changes
+    def find_sources(self):
+        return [] if self.stat_to_div == None else [self.stat_to_div]
+    def drop_source(self, stat):
+        if self.stat_to_div is stat:
+            self.stat_to_div = None
+    def value_for_sum(self):
+        if self.stat_to_div == None:
+            return 0
+        if self.cachedval == None:
+            value_cache_counts['misses'] += 1
+            numerator = self.stat_to_div.value_for_sum()
+            val =  numerator // self.divisor
+            if not self.rounddown and numerator % self.divisor > 0:
+                val += 1
+            self.cachedval = val
+        else:
+            value_cache_counts['hits'] += 1
+        return self.cachedval
+    def invalidate_value(self):
+        self.cachedval = None
+    def value_text(self):
+        return format_value(self.value_for_sum(), self.showplus)
+
+# stat with freestyle text
+class TextStat(Stat):
+    __slots__ = ('stattext',)
+    filetag = "StatBarText"
+    filefields = Stat.filefields + (('stattext', 'str'),)
+    def __init__(self, stattext = "", **kwargs):
+        Stat.__init__(self, **kwargs)
+        self.stattext = stattext
+
+# counter for hit points etc.
+class CounterStat(Stat):
+    __slots__ = ('defaultval', 'currentval')
+    filetag = "StatBarCounter"
+    filefields = Stat.filefields + (('defaultval', 'int'), ('currentval', 'int'))
+    def __init__(self, defaultval = 0, **kwargs):
+        Stat.__init__(self, **kwargs)
+        self.defaultval = defaultval
+        self.currentval = self.defaultval
+    def value_for_sum(self):
+        return self.currentval
+    def value_text(self):
+        return str(self.currentval)
+
+# Dice.  A dice expression is terms added or subtracted, each a whole number, NdM (N dice with M sides; N
+# is 1 if left out), NdMkhK or NdMklK (N dice keeping the K highest or lowest), or "adv" or "dis" (a d20
+# rolled with advantage or disadvantage, the same as 2d20kh1 or 2d20kl1).  The chance of every total is
+# worked out exactly, by convolving the chances of the terms, and kept for each expression, so a stat
+# rolling those dice only adds its modifiers when they change.
+dice_term_pattern = re.compile(r"\s*([+-])\s*(?:(adv|dis)|(\d*)d(\d+)(?:k([hl])(\d+))?|(\d+))\s*")
+dice_max_dice = 100 # dice in a term
+dice_max_sides = 1000
+dice_max_range = 10000 # difference between the highest and lowest totals of an expression
+# Work allowed for the terms of an expression keeping the highest or lowest dice, which take much longer to
+# work out than other terms, in the units of dice_keep_work: about 40 ms with NumPy on a desktop.
+dice_max_keep_work = 50000000
+dice_call_cost = 5000 # each addition of chances in dice_term_chances costs about as much as this many chances
+# rough cost of working out a term keeping the highest or lowest dice: dice_term_chances adds chances once
+# for each face and each pair of counts of dice, each time up to keep * sides + 1 of them
+def dice_keep_work(n, sides, keep):
+    return sides * (n + 1) * (n + 2) // 2 * (dice_call_cost + keep * sides + 1)
+dice_cache_size = 256
+dice_cache = OrderedDict() # distribution of each expression, the most recently used last
+# terms of a dice expression, as (sign, number of dice, sides, dice kept, whether the highest are kept), or
+# (sign, number, None, None, None) for numbers.  Raises ValueError.
+def parse_dice(expression):
+    text = expression.strip().lower()
+    if text == "":
+        raise ValueError("no dice given")
+    signed = text if text.startswith(("+", "-")) else "+" + text # every term starts with a sign
+    terms = []
+    pos = 0
+    while pos < len(signed):
+        match = dice_term_pattern.match(signed, pos)
+        if match == None:
+            raise ValueError('can\'t read "{}" in dice expression'.format((signed[pos:] if pos > 0 else text).strip()))
+        pos = match.end()
+        sign = -1 if match.group(1) == "-" else 1
+        if match.group(2) != None:
+            terms.append((sign, 2, 20, 1, match.group(2) == "adv"))
+            continue
+        if match.group(7) != None:
+            terms.append((sign, int(match.group(7)), None, None, None))
+            continue
+        n = 1 if match.group(3) == "" else int(match.group(3))
+        sides = int(match.group(4))
+        keep = n if match.group(5) == None else int(match.group(6))
+        if not (1 <= n <= dice_max_dice and 1 <= sides <= dice_max_sides):
+            raise ValueError("dice must be from 1 to {} dice of 1 to {} sides".format(dice_max_dice, dice_max_sides))
+        if not 1 <= keep <= n:
+            raise ValueError("can't keep {} of {} dice".format(keep, n))
+        terms.append((sign, n, sides, keep, match.group(5) != "l"))
+    if sum([dice_keep_work(n, sides, keep) for sign, n, sides, keep, highest in terms
+            if sides != None and keep < n]) > dice_max_keep_work:
+        raise ValueError("too many dice or sides to keep the highest or lowest of")
+    if sum([keep * (sides - 1) for sign, n, sides, keep, highest in terms if sides != None]) > dice_max_range:
+        raise ValueError("dice expression has too many possible totals")
+    return terms
+# Lists of chances are NumPy arrays if it is available, and lists otherwise.
+def new_chances(size):
+    return numpy.zeros(size) if numpy != None else [0.0] * size
+# add source, times scale, to target from index start
+def add_chances(target, start, source, scale):
+    if numpy != None:
+        target[start:(start + len(source))] += scale * source
+    else:
+        for i, c in enumerate(source):
+            target[start + i] += scale * c
+# chances of the totals of two independent rolls added together
+def convolve_chances(a, b):
+    if numpy != None:
+        return numpy.convolve(a, b)
+    total = [0.0] * (len(a) + len(b) - 1)
+    for i, c in enumerate(a):
+        if c > 0:
+            add_chances(total, i, b, c)
+    return total
+# the lowest total of a roll of dice, and the chance of each total from there up
+def dice_term_chances(n, sides, keep, highest):
+    if keep == n:
+        # one die's chances convolved with themselves n times, by repeated squaring
+        die = new_chances(sides)
+        for i in range(sides):
+            die[i] = 1.0 / sides
+        chances = [1.0]
+        while n > 0:
+            if n % 2 == 1:
+                chances = convolve_chances(chances, die)
+            n //= 2
+            if n > 0:
+                die = convolve_chances(die, die)
+        return keep, chances
+    # Go through the faces from the best down, choosing how many of the dice not counted yet show each
+    # face; the first dice counted are the ones kept.  counted[d] is the chance of each total of the kept
+    # dice with d dice counted, or None if d dice can't have been counted yet.
+    size = keep * sides + 1
+    ways = [[math.factorial(a) // (math.factorial(b) * math.factorial(a - b)) for b in range(a + 1)]
+            for a in range(n + 1)] # ways to choose b of a dice
+    counted = [None] * (n + 1)
+    counted[0] = new_chances(size)
+    counted[0][0] = 1.0
+    for face in (range(sides, 0, -1) if highest else range(1, sides + 1)):
+        after = [None] * (n + 1)
+        for d in range(n + 1):
+            if counted[d] is None:
+                continue
+            for c in range(n - d + 1):
+                if after[d + c] is None:
+                    after[d + c] = new_chances(size)
+                shift = (min(d + c, keep) - min(d, keep)) * face # from the dice showing this face that are kept
+                add_chances(after[d + c], shift, counted[d][:(size - shift)], ways[n - d][c] / sides ** c)
+        counted = after
+    chances = counted[n]
+    first = min([i for i, c in enumerate(chances) if c > 0])
+    return first, chances[first:]
+class DiceDistribution(object):
+    def __init__(self, lowest, chances):
+        self.lowest = lowest
+        self.chances = chances # chance of each total from lowest up
+        self.highest = lowest + len(chances) - 1
+        if numpy != None:
+            self.cumulative = numpy.cumsum(chances)
+            self.mean = lowest + float(numpy.dot(numpy.arange(len(chances)), chances))
+        else:
+            self.cumulative = list(itertools.accumulate(chances))
+            self.mean = lowest + sum([i * c for i, c in enumerate(chances)])
+    # lowest total rolled at least this often, e.g. 0.5 for the median
+    def percentile(self, fraction):
+        return self.lowest + min(bisect.bisect_left(self.cumulative, fraction - 1e-9), len(self.chances) - 1)
+    # chance of rolling this total or more, e.g. to hit an armor class
+    def chance_at_least(self, total):
+        i = total - self.lowest
+        if i <= 0:
+            return 1.0
+        if i >= len(self.chances):
+            return 0.0
+        return max(1.0 - float(self.cumulative[i - 1]), 0.0)
+# distribution of the totals of a dice expression, worked out the first time it is needed.  Raises ValueError.
+def dice_distribution(expression):
+    key = "".join(expression.lower().split())
+    if key in dice_cache:
+        dice_cache.move_to_end(key)
+        return dice_cache[key]
+    use_numpy()
+    lowest = 0
+    chances = [1.0]
+    for sign, n, sides, keep, highest in parse_dice(expression):
+        if sides == None:
+            lowest += sign * n
+            continue
+        termlowest, termchances = dice_term_chances(n, sides, keep, highest)
+        if sign < 0:
+            termlowest = -(termlowest + len(termchances) - 1)
+            termchances = termchances[::-1]
+        lowest += termlowest
+        chances = convolve_chances(chances, termchances)
+    dist = dice_cache[key] = DiceDistribution(lowest, chances)
+    if len(dice_cache) > dice_cache_size:
+        dice_cache.popitem(last = False)
+    return dist
+
+# stat for a roll of dice, such as an attack or damage, with the values of other stats added
+class DiceStat(Stat):
+    __slots__ = ('expression', 'statlist_existing', 'target')
+    filetag = "StatBarDice"
+    filefields = Stat.filefields + (('expression', 'str'), ('statlist_existing', 'statlist'), ('target', 'int'))
+    def __init__(self, expression = "1d20", statlist_existing = None, target = 0, **kwargs):
+        Stat.__init__(self, **kwargs)
+        self.expression = expression
+        self.statlist_existing = [] if statlist_existing == None else statlist_existing # modifiers
+        self.target = target # total to roll at least, such as an armor class, or 0 for none
+    def find_sources(self):
+        return list(self.statlist_existing)
+    def drop_source(self, stat):
+        self.statlist_existing = [s for s in self.statlist_existing if s is not stat]
+    def modifier(self):
+        return sum([s.value_for_sum() for s in self.statlist_existing])
+    def distribution(self):
+        return dice_distribution(self.expression)
+    def dice_text(self):
+        try:
+            return dice_summary(self.distribution(), self.modifier(), self.target)
+        except ValueError:
+            return "?"
+# short description of a roll, with a modifier added, and the chance of rolling at least target if it isn't 0
+def dice_summary(dist, modifier, target):
+    text = "avg {:.1f} ({} to {})".format(dist.mean + modifier, dist.lowest + modifier, dist.highest + modifier)
+    if target != 0:
+        text += ", {:.0%} for {}+".format(dist.chance_at_least(target - modifier), target)
+    return text
+
+# row of two buttons for popup text
+class TwoButtonsStat(Stat):
+    __slots__ = ('statname2', '_statdesc2')
+    filetag = "StatBarTwoButtons"
+    filefields = Stat.filefields + (('statname2', 'str'), ('statdesc2', 'desc'))
+    statdesc2 = description_property('_statdesc2')
+    def __init__(self, statname2 = "", statdesc2 = "", **kwargs):
+        Stat.__init__(self, **kwargs)
+        self.statname2 = statname2
+        self.statdesc2 = statdesc2
+
+# row of three buttons for popup text
+class ThreeButtonsStat(TwoButtonsStat):
+    __slots__ = ('statname3', '_statdesc3')
+    filetag = "StatBarThreeButtons"
+    filefields = TwoButtonsStat.filefields + (('statname3', 'str'), ('statdesc3', 'desc'))
+    statdesc3 = description_property('_statdesc3')
+    def __init__(self, statname3 = "", statdesc3 = "", **kwargs):
+        TwoButtonsStat.__init__(self, **kwargs)
+        self.statname3 = statname3
+        self.statdesc3 = statdesc3
+
+# A page of the character sheet: a group of stats and a background color.
+class StatPage(object):
+    __slots__ = ('statlist', 'red_bg', 'green_bg', 'blue_bg', 'view')
+    filetag = "BoxOfStats"
+    filefields = (('red_bg', 'float'), ('green_bg', 'float'), ('blue_bg', 'float'), ('statlist', 'statlist'))
+    def __init__(self, statlist = None, red_bg = 0, green_bg = 0.5, blue_bg = 0.55):
+        self.statlist = [] if statlist == None else statlist
+        self.red_bg = red_bg
+        self.green_bg = green_bg
+        self.blue_bg = blue_bg
+        self.view = None # widget currently displaying this page, if any
+    def swap_stats(self, i, j):
+        self.statlist[i], self.statlist[j] = self.statlist[j], self.statlist[i]
+    def move_stat(self, i, j):
+        # move the stat at position i to position j, shifting the stats in between by one
+        self.statlist.insert(j, self.statlist.pop(i))
+    def write_to_file(self, con):
+        write_record(con, snapshot_record(self))
+
+# classes of stat by the tag used for them in saved files
+stat_classes = {c.filetag: c for c in [Stat, SimpleStat, SumStat, DDAbilityStat, FractionStat, TextStat,
+                                       CounterStat, DiceStat, TwoButtonsStat, ThreeButtonsStat]}
+
+# attribute names for tags that are named differently in saved files
+file_attrs = {'statbtn.size_hint_x': 'btnwidth', 'childstats.statlist': 'statlist_new'}
+# kinds of field that refer to other stats, and can only be read once all stats are read
+refkinds = {'stat', 'statlist'}
+# Raised when a sheet file or journal refers to stats that are not in the sheet.  missing has a message
+# for each reference, naming the stat or page that refers to the missing stat.
+class MissingStatError(ValueError):
+    def __init__(self, missing):
+        ValueError.__init__(self, "\n".join(missing))
+        self.missing = missing
+# the error for references to stats missing from a registry, given as (stat, or where else they are, list of IDs)
+def missing_stat_error(refs, registry):
+    missing = []
+    for obj, ids in refs:
+        where = obj if isinstance(obj, str) else 'stat {} "{}"'.format(obj.statid, obj.statname)
+        missing.extend(["{} refers to missing stat {}".format(where, i) for i in ids if i not in registry.stats])
+    return MissingStatError(missing)
+# IDs of the stats in a reference field as it is in a text file
+def ref_ids(string):
+    return [int(i) for i in string.split(',') if i not in ('', 'None')]
+
+# tags in saved files; values never contain "<" or ">" (see sanitize_text)
+xml_tag_pattern = re.compile("<(/?)([^<>]*)>")
+# read XML-style tags from a string in a single pass, yielding ("start", tag, None) and
+# ("end", tag, value) events.  The value is the text inside the tag if the tag has no tags
+# inside it, and None otherwise.
+def iter_xml_events(string):
+    openpos = [] # for each open tag: tag, where its content starts, whether it contains tags
+    for m in xml_tag_pattern.finditer(string):
+        if m.group(1) == "":
+            if len(openpos) > 0:
+                openpos[-1][2] = True
+            openpos.append([m.group(2), m.end(), False])
+            yield ("start", m.group(2), None)
+        else:
+            if len(openpos) == 0 or openpos[-1][0] != m.group(2):
+                raise ValueError("Unexpected closing tag </{}> at position {}".format(m.group(2), m.start()))
+            tag, contentstart, hastags = openpos.pop()
+            yield ("end", tag, None if hastags else string[contentstart:m.start()])
+    if len(openpos) > 0:
+        raise ValueError("Tag <{}> is never closed".format(openpos[-1][0]))
+# read XML-style tags and values from a string (for loading files).
+# Returns a list of [tag, value] pairs, where value is a string for the innermost tags and
+# a list of [tag, value] pairs otherwise.
+def read_xml(string):
+    tvlist = []
+    parents = [] # lists of tag-value pairs that are still being filled in
+    for event, tag, value in iter_xml_events(string):
+        if event == "start":
+            thistv = [tag, []]
+            tvlist.append(thistv)
+            parents.append(tvlist)
+            tvlist = thistv[1]
+        else:
+            tvlist = parents.pop()
+            if value != None:
+                tvlist[-1][1] = value
+    return tvlist
+# function for converting True and False in file to boolean
+def conv_bool(string):
+    return string == "True"
+# function for converting strings of stat IDs to lists of stats
+def conv_statlist(string, registry):
+    return [registry[int(i)] for i in string.split(',') if i != '']
+# function for converting ID of a single stat
+def conv_stat(string, registry):
+    if string == 'None':
+        return None
+    else:
+        return registry[int(string)]
+# dictionary to convert strings loaded from file to the right class, by kind of field
+conv_fns = {'int': int, 'float': float, 'bool': conv_bool, 'str': str, 'desc': str, 'stat': conv_stat,
+            'statlist': conv_statlist}
+# kind of each field in saved files, by class
+field_kinds = {c: dict(c.filefields) for c in list(stat_classes.values()) + [StatPage]}
+
+# Snapshots of a sheet for saving.  A snapshot is a list of records for the stats in the sheet's registry
+# and a list for the pages, each record being the class and the values of its fields in filefields
+# order.  Taking a snapshot is quick, and it does not change when the sheet does, so it can be
+# written out later or on another thread.  Referenced stats are kept as stats; their IDs do not change.
+# Descriptions are kept as they are, so those still in a file are not read until they are written.
+def snapshot_attr(tag, kind):
+    attr = file_attrs.get(tag, tag)
+    return desc_slot(attr) if kind == 'desc' else attr
+field_getters = {c: attrgetter(*[snapshot_attr(t, k) for t, k in c.filefields]) for c in field_kinds}
+list_fields = {c: [i for i, (t, k) in enumerate(c.filefields) if k == 'statlist'] for c in field_kinds}
+def snapshot_record(obj):
+    values = list(field_getters[type(obj)](obj))
+    for i in list_fields[type(obj)]:
+        values[i] = list(values[i])
+    return (type(obj), values)
+def snapshot_sheet(sheet = None):
+    sheet = sheet_or_active(sheet)
+    return ([snapshot_record(s) for s in sheet.registry], [snapshot_record(p) for p in sheet.pages])
+# How read_snapshot makes each class: the attributes set from plain fields and from references to other
+# stats, as (attribute, index in the record), and the other slots, set to what a new object has (None).
+# Objects are made without calling __init__, which would only set attributes that are then set again.
+def make_snapshot_layout(cls):
+    new = cls()
+    fields = [(snapshot_attr(t, k), i, k) for i, (t, k) in enumerate(cls.filefields)]
+    attrs = {a for a, i, k in fields}
+    slots = [a for c in cls.__mro__ for a in getattr(c, "__slots__", ()) if a not in attrs]
+    return {'plain': [(a, i) for a, i, k in fields if k not in refkinds],
+            'stat': [(a, i) for a, i, k in fields if k == 'stat'],
+            'statlist': [(a, i) for a, i, k in fields if k == 'statlist'],
+            'other': [(a, getattr(new, a)) for a in slots]}
+snapshot_layouts = {c: make_snapshot_layout(c) for c in field_kinds}
+# make a sheet from a snapshot into a StatRegistry, returning the list of pages.  The stats and pages are
+# new objects with the same IDs and fields as those in the snapshot, so one snapshot can make many sheets.
+def read_snapshot(snapshot, registry):
+    statrecords, pagerecords = snapshot
+    registry.clear()
+    # make stats or pages, returning each with its record
+    def make_objects(records):
+        made = []
+        for cls, values in records:
+            layout = snapshot_layouts[cls]
+            obj = cls.__new__(cls)
+            for attr, value in layout['other']:
+                setattr(obj, attr, value)
+            for attr, i in layout['plain']:
+                setattr(obj, attr, values[i])
+            made.append((obj, layout, values))
+        return made
+    stats = make_objects(statrecords)
+    [registry.append(s) for s, layout, values in stats]
+    pages = make_objects(pagerecords)
+    # connect stats to each other and to pages
+    statsbyid = registry.stats
+    for obj, layout, values in stats + pages:
+        for attr, i in layout['statlist']:
+            setattr(obj, attr, [statsbyid[s.statid] for s in values[i]])
+        for attr, i in layout['stat']:
+            setattr(obj, attr, None if values[i] == None else statsbyid[values[i].statid])
+    return [p for p, layout, values in pages]
+# write a stat or page record to a text file, one tag per field
+def write_record(con, record):
+    cls, values = record
+    con.write("<{}>\n".format(cls.filetag))
+    for (tag, kind), value in zip(cls.filefields, values):
+        if kind == 'statlist':
+            value = ",".join([str(s.statid) for s in value])
+        elif kind == 'stat' and value != None:
+            value = value.statid
+        elif kind == 'desc':
+            value = desc_text(value)
+        con.write("<{0}>{1}</{0}>\n".format(tag, value))
+    con.write("</{}>\n\n".format(cls.filetag))
+
+# read a character sheet from the text of a file into a StatRegistry, returning the list of pages.
+# progress, if given, is called now and then with the fraction of the sheet read so far.
+def read_sheet(string, registry, progress = None):
+    filestruct = read_xml(string)
+    if progress != None:
+        progress(0.5) # reading the tags takes about half the time
+    registry.clear() # clear existing stat list
+    loadedstats = [] # stats in the order they are in the file, with their references to other stats
+    for i, s in enumerate(filestruct[0][1]):
+        if progress != None and i % progress_step == 0:
+            progress(0.5 + 0.5 * i / len(filestruct[0][1]))
+        thisstat = stat_classes[s[0]]()
+        kinds = field_kinds[type(thisstat)]
+        # files from before stat IDs were saved refer to stats by position
+        thisstat.statid = len(loadedstats)
+        refs = []
+        for a in s[1]: # loop through attributes
+            if kinds[a[0]] in refkinds:
+                refs.append(a)
+            else:
+                setattr(thisstat, file_attrs.get(a[0], a[0]), conv_fns[kinds[a[0]]](a[1]))
+        registry.append(thisstat)
+        loadedstats.append([thisstat, refs])
+    try:
+        # connect stats to each other
+        for thisstat, refs in loadedstats:
+            kinds = field_kinds[type(thisstat)]
+            for a in refs:
+                setattr(thisstat, file_attrs.get(a[0], a[0]), conv_fns[kinds[a[0]]](a[1], registry))
+        # read MCpages (list of pages)
+        pages = []
+        kinds = field_kinds[StatPage]
+        for b in filestruct[1][1]:
+            thispage = StatPage()
+            for x in b[1]:
+                if kinds[x[0]] in refkinds:
+                    setattr(thispage, x[0], conv_fns[kinds[x[0]]](x[1], registry))
+                else:
+                    setattr(thispage, x[0], conv_fns[kinds[x[0]]](x[1]))
+            pages.append(thispage)
+    except KeyError:
+        raise missing_stat_error([(s, ref_ids(a[1])) for s, refs in loadedstats for a in refs] +
+                                 [("page {}".format(n + 1), ref_ids(x[1])) for n, b in enumerate(filestruct[1][1])
+                                  for x in b[1] if field_kinds[StatPage][x[0]] in refkinds], registry)
+    return pages
+
+# write a character sheet to a text file connection
+def write_sheet(con, sheet = None):
+    write_snapshot(con, snapshot_sheet(sheet))
+# write a snapshot of a sheet to a text file connection
+def write_snapshot(con, snapshot):
+    statrecords, pagerecords = snapshot
+    # write header
+    con.write("#MetaChar version {}\n\n".format(version_str))
+
+    # write each stat to the file
+    con.write("<masterstatlist>\n\n")
+    [write_record(con, r) for r in statrecords]
+    con.write("</masterstatlist>\n\n")
+
+    # write each page to the file
+    con.write("<MCpages>\n\n")
+    [write_record(con, r) for r in pagerecords]
+    con.write("</MCpages>\n\n")
+
+# Compact binary sheet files, with the same content as text files, for large sheets.  Layout:
+#   header: binary_magic, then the format version as a uint16
+#   string table: the length of each string in characters, then all strings as one block of UTF-8.
+#     The first string is the version of MetaChar that wrote the file.
+#   stat references: the IDs of the stats in all statlist fields, one after another
+#   descriptions: where each description starts in the block of descriptions, then where the last
+#     one ends, then the block of UTF-8 text.  Descriptions are read only when needed (see
+#     DescriptionStore).  Version 1 files have no descriptions table.
+#   stats, then pages: for each, the string index of its filetag and its fields in filefields
+#     order, packed as in binary_formats.  Strings are stored as their index in the string table,
+#     descriptions as their index in the descriptions table (the string table in version 1), single
+#     stats as their ID (-1 for none) and statlists as the start and length of their run of stat
+#     references.
+# Every table, and the stats and pages, starts with a uint32 count.  All numbers are little-endian.
+binary_magic = b"MCBS"
+binary_version = 2
+binary_extension = ".mcb"
+binary_formats = {'int': 'q', 'float': 'd', 'bool': '?', 'str': 'I', 'desc': 'I', 'stat': 'i', 'statlist': 'II'}
+binary_structs = {c: struct.Struct("<I" + "".join([binary_formats[k] for t, k in c.filefields]))
+                  for c in field_kinds}
+# for reading records quickly: for each class, the attributes of each kind of field and their positions
+# among the unpacked values
+def make_binary_layout(cls):
+    layout = {'plain': [], 'str': [], 'desc': [], 'stat': [], 'statlist': []}
+    v = 1 # after the filetag
+    for tag, kind in cls.filefields:
+        layout.get(kind, layout['plain']).append((file_attrs.get(tag, tag), v))
+        v += len(binary_formats[kind])
+    return layout
+binary_layouts = {c: make_binary_layout(c) for c in field_kinds}
+count_struct = struct.Struct("<I")
+# pack an array of numbers as little-endian bytes
+def array_bytes(arr):
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return count_struct.pack(len(arr)) + arr.tobytes()
+# read an array of numbers written by array_bytes, returning it and the position after it
+def read_array(typecode, data, pos):
+    arr = array(typecode)
+    n = count_struct.unpack_from(data, pos)[0]
+    pos += count_struct.size
+    arr.frombytes(data[pos:(pos + n * arr.itemsize)])
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr, pos + n * arr.itemsize
+
+# write a character sheet to a binary file connection
+def write_sheet_binary(con, sheet = None):
+    write_snapshot_binary(con, snapshot_sheet(sheet))
+# write a snapshot of a sheet to a binary file connection
+def write_snapshot_binary(con, snapshot):
+    strings = {version_str: 0} # index of each string in the string table
+    descs = dict() # index of each description, as UTF-8, in the descriptions table
+    refs = array('i')
+    def pack_record(record):
+        cls, recvalues = record
+        values = [strings.setdefault(cls.filetag, len(strings))]
+        for (tag, kind), value in zip(cls.filefields, recvalues):
+            if kind == 'str':
+                values.append(strings.setdefault(value, len(strings)))
+            elif kind == 'desc':
+                values.append(descs.setdefault(desc_bytes(value), len(descs)))
+            elif kind == 'stat':
+                values.append(-1 if value == None else value.statid)
+            elif kind == 'statlist':
+                values.extend([len(refs), len(value)])
+                refs.extend([s.statid for s in value])
+            else:
+                values.append(value)
+        return binary_structs[cls].pack(*values)
+    statrecords = [pack_record(r) for r in snapshot[0]]
+    pagerecords = [pack_record(r) for r in snapshot[1]]
+    textblock = "".join(strings).encode("utf-8")
+    descoffsets = array('I', [0])
+    for d in descs:
+        descoffsets.append(descoffsets[-1] + len(d))
+    con.write(binary_magic + struct.pack("<H", binary_version))
+    con.write(array_bytes(array('I', [len(s) for s in strings])))
+    con.write(count_struct.pack(len(textblock)) + textblock)
+    con.write(array_bytes(refs))
+    con.write(array_bytes(descoffsets))
+    con.write(count_struct.pack(descoffsets[-1]))
+    [con.write(d) for d in descs]
+    con.write(count_struct.pack(len(statrecords)) + b"".join(statrecords))
+    con.write(count_struct.pack(len(pagerecords)) + b"".join(pagerecords))
+
+# read a character sheet from the contents of a binary file into a StatRegistry, returning the list of pages.
+# If data is the file memory-mapped, descriptions are left in it; path is the file, for DescriptionStore.
+def read_sheet_binary(data, registry, progress = None, path = None):
+    if data[:len(binary_magic)] != binary_magic:
+        raise ValueError("Not a binary MetaChar sheet")
+    version = struct.unpack_from("<H", data, len(binary_magic))[0]
+    if version > binary_version:
+        raise ValueError("Binary sheet format version {} is too new for this version of MetaChar".format(version))
+    pos = len(binary_magic) + 2
+    lengths, pos = read_array('I', data, pos)
+    blocksize = count_struct.unpack_from(data, pos)[0]
+    pos += count_struct.size
+    text = data[pos:(pos + blocksize)].decode("utf-8")
+    pos += blocksize
+    strings = []
+    start = 0
+    for n in lengths:
+        strings.append(text[start:(start + n)])
+        start += n
+    refs, pos = read_array('i', data, pos)
+    if version >= 2:
+        descoffsets, pos = read_array('I', data, pos)
+        blocksize = count_struct.unpack_from(data, pos)[0]
+        pos += count_struct.size
+        if isinstance(data, mmap.mmap):
+            store = DescriptionStore(path, data, descoffsets, pos)
+            descs = [StoredText(store, i) for i in range(len(descoffsets) - 1)]
+        else:
+            descs = [data[(pos + descoffsets[i]):(pos + descoffsets[i + 1])].decode("utf-8")
+                     for i in range(len(descoffsets) - 1)]
+        pos += blocksize
+    else:
+        descs = strings
+    # read stats or pages, returning them with their references to other stats
+    def read_records(pos, classes):
+        records = []
+        n = count_struct.unpack_from(data, pos)[0]
+        pos += count_struct.size
+        for i in range(n):
+            if progress != None and i % progress_step == 0:
+                progress(i / n)
+            cls = classes[strings[count_struct.unpack_from(data, pos)[0]]]
+            structure = binary_structs[cls]
+            layout = binary_layouts[cls]
+            values = structure.unpack_from(data, pos)
+            pos += structure.size
+            obj = cls()
+            for attr, v in layout['plain']:
+                setattr(obj, attr, values[v])
+            for attr, v in layout['str']:
+                setattr(obj, attr, strings[values[v]])
+            for attr, v in layout['desc']:
+                setattr(obj, attr, descs[values[v]])
+            objrefs = [(attr, refs[values[v]:(values[v] + values[v + 1])]) for attr, v in layout['statlist']] + \
+                      [(attr, values[v]) for attr, v in layout['stat']]
+            records.append((obj, objrefs))
+        return records, pos
+    registry.clear()
+    statrecords, pos = read_records(pos, stat_classes)
+    [registry.append(s) for s, r in statrecords]
+    pagerecords, pos = read_records(pos, {StatPage.filetag: StatPage})
+    # connect stats to each other and to pages
+    statsbyid = registry.stats
+    try:
+        for obj, objrefs in statrecords + pagerecords:
+            for attr, value in objrefs:
+                if isinstance(value, array):
+                    setattr(obj, attr, [statsbyid[i] for i in value])
+                else:
+                    setattr(obj, attr, None if value == -1 else statsbyid[value])
+    except KeyError:
+        records = statrecords + [("page {}".format(n + 1), r) for n, (p, r) in enumerate(pagerecords)]
+        raise missing_stat_error([(obj, list(value) if isinstance(value, array) else [value] if value != -1 else [])
+                                  for obj, objrefs in records for attr, value in objrefs], registry)
+    return [p for p, r in pagerecords]
+
+# how many stats are read between calls to progress when reading a sheet
+progress_step = 500
+# Reading makes many objects and no garbage, so the garbage collector would only go over the new objects
+# again and again, holding up the main thread while it does.  It is turned off while any sheet is being
+# read, counting reads so that reads on several threads at once don't turn it back on too early, and back
+# on when the last one finishes if it was on before the first started.
+gc_pause_state = {'reads': 0, 'wasenabled': False}
+gc_pause_lock = threading.Lock()
+@contextmanager
+def gc_paused():
+    with gc_pause_lock:
+        if gc_pause_state['reads'] == 0:
+            gc_pause_state['wasenabled'] = gc.isenabled()
+            gc.disable()
+        gc_pause_state['reads'] += 1
+    try:
+        yield
+    finally:
+        with gc_pause_lock:
+            gc_pause_state['reads'] -= 1
+            if gc_pause_state['reads'] == 0 and gc_pause_state['wasenabled']:
+                gc.enable()
+# read a sheet file in either format into a new StatRegistry, returning the registry and the list of pages.
+# No open sheet is changed, so this can run on another thread.
+def parse_sheet_file(path, progress = None):
+    registry = StatRegistry()
+    with gc_paused():
+        with open(path, mode = "rb") as con:
+            isbinary = con.read(len(binary_magic)) == binary_magic
+        if isbinary:
+            with open(path, mode = "rb") as con:
+                data = mmap.mmap(con.fileno(), 0, access = mmap.ACCESS_READ)
+            pages = read_sheet_binary(data, registry, progress, path)
+        else:
+            with open(path, mode = "rt") as con:
+                pages = read_sheet(con.read(), registry, progress)
+    return registry, pages
+# read a sheet file in either format into a new Sheet, with its graph built.  The new sheet is not opened,
+# so this can also run on another thread, or on many at once.
+def read_sheet_file(path, progress = None):
+    registry, pages = parse_sheet_file(path, progress)
+    sheet = Sheet(registry, pages)
+    rebuild_stat_graph(sheet)
+    return sheet
+# read a sheet file into a new sheet that takes the place of the active one, returning the list of pages
+def load_sheet_file(path):
+    sheet = read_sheet_file(path)
+    replace_active_sheet(sheet)
+    return sheet.pages
+# write a snapshot of a sheet to a file, in binary format if the file name ends with binary_extension and
+# text otherwise.  The file is written under a temporary name and then renamed, so that it is never left
+# half written.  Both are on disk before this returns, even if the power goes off straight after, as the
+# journal next to the file may be removed next.
+def write_snapshot_file(path, snapshot):
+    temppath = path + ".tmp"
+    if path.endswith(binary_extension):
+        with open(temppath, mode = "wb") as con:
+            write_snapshot_binary(con, snapshot)
+            con.flush()
+            os.fsync(con.fileno())
+    else:
+        with open(temppath, mode = "wt") as con:
+            write_snapshot(con, snapshot)
+            con.flush()
+            os.fsync(con.fileno())
+    if os.name == "nt":
+        # Windows can't replace a file that is memory-mapped
+        [store.unmap() for store in list(description_stores) if os.path.abspath(store.path) == os.path.abspath(path)]
+    os.replace(temppath, path)
+    sync_directory(path)
+# make sure a file renamed into a directory stays renamed after a power cut (not possible on Windows)
+def sync_directory(path):
+    if os.name != "nt":
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+# write a sheet file.  Any journal next to it is for an older version of the sheet and is removed.
+def save_sheet_file(path, sheet = None):
+    write_snapshot_file(path, snapshot_sheet(sheet))
+    for journalpath in [path + journal_extension, path + checkpoint_extension]:
+        if os.path.exists(journalpath):
+            os.remove(journalpath)
+# convert a sheet file between the text and binary formats
+def convert_sheet(inpath, outpath):
+    save_sheet_file(outpath, read_sheet_file(inpath))
+
+# Journal of changes made to a sheet since it was last saved, so that every change is kept without
+# saving the whole sheet.  The journal is a file next to the sheet file, with one JSON record per
+# line.  Each record holds the new state of what changed rather than the difference, so replaying a
+# journal over the sheet it was made from, or over a later save of that sheet, gives the same result.
+#   {"op": "set", "id": statid, "tag": tag, "value": value} - one field of a stat, e.g. a counter
+#   {"op": "stat", "class": filetag, "fields": {tag: value, ...}} - all fields of a new or edited stat
+#   {"op": "delete", "id": statid} - stat deleted
+#   {"op": "page", "index": index, "fields": {tag: value, ...}} - all fields of a new or changed page
+# Field values are as in field_values.
+# While the sheet is being saved from a snapshot (see AutoSaver), the records from before the snapshot are
+# kept in a checkpoint file, which is replayed first and removed once the save is finished.
+journal_extension = ".journal"
+checkpoint_extension = ".journal.checkpoint"
+# functions to call after every change to the active sheet, whether or not it has a journal
+change_listeners = []
+# fields of a stat or page as a dictionary of values that can be written as JSON, with stats as IDs
+def field_value(obj, tag, kind):
+    value = getattr(obj, file_attrs.get(tag, tag))
+    if kind == 'statlist':
+        value = [s.statid for s in value]
+    elif kind == 'stat' and value != None:
+        value = value.statid
+    return value
+def field_values(obj):
+    return {tag: field_value(obj, tag, kind) for tag, kind in obj.filefields}
+# Set fields from field_values.  A record can refer to a stat that a later record deletes, which is gone
+# already if the journal is replayed over a later save of the sheet; it is left out, as it is by the later
+# records.
+def set_field_values(obj, values, registry):
+    kinds = field_kinds[type(obj)]
+    for tag, value in values.items():
+        if kinds[tag] == 'statlist':
+            value = [registry.stats[i] for i in value if i in registry.stats]
+        elif kinds[tag] == 'stat' and value != None:
+            value = registry.stats.get(value)
+        setattr(obj, file_attrs.get(tag, tag), value)
+# apply one journal record to a sheet
+def apply_journal_record(rec, sheet):
+    registry = sheet.registry
+    if rec['op'] == 'set':
+        if rec['id'] in registry.stats:
+            set_field_values(registry[rec['id']], {rec['tag']: rec['value']}, registry)
+    elif rec['op'] == 'stat':
+        stat = registry.stats.get(rec['fields']['statid'])
+        if stat == None:
+            stat = stat_classes[rec['class']]()
+            set_field_values(stat, rec['fields'], registry)
+            registry.append(stat)
+        else:
+            set_field_values(stat, rec['fields'], registry)
+    elif rec['op'] == 'delete':
+        if rec['id'] in registry.stats:
+            registry.remove(registry[rec['id']])
+    elif rec['op'] == 'page':
+        if rec['index'] == len(sheet.pages):
+            sheet.pages.append(StatPage())
+        set_field_values(sheet.pages[rec['index']], rec['fields'], registry)
+
+class ChangeJournal(object):
+    def __init__(self, sheetpath, sheet):
+        self.sheetpath = sheetpath # base file, with the sheet as last saved
+        self.path = sheetpath + journal_extension
+        self.checkpath = sheetpath + checkpoint_extension
+        self.sheet = sheet # the sheet the changes are made to
+        self.pending = [] # records not written yet
+        self.con = None
+        self.checkpoints = 0 # number of checkpoints started
+    def replay(self, repair = True):
+        # apply the journal to the sheet, just loaded from the base file.  With repair, a record left
+        # partly written is removed from the file.
+        [self.replay_file(path, repair) for path in [self.checkpath, self.path] if os.path.exists(path)]
+        rebuild_stat_graph(self.sheet)
+    def replay_file(self, path, repair):
+        goodsize = 0 # bytes of complete records
+        with open(path, mode = "rb") as con:
+            for line in con:
+                try:
+                    rec = json.loads(line) if line.endswith(b"\n") else None
+                except ValueError:
+                    rec = None
+                if rec == None:
+                    break # the program stopped while writing this record
+                apply_journal_record(rec, self.sheet)
+                goodsize += len(line)
+        # drop a partly written record so that new records start on a line of their own
+        if repair and goodsize < os.path.getsize(path):
+            with open(path, mode = "r+b") as con:
+                con.truncate(goodsize)
+    def start_checkpoint(self):
+        # the sheet is about to be saved from a snapshot: move the records so far into the checkpoint file,
+        # returning the checkpoint number to pass to finish_checkpoint once the save is done
+        self.close()
+        if os.path.exists(self.path):
+            if os.path.exists(self.checkpath):
+                with open(self.checkpath, mode = "ab") as checkcon, open(self.path, mode = "rb") as con:
+                    checkcon.write(con.read())
+                    checkcon.flush()
+                    os.fsync(checkcon.fileno())
+                os.remove(self.path)
+            else:
+                os.replace(self.path, self.checkpath)
+                sync_directory(self.checkpath)
+        self.checkpoints += 1
+        return self.checkpoints
+    def finish_checkpoint(self, checkpoint):
+        # the snapshot taken at a checkpoint has been saved; records from before a later checkpoint are kept
+        if checkpoint == self.checkpoints and os.path.exists(self.checkpath):
+            os.remove(self.checkpath)
+    def record(self, rec):
+        # records made during a batch are written together at the end of it
+        self.pending.append(rec)
+        defer_until_batch_end(self.flush)
+    def flush(self):
+        if len(self.pending) == 0:
+            return
+        if self.con == None:
+            self.con = open(self.path, mode = "ab")
+        self.con.write(b"".join([json.dumps(rec).encode("ascii") + b"\n" for rec in self.pending]))
+        self.con.flush()
+        os.fsync(self.con.fileno())
+        self.pending = []
+    def close(self):
+        self.flush()
+        if self.con != None:
+            self.con.close()
+            self.con = None
+
+# start keeping a journal for a sheet loaded from a file, first applying any changes already in it
+def start_journal(sheetpath, sheet = None):
+    sheet = sheet_or_active(sheet)
+    stop_journal(sheet)
+    journal = ChangeJournal(sheetpath, sheet)
+    journal.replay()
+    sheet.journal = journal
+def stop_journal(sheet = None):
+    sheet = sheet_or_active(sheet)
+    if sheet.journal != None:
+        sheet.journal.close()
+        sheet.journal = None
+# save a sheet to a file and keep a journal of later changes next to it
+def save_sheet_and_journal(path, sheet = None):
+    sheet = sheet_or_active(sheet)
+    stop_journal(sheet)
+    save_sheet_file(path, sheet)
+    start_journal(path, sheet)
+# fold the journal into the sheet file, leaving the journal empty
+def compact_journal(sheet = None):
+    sheet = sheet_or_active(sheet)
+    if sheet.journal != None:
+        save_sheet_and_journal(sheet.journal.sheetpath, sheet)
+# record changes to the active sheet in its journal, if it has one, and tell change_listeners
+def record_change(makerecord):
+    journal = sheet_state['active'].journal
+    if journal != None:
+        rec = makerecord(journal)
+        if rec != None:
+            journal.record(rec)
+    [fn() for fn in change_listeners]
+def journal_field(stat, tag):
+    record_change(lambda j: {'op': 'set', 'id': stat.statid, 'tag': tag,
+                             'value': field_value(stat, tag, field_kinds[type(stat)][tag])})
+def journal_stat(stat):
+    record_change(lambda j: {'op': 'stat', 'class': stat.filetag, 'fields': field_values(stat)})
+def journal_new_stats(stats):
+    # stats created within a stat come before it, as in register_stats
+    for s in stats:
+        if isinstance(s, SumStat):
+            journal_new_stats(s.statlist_new)
+        journal_stat(s)
+def journal_delete(stat):
+    record_change(lambda j: {'op': 'delete', 'id': stat.statid})
+def journal_page(page):
+    record_change(lambda j: {'op': 'page', 'index': j.sheet.pages.index(page), 'fields': field_values(page)}
+                            if page in j.sheet.pages else None)
+
+# Saves the sheet a while after it changes, without holding up the program.  save() takes a snapshot
+# of the sheet, which is quick, and a worker thread writes it to the sheet file.  If more snapshots
+# are taken while one is being written, only the latest is written next.  The journal keeps every
+# change safe in the meantime.  Results are collected on the main thread with collect().
+class AutoSaver(object):
+    def __init__(self, on_written = None):
+        self.on_written = on_written # called on the worker thread after each write, e.g. to schedule collect()
+        self.cond = threading.Condition()
+        self.queued = None # (journal, checkpoint, snapshot) waiting to be written
+        self.busy = False # a snapshot is being written
+        self.results = [] # (journal, checkpoint, error) for writes not collected yet
+        self.status = "idle" # "idle", "saving", "saved" or "failed"
+        self.error = None
+        self.changed = False # changes since the last save
+        change_listeners.append(self.note_change)
+        self.thread = threading.Thread(target = self.run, name = "autosave", daemon = True)
+        self.thread.start()
+    def note_change(self):
+        self.changed = True
+    def save(self):
+        # save the active sheet, if it has a file
+        journal = sheet_state['active'].journal
+        if journal == None:
+            return False
+        self.changed = False
+        journal.flush()
+        checkpoint = journal.start_checkpoint()
+        snapshot = snapshot_sheet(journal.sheet)
+        with self.cond:
+            self.queued = (journal, checkpoint, snapshot)
+            self.status = "saving"
+            self.cond.notify_all()
+        return True
+    def run(self):
+        while True:
+            with self.cond:
+                while self.queued == None:
+                    self.cond.wait()
+                journal, checkpoint, snapshot = self.queued
+                self.queued = None
+                self.busy = True
+            try:
+                write_snapshot_file(journal.sheetpath, snapshot)
+                error = None
+            except Exception as e:
+                error = e
+            with self.cond:
+                self.busy = False
+                self.results.append((journal, checkpoint, error))
+                self.cond.notify_all()
+            if self.on_written != None:
+                self.on_written()
+    def wait(self, timeout = None):
+        # wait until everything saved has been written; returns False if this took longer than timeout
+        with self.cond:
+            return self.cond.wait_for(lambda: self.queued == None and not self.busy, timeout)
+    def collect(self):
+        # on the main thread: finish checkpoints for finished writes, and update the status
+        with self.cond:
+            results = self.results
+            self.results = []
+            writing = self.queued != None or self.busy
+        for journal, checkpoint, error in results:
+            if error == None:
+                journal.finish_checkpoint(checkpoint)
+            else:
+                self.error = error
+        if len(results) > 0 and not writing:
+            self.status = "failed" if results[-1][2] != None else "saved"
+        return self.status
+    def flush(self, timeout = None):
+        # save any changes now and wait for it, e.g. when the program is closing
+        if self.changed:
+            self.save()
+        self.wait(timeout)
+        return self.collect()
+
+# Read a sheet file into a new Sheet on a worker thread, so that the program keeps responding while a
+# large sheet is read, and other sheets can be shown and edited meanwhile.  Several can run at once.  If
+# sheetpath is given, the changes in the journal next to it are applied, and the sheet keeps a journal
+# there from then on; it is the file the sheet is saved to, if path is a copy of it.  progress is the
+# fraction read so far, and done is set when reading has finished or failed; on_done, if given, is then
+# called from the worker thread.  Get the sheet with result(), and open it on the main thread.
+class SheetLoader(object):
+    def __init__(self, path, on_done = None, sheetpath = None):
+        self.path = path
+        self.sheetpath = sheetpath
+        self.on_done = on_done
+        self.progress = 0.0
+        self.done = threading.Event()
+        self.sheet = None
+        self.error = None
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+    def run(self):
+        try:
+            self.sheet = read_sheet_file(self.path, self.set_progress)
+            if self.sheetpath != None:
+                start_journal(self.sheetpath, self.sheet)
+        except Exception as e:
+            self.error = e
+        self.progress = 1.0
+        self.done.set()
+        if self.on_done != None:
+            self.on_done()
+    def set_progress(self, fraction):
+        self.progress = fraction
+    def wait(self, timeout = None):
+        return self.done.wait(timeout)
+    def result(self):
+        # returns the sheet, or raises the error from reading the file
+        self.wait()
+        if self.error != None:
+            raise self.error
+        return self.sheet
+
+# Templates for new sheets, by name.  A template is made by a function that makes its stats in the active
+# sheet (with register_stats) and returns its pages, or read from a sheet file.  Either way it is made only once, the
+# first time it is used, and kept as a snapshot; each new sheet is made from the snapshot by read_snapshot,
+# which is quicker than making the template again.
+templates = OrderedDict() # name to function or sheet file path
+template_snapshots = dict() # name to snapshot, once the template has been made
+def add_template(name, source):
+    templates[name] = source
+    template_snapshots.pop(name, None)
+def template_snapshot(name):
+    if name not in template_snapshots:
+        source = templates[name]
+        if callable(source):
+            # make the template in a sheet of its own, active only while it is made
+            sheet = Sheet()
+            active = sheet_state['active']
+            sheet_state['active'] = sheet
+            try:
+                sheet.pages = source()
+            finally:
+                sheet_state['active'] = active
+            template_snapshots[name] = snapshot_sheet(sheet)
+        else:
+            template_snapshots[name] = snapshot_sheet(Sheet(*parse_sheet_file(source)))
+    return template_snapshots[name]
+# make a new sheet from a template, not opened yet
+def new_sheet_from_template(name):
+    sheet = Sheet(title = name)
+    sheet.pages = read_snapshot(template_snapshot(name), sheet.registry)
+    rebuild_stat_graph(sheet)
+    return sheet
+# save a sheet as a template in a directory of templates, in the binary format, and add it to templates.
+# The name is also the file name, so only letters, digits, spaces, "-" and "_" are kept.  Returns the name.
+def save_template(name, directory, sheet = None):
+    name = "".join([c for c in name if c.isalnum() or c in " -_"]).strip()
+    if name == "":
+        raise ValueError("A template needs a name made of letters or digits")
+    os.makedirs(directory, exist_ok = True)
+    path = os.path.join(directory, name + binary_extension)
+    write_snapshot_file(path, snapshot_sheet(sheet))
+    add_template(name, path)
+    return name
+# add the templates saved in a directory by save_template, named after their files
+def add_template_dir(directory):
+    if os.path.isdir(directory):
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith(binary_extension):
+                add_template(filename[:-len(binary_extension)], os.path.join(directory, filename))
+
+# Timing of the work the program does, to find out what makes a sheet slow.  Functions and methods to
+# time are registered with add_profile_point.  While profiling is on, each is replaced by a wrapper that
+# counts calls and adds up their time; when it is off, the originals are put back, so it costs nothing.
+# A call made within a call to the same point (e.g. a sum of sums) counts as part of the outer call.
+# Other modules must call the functions timed here through the module (statmodel.evaluate_scenarios), as
+# a name imported from it keeps the untimed function.
+profile_points = [] # (class or module the function is in, its name, label)
+profile_stats = dict() # label to [calls, total seconds, longest call in seconds]
+profile_state = {'on': False, 'originals': []}
+profile_lock = threading.Lock() # functions may be timed on worker threads too
+profile_active = threading.local() # labels being timed on each thread
+def add_profile_point(owner, name, label = None):
+    if label == None:
+        label = "{}.{}".format(owner.__name__, name)
+    profile_points.append((owner, name, label))
+def profiled(fn, label):
+    def wrapper(*args, **kwargs):
+        active = profile_active.__dict__.setdefault('labels', set())
+        # widgets can hold on to a wrapper after profiling is turned off
+        if not profile_state['on'] or label in active:
+            return fn(*args, **kwargs)
+        active.add(label)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            active.discard(label)
+            with profile_lock:
+                stats = profile_stats.setdefault(label, [0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = max(stats[2], elapsed)
+    wrapper.__name__ = fn.__name__
+    return wrapper
+def start_profiling():
+    if profile_state['on']:
+        return
+    for owner, name, label in profile_points:
+        # None if the class inherits the method, in which case the wrapper is removed again when done
+        profile_state['originals'].append((owner, name, vars(owner).get(name)))
+        setattr(owner, name, profiled(getattr(owner, name), label))
+    profile_state['on'] = True
+def stop_profiling():
+    for owner, name, original in reversed(profile_state['originals']):
+        if original == None:
+            delattr(owner, name)
+        else:
+            setattr(owner, name, original)
+    profile_state['originals'] = []
+    profile_state['on'] = False
+def reset_profile():
+    with profile_lock:
+        profile_stats.clear()
+# timings so far as text, most total time first
+def profile_report(maxlines = None):
+    with profile_lock:
+        rows = sorted([(label, list(stats)) for label, stats in profile_stats.items()], key = lambda r: -r[1][1])
+    lines = ["{:<36} {:>8} {:>10} {:>9} {:>9}".format("", "calls", "total ms", "mean ms", "max ms")]
+    for label, (calls, total, longest) in rows[:maxlines]:
+        lines.append("{:<36} {:>8} {:>10.1f} {:>9.3f} {:>9.1f}".format(label[:36], calls, total * 1000,
+                                                                     total * 1000 / calls, longest * 1000))
+    return "\n".join(lines)
+# save the timings so far to a JSON file
+def dump_profile(path):
+    with profile_lock:
+        points = {label: {'calls': calls, 'total': total, 'max': longest}
+                  for label, (calls, total, longest) in profile_stats.items()}
+    with open(path, mode = "wt") as con:
+        json.dump({'version': version_str, 'time': time.strftime("%Y-%m-%dT%H:%M:%S"), 'points': points},
+                  con, indent = 1)
+
+this_module = sys.modules[__name__]
+[add_profile_point(this_module, name) for name in ["refresh_dirty_stats", "rebuild_stat_graph",
+                                                   "parse_sheet_file", "read_sheet_file", "snapshot_sheet",
+                                                   "write_snapshot_file", "new_sheet_from_template",
+                                                   "calculate_all_stats", "evaluate_scenarios",
+                                                   "dice_distribution"]]
+[add_profile_point(c, "value_for_sum") for c in stat_classes.values() if "value_for_sum" in vars(c)]
+add_profile_point(ChangeJournal, "replay")
+add_profile_point(ChangeJournal, "flush")
+
+# example stats, shown when the program starts
+def make_example_page(sheet = None):
+    statlist = [Stat(statname = "Examples", statdesc = "Here are some examples of what you can do.", btnwidth = 1),
+                DDAbilityStat(statname = "STR", statdesc = "Strength",
+                              statlist_new = [SimpleStat(statname = "Level 1 base STR",
+                                                         statdesc = "Number chosen at level 1", statval = 12),
+                                              SimpleStat(statname = "Dwarven STR bonus",
+                                                         statdesc = "Bonus for being a mountain dwarf", statval = 2,
+                                                         showplus = True)], calcavail = True),
+                SimpleStat(statname = "Prof. bonus", statdesc = "Proficiency bonus", statval = 2,
+                           showplus = True, calcavail = True)]
+    statlist.append(SumStat(statname = "Athletics", statdesc = "stuff", showplus = True,
+                            statlist_existing = [statlist[1], statlist[2]],
+                            statlist_new = []))
+    statlist.append(CounterStat(statname = "Hit Points",
+        statdesc = "You don't want to lose all of these.", defaultval = 8, calcavail = True))
+    statlist.append(TextStat(statname = "Greataxe",
+        statdesc = "Pretty sweet weapon.  Slashing, heavy, two-handed.",
+        stattext = "+3 to attack, 1d12+1 damage"))
+    statlist.append(DiceStat(statname = "Greataxe attack",
+        statdesc = "Roll to hit with the greataxe, adding STR and proficiency bonus, against armor class 13.",
+        expression = "1d20", statlist_existing = [statlist[1], statlist[2]], target = 13))
+    statlist.append(DiceStat(statname = "Greataxe damage", statdesc = "Damage from the greataxe, adding STR.",
+        expression = "1d12", statlist_existing = [statlist[1]]))
+    statlist.append(ThreeButtonsStat(statname = "A spell",
+        statdesc = "The description of that spell.\n\nLine breaks okay.",
+        statname2 = "Another spell", statdesc2 = "The description of that other spell.",
+        statname3 = "Spell three", statdesc3 = "The description of the third spell."))
+    register_stats(statlist, sheet) # put them in the sheet too
+    return StatPage(statlist = statlist)
+
+# template for a D&D 5e character
+def make_5e_template():
+    # Page with basic biographical information
+    plyr_name = TextStat(statname = "Name", statdesc = "Name of the character",
+                         stattext = "Sample Exampleson")
+    plyr_race = TextStat(statname = "Race", statdesc = "Human, elf, dwarf, halfling, etc., including subraces.",
+                         stattext = "Human")
+    plyr_level = SimpleStat(statname = "Level", statdesc = "Overall level for your character", statval = 1)
+    plyr_class = TextStat(statname = "Class", statdesc = "Like, are you a figher or a wizard or a bard or what?",
+                          stattext = "Toilet mage")
+    plyr_spec = TextStat(statname = "Specialization", statdesc = "Most classes have two or more options to choose from at an early level.", stattext = "")
+    plyr_bkgd = TextStat(statname = "Background", statdesc = "Who you were before you were an adventurer, or what you do now when you aren't adventuring.  Comes with a couple skill proficiencies and other perks.", stattext = "Sailor")
+    plyr_lng = TextStat(statname = "Languages known", statdesc = "Various races have their own languages that they speak.  Your character might know some of them depending on race, class, and background.", stattext = "Common")
+    plyr_bio = Stat(statname = "Biography", statdesc = "Fill in any extra info here.  You may also wish to add boxes for alignment, ideals, bonds, and flaws.")
+    plyr_bio.btnwidth = 1
+    bio_page = StatPage(statlist = [plyr_name, plyr_race, plyr_level, plyr_class, plyr_spec, plyr_bkgd, plyr_lng, plyr_bio])
+    # color scheme from the "viridis" R package
+    bio_page.red_bg = 0.992
+    bio_page.green_bg = 0.906
+    bio_page.blue_bg = 0.145
+    register_stats(bio_page.statlist)
+
+    # Page with ability scores and proficiency bonus
+    ability_header = Stat(statname = "Ability Scores and Proficiency Bonus",
+                          statdesc = "These scores are rarely used by themselves, but are used for calculating other roll modifiers.  Ability scores indicate things like how smart or strong your character is overall, and your proficiency bonus indicates just how good they are at their particular skills.\n\nAfter an ability score, an automatically-calculated roll modifier is listed in parentheses.  Ability scores are the sum of a number you choose at character creation, any racial modifiers, and any increases gained at certain levels.\n\nThe proficiency bonus is dependent only on character level.")
+    ability_header.btnwidth = 1
+    ability_desc = "{0}.  To make a {1} check, roll 1d20 and add the number in parentheses."
+    base_stat_desc = "Number you selected at level 1."
+    hum_mod_desc = "Human racial modifier to {}."
+    STR = DDAbilityStat(statname = "STR", 
+                        statdesc = ability_desc.format("Strength", "strength"),
+                        statlist_existing = [],                     
+                        statlist_new = [SimpleStat(statname = "Level 1 base STR", 
+                                                   statdesc = base_stat_desc, statval = 10),
+                                        SimpleStat(statname = "Human",
+                                                   statdesc = hum_mod_desc.format("strength"), statval = 1,
+                                                   showplus = True)])
+    DEX = DDAbilityStat(statname = "DEX", 
+                        statdesc = ability_desc.format("Dexterity", "dexterity"),
+                        statlist_existing = [],                     
+                        statlist_new = [SimpleStat(statname = "Level 1 base DEX", 
+                                                   statdesc = base_stat_desc, statval = 10),
+                                        SimpleStat(statname = "Human",
+                                                   statdesc = hum_mod_desc.format("dexterity"), statval = 1,
+                                                   showplus = True)])
+    CON = DDAbilityStat(statname = "CON", 
+                        statdesc = ability_desc.format("Constitution", "constitution"),
+                        statlist_existing = [],                     
+                        statlist_new = [SimpleStat(statname = "Level 1 base CON", 
+                                                   statdesc = base_stat_desc, statval = 10),
+                                        SimpleStat(statname = "Human",
+                                                   statdesc = hum_mod_desc.format("constitution"), statval = 1,
+                                                   showplus = True)])
+    INT = DDAbilityStat(statname = "INT", 
+                        statdesc = ability_desc.format("Intelligence", "intelligence"),
+                        statlist_existing = [],                     
+                        statlist_new = [SimpleStat(statname = "Level 1 base INT", 
+                                                   statdesc = base_stat_desc, statval = 10),
+                                        SimpleStat(statname = "Human",
+                                                   statdesc = hum_mod_desc.format("intelligence"), statval = 1,
+                                                   showplus = True)])
+    WIS = DDAbilityStat(statname = "WIS", 
+                        statdesc = ability_desc.format("Wisdom", "wisdom"),
+                        statlist_existing = [],                     
+                        statlist_new = [SimpleStat(statname = "Level 1 base WIS", 
+                                                   statdesc = base_stat_desc, statval = 10),
+                                        SimpleStat(statname = "Human",
+                                                   statdesc = hum_mod_desc.format("wisdom"), statval = 1,
+                                                   showplus = True)])
+    CHA = DDAbilityStat(statname = "CHA", 
+                        statdesc = ability_desc.format("Charisma", "charisma"),
+                        statlist_existing = [],                     
+                        statlist_new = [SimpleStat(statname = "Level 1 base CHA", 
+                                                   statdesc = base_stat_desc, statval = 10),
+                                        SimpleStat(statname = "Human",
+                                                   statdesc = hum_mod_desc.format("charisma"), statval = 1,
+                                                   showplus = True)])
+    prof = SimpleStat(statname = "Proficiency bonus",
+                      statdesc = "Added to d20 rolls where you are proficient in a skill, weapon, or save.  Increases at certain levels.", statval = 2, showplus = True, calcavail = True)
+    ability_page = StatPage(statlist = [ability_header, STR, DEX, CON, INT, WIS, CHA, prof])
+    ability_page.red_bg = 0.624
+    ability_page.green_bg = 0.855
+    ability_page.blue_bg = 0.227
+    register_stats(ability_page.statlist)
+    
+    # Page with saving throws
+    saving_throw_header = Stat(statname = "Saving throws",
+                               statdesc = "These are rolls you make to keep something bad from happening to you.  The DM will tell you if you need to make a saving throw.  Roll 1d20 and add the indicated modifier.\n\nWhen you make your character sheet, edit the appropriate saving throws, adding your proficiency bonus using \"Add existing stat\".")
+    saving_throw_header.btnwidth = 1
+    str_save = SumStat(statname = "STR save", statdesc = "Roll modifier for strength saving throw.",
+                       statlist_existing = [STR], statlist_new = [], showplus = True)
+    dex_save = SumStat(statname = "DEX save", statdesc = "Roll modifier for dexterity saving throw.",
+                       statlist_existing = [DEX], statlist_new = [], showplus = True)
+    con_save = SumStat(statname = "CON save", statdesc = "Roll modifier for constitution saving throw.",
+                       statlist_existing = [CON], statlist_new = [], showplus = True)
+    int_save = SumStat(statname = "INT save", statdesc = "Roll modifier for intelligence saving throw.",
+                       statlist_existing = [INT], statlist_new = [], showplus = True)
+    wis_save = SumStat(statname = "WIS save", statdesc = "Roll modifier for wisdom saving throw.",
+                       statlist_existing = [WIS], statlist_new = [], showplus = True)
+    cha_save = SumStat(statname = "CHA save", statdesc = "Roll modifier for charisma saving throw.",
+                       statlist_existing = [CHA], statlist_new = [], showplus = True)
+    death_success = CounterStat(statname = "Death save successes", 
+                                statdesc = "If you are dying, roll a d20 at the beginning of your turn.  10 or higher counts as a success.  If you get three successes, you are no longer dying.",
+                                defaultval = 0)
+    death_fail = CounterStat(statname = "Death save failures",
+                             statdesc = "If you are dying, roll a d20 at the beginning of your turn.  9 or lower counts as a failure (1 as two failures).  If you get three failures, you are dead.",
+                             defaultval = 0)
+    saving_throw_page = StatPage(statlist = [saving_throw_header, str_save, dex_save, con_save, int_save,
+                                             wis_save, cha_save, death_success, death_fail])
+    saving_throw_page.red_bg = 0.29
+    saving_throw_page.green_bg = 0.757
+    saving_throw_page.blue_bg = 0.427
+    register_stats(saving_throw_page.statlist)
+    
+    # page with hit points, armor class, and attack modifiers
+    hit_point_max = SumStat(statname = "Max. hit points",
+                            statdesc = "This value increases with each level according to class.  Add your CON bonus with \"Add existing stat\"; HP increases retroactively with CON increase.",
+                            statlist_existing = [CON], 
+                            statlist_new = [SimpleStat(statname = "Level 1 base hp",
+                                                       statdesc = "Base hit points at level 1 for wizard.",
+                                                       statval = 6)])
+    hit_point_current = CounterStat(statname = "Current hit points",
+                                    statdesc = "If this gets down to zero, you are dying.",
+                                    defaultval = 6)
+    hit_dice = TextStat(statname = "Hit dice",
+                        statdesc = "These are the dice you use to regain hit points when you rest.  Your class determines this.",
+                        stattext = "1d6")
+    armor_class = SumStat(statname = "Armor class",
+                          statdesc = "The higher it is, the harder you are to hit.  Check the type of armor you are wearing to see if your dexterity bonus should be added.",
+                          statlist_existing = [DEX], 
+                          statlist_new = [SimpleStat(statname = "Padded", statdesc = "Armor class of padded armor.",
+                                                     statval = 11)])
+    initiative = SumStat(statname = "Initiative",
+                         statdesc = "Determines combat order.  Generally just your dexterity modifier.\n\nRoll 1d20 and add the modifier.",
+                         statlist_existing = [DEX], statlist_new = [], showplus = True)
+    melee_atk = SumStat(statname = "Melee attack mod.",
+                        statdesc = "When attacking with a melee weapon, add this modifier to a 1d20 roll to determine if you hit.  Also use this modifier for attacks with a finesse weapon if your strength is better than your dexterity.  Remove the proficiency bonus if using a weapon in which you are not proficient.",
+                        statlist_existing = [STR, prof], statlist_new = [], showplus = True)
+    melee_dmg = SumStat(statname = "Melee damage mod.",
+                        statdesc = "When attacking with a melee weapon, add this modifier to the damage dice for the weapon.  Also use this modifier for damage from a finesse weapon if your strength is better than your dexterity.",
+                        statlist_existing = [STR], statlist_new = [], showplus = True)
+    ranged_atk = SumStat(statname = "Ranged attack mod.",
+                        statdesc = "When attacking with a ranged weapon, add this modifier to a 1d20 roll to determine if you hit.  Also use this modifier for attacks with a finesse weapon if your dexterity is better than your strength.  Remove the proficiency bonus if using a weapon in which you are not proficient.",
+                        statlist_existing = [DEX, prof], statlist_new = [], showplus = True)
+    ranged_dmg = SumStat(statname = "Ranged damage mod.",
+                        statdesc = "When attacking with a melee weapon, add this modifier to the damage dice for the weapon.  Also use this modifier for damage from a finesse weapon if your dexterity is better than your strength.",
+                        statlist_existing = [DEX], statlist_new = [], showplus = True)
+    combat_page = StatPage(statlist = [hit_point_max, hit_point_current, hit_dice, armor_class, initiative,
+                                       melee_atk, melee_dmg, ranged_atk, ranged_dmg])
+    combat_page.red_bg = 0.122
+    combat_page.green_bg = 0.631
+    combat_page.blue_bg = 0.529
+    register_stats(combat_page.statlist)
+    
+    # skills page 1
+    skill_desc = "Roll 1d20 and add this modifier to make a{} {} check."
+    skillpg_desc = "Skills pertain to various activities you might attempt out of combat.  Roll 1d20 and add the appropriate modifier to make a skill check.\n\nWhen making your character sheet, be sure to add your proficiency bonus to any skills in which you are proficient, using \"Add existing stat\".  Your class and background determine skill proficiencies."
+    skills_header1 = Stat(statname = "Skills page 1", statdesc = skillpg_desc)
+    skills_header1.btnwidth = 1
+    acrobatics = SumStat(statname = "Acrobatics", statdesc = skill_desc.format("n", "acrobatics"),
+                         statlist_existing = [DEX], statlist_new = [], showplus = True)
+    animal_handling = SumStat(statname = "Animal handling", statdesc = skill_desc.format("n", "animal handling"),
+                         statlist_existing = [WIS], statlist_new = [], showplus = True)
+    arcana = SumStat(statname = "Arcana", statdesc = skill_desc.format("n", "arcana"),
+                         statlist_existing = [INT], statlist_new = [], showplus = True)
+    athletics = SumStat(statname = "Athletics", statdesc = skill_desc.format("n", "athletics"),
+                         statlist_existing = [STR], statlist_new = [], showplus = True)
+    deception = SumStat(statname = "Deception", statdesc = skill_desc.format("", "deception"),
+                         statlist_existing = [CHA], statlist_new = [], showplus = True)
+    history = SumStat(statname = "History", statdesc = skill_desc.format("", "history"),
+                         statlist_existing = [INT], statlist_new = [], showplus = True)
+    insight = SumStat(statname = "Insight", statdesc = skill_desc.format("n", "insight"),
+                         statlist_existing = [WIS], statlist_new = [], showplus = True)
+    intimidation = SumStat(statname = "Intimidation", statdesc = skill_desc.format("n", "intimidation"),
+                         statlist_existing = [CHA], statlist_new = [], showplus = True)
+    investigation = SumStat(statname = "Investigation", statdesc = skill_desc.format("n", "investigation"),
+                         statlist_existing = [INT], statlist_new = [], showplus = True)
+    skills_page1 = StatPage(statlist = [skills_header1, acrobatics, animal_handling, arcana, athletics,
+                                        deception, history, insight, intimidation, investigation])
+    skills_page1.red_bg = 0.153
+    skills_page1.green_bg = 0.498
+    skills_page1.blue_bg = 0.557
+    register_stats(skills_page1.statlist)
+    
+    # skills page 2
+    skills_header2 = Stat(statname = "Skills page 2", statdesc = skillpg_desc)
+    skills_header2.btnwidth = 1
+    medicine = SumStat(statname = "Medicine", statdesc = skill_desc.format("", "medicine"),
+                         statlist_existing = [WIS], statlist_new = [], showplus = True)
+    nature = SumStat(statname = "Nature", statdesc = skill_desc.format("", "nature"),
+                         statlist_existing = [INT], statlist_new = [], showplus = True)
+    perception = SumStat(statname = "Perception", statdesc = skill_desc.format("", "perception"),
+                         statlist_existing = [WIS], statlist_new = [], showplus = True)
+    performance = SumStat(statname = "Performance", statdesc = skill_desc.format("", "performance"),
+                         statlist_existing = [CHA], statlist_new = [], showplus = True)
+    persuasion = SumStat(statname = "Persuasion", statdesc = skill_desc.format("", "persuasion"),
+                         statlist_existing = [CHA], statlist_new = [], showplus = True)
+    religion = SumStat(statname = "Religion", statdesc = skill_desc.format("", "religion"),
+                         statlist_existing = [INT], statlist_new = [], showplus = True)
+    sleight_of_hand = SumStat(statname = "Sleight of Hand", statdesc = skill_desc.format("", "sleight of hand"),
+                         statlist_existing = [DEX], statlist_new = [], showplus = True)
+    stealth = SumStat(statname = "Stealth", statdesc = skill_desc.format("", "stealth"),
+                         statlist_existing = [DEX], statlist_new = [], showplus = True)
+    survival = SumStat(statname = "Survival", statdesc = skill_desc.format("", "survival"),
+                         statlist_existing = [WIS], statlist_new = [], showplus = True)
+    skills_page2 = StatPage(statlist = [skills_header2, medicine, nature, perception, performance,
+                                        persuasion, religion, sleight_of_hand, stealth, survival])
+    skills_page2.red_bg = 0.212
+    skills_page2.green_bg = 0.361
+    skills_page2.blue_bg = 0.553
+    register_stats(skills_page2.statlist)
+    
+    # spells page 1
+    spells_header = Stat(statname = "Spells",
+                         statdesc = "This page contains stats pertaining to spells, as well as examples of how you can store spell descriptions in rows of buttons.")
+    spells_header.btnwidth = 1
+    spell_atk = SumStat(statname = "Spell attack mod.",
+                        statdesc = "When using a spell where you roll to hit, add this modifier to a 1d20 roll to determine if you hit.  This will use either your INT, WIS, or CHA modifier depending on class.",
+                        statlist_existing = [CHA, prof], statlist_new = [], showplus = True)
+    spell_save = SumStat(statname = "Spell save DC",
+                         statdesc = "If a target of one of your spells must make a saving throw to avoid negative effects from the spell, this is the number they are trying to beat.  It is calculated with INT, WIS, or CHA depending on your class.",
+                         statlist_existing = [CHA, prof], 
+                         statlist_new = [SimpleStat(statname = "Base spell save DC", 
+                                                    statdesc = "This is always 8.", statval = 8)])
+    spell_slots1 = CounterStat(statname = "Level 1 spell slots",
+                               statdesc = "This is how many level 1 spells you can cast before you need a rest.",
+                               defaultval = 3)
+    spell_slots2 = CounterStat(statname = "Level 2 spell slots",
+                               statdesc = "This is how many level 2 spells you can cast before you need a rest.",
+                               defaultval = 1)
+    example_cantrip = TextStat(statname = "Plunger ray", 
+                               statdesc = "Here you would put a more detailed description of this spell.",
+                               stattext = "2d6 damage")
+    example_spells = ThreeButtonsStat(statname = "Some spell", statdesc = "Spell description",
+                                      statname2 = "Another spell", statdesc2 = "Spell description",
+                                      statname3 = "A third spell", statdesc3 = "Spell description")
+    spell_page = StatPage(statlist = [spells_header, spell_atk, spell_save, spell_slots1, spell_slots2,
+                                      example_cantrip, example_spells])
+    spell_page.red_bg = 0.275
+    spell_page.green_bg = 0.2
+    spell_page.blue_bg = 0.494
+    register_stats(spell_page.statlist)
+    
+    # additional traits
+    additional_header = Stat(statname = "Additional traits",
+                             statdesc = "Anything else not already covered.")
+    additional_header.btnwidth = 1
+    example_stuff = TextStat(statname = "Being awesome", statdesc = "blah blah blah",
+                             stattext = "General awesomeness")
+    additional_page = StatPage(statlist = [additional_header, example_stuff])
+    additional_page.red_bg = 0.267
+    additional_page.green_bg = 0.004
+    additional_page.blue_bg = 0.329
+    register_stats(additional_page.statlist)
+    
+    return [bio_page, ability_page, saving_throw_page, combat_page, skills_page1, skills_page2, spell_page, 
+            additional_page]
+
+# templates that come with the program
+add_template("D&D 5e", make_5e_template)
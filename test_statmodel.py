@@ -0,0 +1,301 @@
+# Tests of the stat model, without a window: saving and reading sheets in both formats, the journal of
+# changes, calculating whole sheets with NumPy, what-if scenarios and dice.  Run with python -m pytest.
+
+import itertools
+import os
+import random
+from collections import Counter
+
+import pytest
+
+import statmodel
+from statmodel import (Sheet, Stat, SimpleStat, SumStat, DDAbilityStat, FractionStat, TextStat, CounterStat,
+                       DiceStat, StatPage, ChangeJournal, replace_active_sheet, register_stats, remove_stat,
+                       link_stat, rebuild_stat_graph, make_5e_template, read_sheet_file, save_sheet_file,
+                       convert_sheet, binary_extension, save_sheet_and_journal, stop_journal, journal_field,
+                       journal_stat, journal_new_stats, journal_delete, journal_page, calculate_all_stats,
+                       evaluate_scenarios, parse_dice, dice_distribution)
+
+# The D&D 5e template, with a page of stats that are harder to save: text that needs escaping, a
+# counter away from its default, a fraction that divides by zero and a roll of dice.
+def make_sheet():
+    sheet = Sheet()
+    replace_active_sheet(sheet) # the template makes its stats in the active sheet
+    sheet.pages = make_5e_template()
+    strength = [s for s in sheet.registry if s.statname == "STR"][0]
+    extra = [TextStat(statname = "Ünïcode & \"quotes\"", statdesc = "two\nlines", stattext = "tab\there"),
+             CounterStat(statname = "Hit points", defaultval = 30, calcavail = True),
+             FractionStat(statname = "Nothing", stat_to_div = strength, divisor = 0),
+             DiceStat(statname = "Attack", expression = "4d6kh3+2", statlist_existing = [strength], target = 12),
+             SumStat(statname = "Total", statlist_existing = [strength], showplus = True,
+                     statlist_new = [SimpleStat(statname = "Inside", statval = -3)]),
+             Stat(statname = "Big button", btnwidth = 1)]
+    extra[1].currentval = 17
+    register_stats(extra)
+    sheet.pages.append(StatPage(statlist = extra, red_bg = 0.25, green_bg = 0.0, blue_bg = 1.0))
+    for s in sheet.registry:
+        s.btnwidth = float(s.btnwidth) # as read from a file, so that sheets are saved the same again
+    rebuild_stat_graph(sheet)
+    return sheet
+def shown_values(sheet):
+    values = []
+    for s in sheet.registry:
+        try:
+            values.append((s.statid, s.value_text() if hasattr(s, "value_text") else None))
+        except ArithmeticError:
+            values.append((s.statid, "?"))
+    return values
+def file_text(path):
+    with open(path, mode = "rb") as con:
+        return con.read()
+
+# Binary sheet format
+
+def test_text_binary_text_round_trip(tmp_path):
+    sheet = make_sheet()
+    textpath = str(tmp_path / "sheet.txt")
+    save_sheet_file(textpath, sheet)
+    binarypath = str(tmp_path / ("sheet" + binary_extension))
+    convert_sheet(textpath, binarypath)
+    againpath = str(tmp_path / "again.txt")
+    convert_sheet(binarypath, againpath)
+    assert file_text(againpath) == file_text(textpath)
+    assert shown_values(read_sheet_file(binarypath)) == shown_values(sheet)
+def test_binary_keeps_ids_and_references(tmp_path):
+    sheet = make_sheet()
+    path = str(tmp_path / ("sheet" + binary_extension))
+    save_sheet_file(path, sheet)
+    loaded = read_sheet_file(path)
+    def references(sheet):
+        return [(s.statid, type(s), [r.statid for r in s.find_sources()]) for s in sheet.registry] + \
+               [[s.statid for s in p.statlist] for p in sheet.pages]
+    assert references(loaded) == references(sheet)
+    assert [s.statdesc for s in loaded.registry] == [s.statdesc for s in sheet.registry]
+
+# Journal of changes
+
+# make a change of each kind to a sheet that is being journaled
+def change_sheet(sheet):
+    counter = [s for s in sheet.registry if isinstance(s, CounterStat)][0]
+    counter.currentval -= 3
+    journal_field(counter, 'currentval')
+    page = sheet.pages[-1]
+    added = SimpleStat(statname = "Added", statval = 4, calcavail = True)
+    register_stats([added])
+    link_stat(added)
+    journal_new_stats([added])
+    page.statlist.append(added)
+    journal_page(page)
+    total = [s for s in page.statlist if s.statname == "Total"][0]
+    total.statlist_existing.append(added)
+    link_stat(total)
+    journal_stat(total)
+    deleted = [s for s in page.statlist if s.statname == "Attack"][0]
+    page.statlist.remove(deleted)
+    [journal_stat(s) for s in remove_stat(deleted)]
+    journal_delete(deleted)
+    journal_page(page)
+    sheet.pages.append(StatPage(red_bg = 1.0))
+    journal_page(sheet.pages[-1])
+def test_journal_replay_gives_the_changed_sheet(tmp_path):
+    sheet = make_sheet()
+    path = str(tmp_path / "sheet.txt")
+    save_sheet_and_journal(path, sheet)
+    change_sheet(sheet)
+    stop_journal(sheet)
+    expected = str(tmp_path / "expected.txt")
+    save_sheet_file(expected, sheet)
+    replayed = read_sheet_file(path)
+    ChangeJournal(path, replayed).replay()
+    save_sheet_file(str(tmp_path / "replayed.txt"), replayed)
+    assert file_text(str(tmp_path / "replayed.txt")) == file_text(expected)
+def test_journal_replay_drops_a_torn_last_record(tmp_path):
+    sheet = make_sheet()
+    path = str(tmp_path / "sheet.txt")
+    save_sheet_and_journal(path, sheet)
+    change_sheet(sheet)
+    stop_journal(sheet)
+    journalpath = path + statmodel.journal_extension
+    complete = os.path.getsize(journalpath)
+    with open(journalpath, mode = "ab") as con:
+        con.write(b'{"op": "set", "id": 3, "tag": "stat') # the program stopped while writing
+    replayed = read_sheet_file(path)
+    ChangeJournal(path, replayed).replay()
+    assert shown_values(replayed) == shown_values(sheet)
+    assert os.path.getsize(journalpath) == complete
+    # later records start on a line of their own
+    counter = [s for s in replayed.registry if isinstance(s, CounterStat)][0]
+    replace_active_sheet(replayed)
+    statmodel.start_journal(path, replayed)
+    counter.currentval = 99
+    journal_field(counter, 'currentval')
+    stop_journal(replayed)
+    again = read_sheet_file(path)
+    ChangeJournal(path, again).replay()
+    assert again.registry[counter.statid].currentval == 99
+# a journal can be replayed over a later save of the sheet, which no longer has the stats it deletes
+def test_journal_replay_over_a_later_save(tmp_path):
+    sheet = make_sheet()
+    path = str(tmp_path / "sheet.txt")
+    save_sheet_and_journal(path, sheet)
+    change_sheet(sheet)
+    stop_journal(sheet)
+    expected = str(tmp_path / "expected.txt")
+    save_sheet_file(expected, sheet)
+    replayed = read_sheet_file(expected)
+    ChangeJournal(path, replayed).replay()
+    save_sheet_file(str(tmp_path / "replayed.txt"), replayed)
+    assert file_text(str(tmp_path / "replayed.txt")) == file_text(expected)
+
+# Calculating whole sheets with NumPy
+
+# a sheet of random sums, ability scores and fractions, some of which can't be calculated: fractions
+# dividing by zero, and a loop of sums calculated from each other
+def make_random_sheet(seed, nstats = 300):
+    rng = random.Random(seed)
+    sheet = Sheet()
+    calc = [SimpleStat(statname = "Base", statval = rng.randint(-5, 20), calcavail = True),
+            CounterStat(statname = "Counter", defaultval = rng.randint(0, 9), calcavail = True)]
+    stats = list(calc)
+    while len(stats) < nstats:
+        r = rng.random()
+        if r < 0.3:
+            new = SimpleStat(statname = "Score", statval = rng.randint(-5, 20), calcavail = True)
+        elif r < 0.6:
+            cls = DDAbilityStat if rng.random() < 0.3 else SumStat
+            new = cls(statname = "Sum", statlist_existing = rng.sample(calc, min(len(calc), rng.randint(0, 4))),
+                      statlist_new = [SimpleStat(statname = "Inside", statval = rng.randint(0, 3))], calcavail = True)
+        else:
+            new = FractionStat(statname = "Fraction", stat_to_div = rng.choice(calc), divisor = rng.randint(0, 4),
+                               rounddown = rng.random() < 0.5, calcavail = True)
+        stats.append(new)
+        calc.append(new)
+    first = SumStat(statname = "Loop 1", calcavail = True)
+    second = SumStat(statname = "Loop 2", statlist_existing = [first, calc[0]], calcavail = True)
+    first.statlist_existing = [second]
+    stats.extend([first, second, SumStat(statname = "After loop", statlist_existing = [second, calc[1]])])
+    register_stats(stats, sheet)
+    sheet.pages = [StatPage(statlist = stats)]
+    rebuild_stat_graph(sheet)
+    return sheet
+# cached value of each sum (the total) and fraction, or None if it can't be calculated, once every stat
+# has been calculated with value_for_sum
+def values_one_at_a_time(sheet):
+    [s.invalidate_value() for s in sheet.registry]
+    for s in sheet.registry:
+        try:
+            s.value_for_sum()
+        except (ArithmeticError, RecursionError):
+            pass
+    return cached_values(sheet)
+def cached_values(sheet):
+    return [s.cachedtotal if isinstance(s, SumStat) else s.cachedval for s in sheet.registry
+            if isinstance(s, (SumStat, FractionStat))]
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_numpy_matches_value_for_sum(seed):
+    pytest.importorskip("numpy")
+    sheet = make_random_sheet(seed)
+    expected = values_one_at_a_time(sheet)
+    assert None in expected # some stats can't be calculated
+    [s.invalidate_value() for s in sheet.registry]
+    calculate_all_stats(sheet)
+    assert cached_values(sheet) == expected
+def test_numpy_includes_stats_added_since_compiling():
+    pytest.importorskip("numpy")
+    sheet = make_random_sheet(4)
+    calculate_all_stats(sheet)
+    added = SumStat(statname = "New", statlist_existing = [s for s in sheet.registry if s.calcavail][:5])
+    register_stats([added], sheet)
+    link_stat(added, sheet)
+    expected = values_one_at_a_time(sheet)
+    [s.invalidate_value() for s in sheet.registry]
+    calculate_all_stats(sheet)
+    assert cached_values(sheet) == expected
+    assert added.cachedtotal != None
+# a stat with nothing to link leaves the graph as it was
+def test_numpy_includes_stats_registered_without_links():
+    pytest.importorskip("numpy")
+    sheet = make_random_sheet(5)
+    calculate_all_stats(sheet)
+    added = SumStat(statname = "New")
+    register_stats([added], sheet)
+    [s.invalidate_value() for s in sheet.registry]
+    calculate_all_stats(sheet)
+    assert added.cachedtotal == 0
+
+# What-if scenarios
+
+@pytest.mark.parametrize("vector", [True, False])
+def test_scenarios_match_changing_the_sheet(vector, monkeypatch):
+    if vector:
+        pytest.importorskip("numpy")
+    monkeypatch.setitem(statmodel.vector_state, 'on', vector)
+    sheet = make_random_sheet(5, nstats = 100)
+    base = sheet.registry[0]
+    values = [-3, 0, 7, 20]
+    results = evaluate_scenarios({base: values}, sheet)
+    for i, value in enumerate(values):
+        base.statval = value
+        [s.invalidate_value() for s in sheet.registry]
+        for s in results.stats:
+            try:
+                expected = (s.value_for_sum(), s.value_text())
+            except (ArithmeticError, RecursionError):
+                expected = (None, "?")
+            assert (results.value(s, i), results.text(s, i)) == expected
+def test_scenarios_with_numpy_match_without(monkeypatch):
+    pytest.importorskip("numpy")
+    sheet = make_random_sheet(6, nstats = 100)
+    ability = [s for s in sheet.registry if isinstance(s, DDAbilityStat)][0]
+    overrides = {ability: list(range(3, 19)), sheet.registry[1]: 5}
+    def every_value(results):
+        return [(results.value(s, i), results.text(s, i)) for s in results.stats for i in range(results.count)]
+    withnumpy = every_value(evaluate_scenarios(overrides, sheet))
+    monkeypatch.setitem(statmodel.vector_state, 'on', False)
+    assert every_value(evaluate_scenarios(overrides, sheet)) == withnumpy
+def test_scenarios_include_stats_added_since_compiling():
+    sheet = make_random_sheet(7, nstats = 50)
+    evaluate_scenarios({}, sheet)
+    added = SimpleStat(statname = "New", statval = 3, calcavail = True)
+    register_stats([added], sheet)
+    results = evaluate_scenarios({added: [1, 2]}, sheet)
+    assert [results.value(added, 0), results.value(added, 1)] == [1, 2]
+
+# Dice
+
+# chance of each total of a dice expression, found by going through every roll of the dice
+def brute_force_chances(expression):
+    totals = Counter({0: 1.0})
+    for sign, n, sides, keep, highest in parse_dice(expression):
+        if sides == None:
+            totals = Counter({t + sign * n: c for t, c in totals.items()})
+            continue
+        term = Counter()
+        for roll in itertools.product(range(1, sides + 1), repeat = n):
+            term[sign * sum(sorted(roll, reverse = highest)[:keep])] += 1.0 / sides ** n
+        added = Counter()
+        for (t, c), (u, d) in itertools.product(totals.items(), term.items()):
+            added[t + u] += c * d
+        totals = added
+    return totals
+@pytest.mark.parametrize("usenumpy", [True, False])
+@pytest.mark.parametrize("expression", ["1d20", "2d6+3", "4d6kh3", "4d6kl3", "adv", "dis-1", "2d20kh1-1d4",
+                                        "3d8kh2+1d6-2", "-1d6", "5", "1d1", "3d4kh1+2d3kl1", "5d3kh4"])
+def test_dice_match_brute_force(expression, usenumpy, monkeypatch):
+    if usenumpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(statmodel, "numpy", None)
+        monkeypatch.setattr(statmodel, "numpy_available", False)
+    statmodel.dice_cache.clear()
+    dist = dice_distribution(expression)
+    statmodel.dice_cache.clear()
+    expected = brute_force_chances(expression)
+    assert dist.lowest == min(expected) and dist.highest == max(expected)
+    chances = [expected[t] for t in range(dist.lowest, dist.highest + 1)]
+    assert [float(c) for c in dist.chances] == pytest.approx(chances)
+    assert dist.mean == pytest.approx(sum([t * c for t, c in expected.items()]))
+@pytest.mark.parametrize("expression", ["", "2d", "d0", "3d6kh4", "1000d1000", "20d1000kh10", "2d1000kh1+2d1000kh1"])
+def test_dice_that_cant_be_rolled(expression):
+    with pytest.raises(ValueError):
+        parse_dice(expression)